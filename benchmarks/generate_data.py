@@ -0,0 +1,224 @@
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from library_management import PRAGMA_PROFILES
+from library_migrations import migrate
+from loan_service import LOAN_PERIOD_DAYS, MAX_ACTIVE_LOANS
+
+SCHEMA_SCRIPT = os.path.join(ROOT, "database_creation.sql")
+
+# Preset sizes for --scale; "large" is the production-sized catalog.
+SCALES = {
+    "tiny": {"books": 2000, "members": 1000, "loans": 20000, "staff": 10},
+    "small": {"books": 20000, "members": 10000, "loans": 500000, "staff": 25},
+    "medium": {"books": 200000, "members": 100000, "loans": 5000000, "staff": 100},
+    "large": {"books": 1000000, "members": 500000, "loans": 50000000, "staff": 500},
+}
+
+TITLE_WORDS = [
+    "river", "stone", "garden", "night", "winter", "glass", "iron", "silver", "shadow", "harbor", "north",
+    "empire", "letters", "forest", "ocean", "crown", "signal", "orchard", "mirror", "storm", "house", "city",
+    "machine", "summer", "island", "secret", "light", "fire", "memory", "road", "kingdom", "daughter", "war",
+    "music", "engine", "salt", "bridge", "tower", "valley", "atlas", "theory", "history", "origin",
+]
+FIRST_NAMES = [
+    "James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "David", "Elizabeth",
+    "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen",
+    "Wei", "Aisha", "Carlos", "Yuki", "Olga", "Kwame", "Priya", "Mateo", "Fatima", "Liam",
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+    "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+    "Lee", "Nguyen", "Chen", "Okafor", "Ivanova", "Kim", "Patel", "Singh", "Cohen", "Rossi",
+]
+GENRES = [
+    "Fiction", "Mystery", "Fantasy", "Science Fiction", "Romance", "History", "Biography", "Children",
+    "Computer Science", "Poetry", "Travel", "Cooking", "Philosophy", "Art", "Reference",
+]
+CITIES = [("Cincinnati", "OH"), ("Columbus", "OH"), ("Dayton", "OH"), ("Covington", "KY"), ("Lexington", "KY"),
+          ("Indianapolis", "IN")]
+STAFF_ROLES = ["Head Librarian", "Assistant Librarian", "Library Clerk", "Library Assistant"]
+
+
+def zipf_weights(n, skew):
+    """Cumulative Zipf weights for ranks 1..n; skew=0 is uniform"""
+    return list(itertools.accumulate(1.0 / (rank ** skew) for rank in range(1, n + 1)))
+
+
+def skewed_ids(rng, ids, skew):
+    """Shuffle ids so popularity rank is unrelated to id, and return them with their cumulative weights"""
+    ids = list(ids)
+    rng.shuffle(ids)
+    return ids, zipf_weights(len(ids), skew)
+
+
+def chunks(rows, size):
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def book_rows(rng, count, skew):
+    genres, genre_weights = skewed_ids(rng, GENRES, skew)
+    authors = [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" for _ in range(max(count // 8, 1))]
+    authors, author_weights = skewed_ids(rng, authors, skew)
+    for i in range(count):
+        title = " ".join(rng.sample(TITLE_WORDS, rng.randint(1, 4))).title()
+        copies = rng.choices((1, 2, 3, 4, 5, 8), weights=(40, 25, 15, 10, 7, 3))[0]
+        yield (
+            f"The {title}" if i % 3 == 0 else title,
+            rng.choices(authors, cum_weights=author_weights)[0],
+            f"979-{i // 100000:01d}-{i % 100000:05d}-{rng.randint(0, 99):02d}-{i % 10}",
+            min(2025, max(1800, int(rng.gauss(1995, 25)))),
+            rng.choices(genres, cum_weights=genre_weights)[0],
+            copies,
+            copies,
+        )
+
+
+def member_rows(rng, count, today):
+    for i in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        city, state = rng.choice(CITIES)
+        yield (
+            first, last, f"{first.lower()}.{last.lower()}.{i}@example.com", f"513-555-{rng.randint(0, 9999):04d}",
+            f"{rng.randint(1, 9999)} {rng.choice(TITLE_WORDS).title()} St", city, state,
+            f"{rng.randint(40000, 47999)}", (today - timedelta(days=rng.randint(0, 3650))).isoformat(),
+        )
+
+
+def staff_rows(rng, count, today):
+    for i in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield (
+            first, last, STAFF_ROLES[0] if i == 0 else rng.choice(STAFF_ROLES[1:]),
+            f"{first.lower()}.{last.lower()}.{i}@library.example.org", f"513-555-{rng.randint(0, 9999):04d}",
+            (today - timedelta(days=rng.randint(0, 7300))).isoformat(),
+        )
+
+
+def loan_rows(rng, count, book_copies, member_ids, skew, today, years, out_fraction, on_loan):
+    """Yield loans in date order; recent loans stay out while copies and the loan limit allow"""
+    books, book_weights = skewed_ids(rng, book_copies, skew)
+    members, member_weights = skewed_ids(rng, member_ids, skew)
+    member_out = {}
+    span = years * 365
+    recent = today - timedelta(days=2 * LOAN_PERIOD_DAYS)
+    batch = 10000
+    for start in range(0, count, batch):
+        size = min(batch, count - start)
+        picked_books = rng.choices(books, cum_weights=book_weights, k=size)
+        picked_members = rng.choices(members, cum_weights=member_weights, k=size)
+        for i, book_id, member_id in zip(range(start, start + size), picked_books, picked_members):
+            loan_date = today - timedelta(days=span - (i * span) // count)
+            due_date = loan_date + timedelta(days=LOAN_PERIOD_DAYS)
+            if (loan_date >= recent and rng.random() < out_fraction
+                    and on_loan.get(book_id, 0) < book_copies[book_id]
+                    and member_out.get(member_id, 0) < MAX_ACTIVE_LOANS):
+                on_loan[book_id] = on_loan.get(book_id, 0) + 1
+                member_out[member_id] = member_out.get(member_id, 0) + 1
+                status = "Overdue" if due_date < today else "Active"
+                yield member_id, book_id, loan_date.isoformat(), due_date.isoformat(), None, status
+            else:
+                returned = min(loan_date + timedelta(days=rng.randint(1, 2 * LOAN_PERIOD_DAYS)), today)
+                yield member_id, book_id, loan_date.isoformat(), due_date.isoformat(), returned.isoformat(), "Returned"
+
+
+def generate(path, books, members, loans, staff=25, seed=42, skew=1.0, years=5, out_fraction=0.5,
+             today=None, chunk_size=50000, progress=print):
+    """Build a database of the given size at path and return the row counts"""
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} already exists.")
+    rng = random.Random(seed)
+    today = today or date.today()
+    started = time.perf_counter()
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        for name, value in PRAGMA_PROFILES["bulk"].items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        with open(SCHEMA_SCRIPT) as script:
+            conn.executescript(script.read())
+        # Only the table definitions are kept from the creation script.
+        conn.executescript("BEGIN; DELETE FROM Loan; DELETE FROM Book; DELETE FROM Member; DELETE FROM Staff; COMMIT;")
+
+        def load(table, sql, rows):
+            count = 0
+            for chunk in chunks(rows, chunk_size):
+                conn.execute("BEGIN")
+                conn.executemany(sql, chunk)
+                conn.execute("COMMIT")
+                count += len(chunk)
+                progress(f"{table}: {count} rows ({time.perf_counter() - started:.0f}s)")
+            return count
+
+        # Tables are filled before the migrations run, so the FTS indexes,
+        # Loan indexes and counters are each built once in bulk rather than
+        # maintained row by row.
+        load("Book", "INSERT INTO Book (title, author, isbn, publication_year, genre, total_copies, available_copies) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)", book_rows(rng, books, skew))
+        load("Member", "INSERT INTO Member (first_name, last_name, email, phone, street, city, state, zip_code, "
+                       "join_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", member_rows(rng, members, today))
+        load("Staff", "INSERT INTO Staff (first_name, last_name, role, email, phone, hire_date) "
+                      "VALUES (?, ?, ?, ?, ?, ?)", staff_rows(rng, staff, today))
+        book_copies = dict(conn.execute("SELECT book_id, total_copies FROM Book"))
+        member_ids = [row[0] for row in conn.execute("SELECT member_id FROM Member")]
+        on_loan = {}
+        load("Loan", "INSERT INTO Loan (member_id, book_id, loan_date, due_date, return_date, status) "
+                     "VALUES (?, ?, ?, ?, ?, ?)",
+             loan_rows(rng, loans, book_copies, member_ids, skew, today, years, out_fraction, on_loan))
+        conn.execute("BEGIN")
+        conn.executemany(
+            "UPDATE Book SET available_copies = total_copies - ? WHERE book_id = ?",
+            [(out, book_id) for book_id, out in on_loan.items()]
+        )
+        conn.execute("COMMIT")
+
+        progress("Building indexes, search tables and counters...")
+        migrate(conn)
+    finally:
+        conn.close()
+    progress(f"Generated {path} in {time.perf_counter() - started:.0f}s.")
+    return {"books": books, "members": members, "staff": staff, "loans": loans}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic library database")
+    parser.add_argument("path", help="database file to create")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small", help="preset sizes; flags below override")
+    parser.add_argument("--books", type=int)
+    parser.add_argument("--members", type=int)
+    parser.add_argument("--loans", type=int)
+    parser.add_argument("--staff", type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skew", type=float, default=1.0,
+                        help="Zipf exponent of book popularity and member activity; 0 is uniform")
+    parser.add_argument("--years", type=int, default=5, help="years of loan history")
+    parser.add_argument("--today", type=date.fromisoformat, help="date the history ends on (default: today)")
+    args = parser.parse_args()
+
+    sizes = dict(SCALES[args.scale])
+    for name in sizes:
+        if getattr(args, name) is not None:
+            sizes[name] = getattr(args, name)
+    try:
+        generate(args.path, seed=args.seed, skew=args.skew, years=args.years, today=args.today,
+                 progress=lambda message: print(message, file=sys.stderr), **sizes)
+    except FileExistsError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from catalog_snapshot import CatalogSnapshot
+from generate_data import SCALES, TITLE_WORDS, generate
+from library_management import LibraryDatabase
+from library_search import SearchEngine
+
+
+def retained_bytes(build):
+    """Return what build() returns and the memory it still holds once built"""
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, size
+
+
+def per_call_ms(calls):
+    start = time.perf_counter()
+    for call in calls:
+        call()
+    return (time.perf_counter() - start) / len(calls) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the kiosk snapshot with sqlite3.Row results")
+    parser.add_argument("--db", help="database to read (default: generate one with --scale)")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--searches", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db
+        if path is None:
+            path = os.path.join(tmp, "kiosk.db")
+            generate(path, progress=lambda message: print(message, file=sys.stderr), **SCALES[args.scale])
+        db = LibraryDatabase(path, verbose=False)
+        db.connect()
+
+        rows, row_bytes = retained_bytes(lambda: db.execute_query("SELECT * FROM Book"))
+        started = time.perf_counter()
+        snapshot, snapshot_bytes = retained_bytes(lambda: CatalogSnapshot.from_database(db))
+        build_seconds = time.perf_counter() - started
+        print(f"{len(rows)} books")
+        print(f"sqlite3.Row list: {row_bytes / 2**20:8.1f} MiB")
+        print(f"snapshot:         {snapshot_bytes / 2**20:8.1f} MiB, including the token index "
+              f"({row_bytes / snapshot_bytes:.1f}x smaller; built in {build_seconds:.2f}s)")
+        del rows
+
+        rng = random.Random(1)
+        terms = [" ".join(rng.choice(TITLE_WORDS)[:rng.randint(3, 6)] for _ in range(rng.randint(1, 2)))
+                 for _ in range(args.searches)]
+        search = SearchEngine(db)
+        sql_ms = per_call_ms([lambda term=term: search.search_books(term) for term in terms])
+        snapshot_ms = per_call_ms([lambda term=term: snapshot.search_books(term) for term in terms])
+        print(f"search_books: SQL {sql_ms:.3f} ms, snapshot {snapshot_ms:.3f} ms per search")
+        db.disconnect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from library_management import LibraryDatabase
+from library_migrations import migrate
+from loan_service import LoanError, LoanService
+
+SCHEMA_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database_creation.sql")
+
+
+def create_database(path, members, copies):
+    """Create a benchmark database with one contended book"""
+    conn = sqlite3.connect(path)
+    with open(SCHEMA_SCRIPT) as script:
+        conn.executescript(script.read())
+    migrate(conn)
+    conn.executemany(
+        "INSERT INTO Member (first_name, last_name, email, join_date) VALUES (?, ?, ?, '2025-01-01')",
+        [("Bench", str(i), f"bench{i}@example.com") for i in range(members)]
+    )
+    cursor = conn.execute(
+        "INSERT INTO Book (title, author, isbn, publication_year, genre, total_copies, available_copies) "
+        "VALUES ('Contended Title', 'Bench Author', 'BENCH-0001', 2024, 'Benchmark', ?, ?)",
+        (copies, copies)
+    )
+    member_ids = [row[0] for row in conn.execute("SELECT member_id FROM Member WHERE first_name = 'Bench'")]
+    conn.commit()
+    conn.close()
+    return cursor.lastrowid, member_ids
+
+
+def legacy_borrow(db, member_id, book_id):
+    """The pre-service borrow path: separate checks, then two auto-committed updates"""
+    if not db.execute_query("SELECT * FROM MEMBER WHERE member_id = ?", (member_id,)):
+        return False
+    if not db.execute_query("SELECT * FROM BOOK WHERE book_id = ? AND available_copies > 0", (book_id,)):
+        return False
+    count = db.execute_query("SELECT COUNT(*) as count FROM LOAN WHERE member_id = ? AND status = 'Active'", (member_id,))
+    if count is None or count[0]['count'] >= 5:
+        return False
+    loan_date = datetime.now().strftime('%Y-%m-%d')
+    due_date = (datetime.now() + timedelta(days=14)).strftime('%Y-%m-%d')
+    inserted = db.execute_update(
+        "INSERT INTO LOAN (member_id, book_id, loan_date, due_date, status) VALUES (?, ?, ?, ?, 'Active')",
+        (member_id, book_id, loan_date, due_date)
+    )
+    updated = db.execute_update("UPDATE BOOK SET available_copies = available_copies - 1 WHERE book_id = ?", (book_id,))
+    return bool(inserted and updated)
+
+
+def legacy_return(db, member_id, book_id):
+    """The pre-service return path"""
+    if not db.execute_query("SELECT * FROM LOAN WHERE member_id = ? AND book_id = ? AND status = 'Active'", (member_id, book_id)):
+        return False
+    db.execute_update("UPDATE LOAN SET status = 'Returned' WHERE member_id = ? AND book_id = ? AND status = 'Active'", (member_id, book_id))
+    db.execute_update("UPDATE BOOK SET available_copies = available_copies + 1 WHERE book_id = ?", (book_id,))
+    return True
+
+
+def service_borrow(service, member_id, book_id):
+    try:
+        service.checkout(member_id, book_id)
+        return True
+    except (LoanError, sqlite3.Error):
+        return False
+
+
+def service_return(service, member_id, book_id):
+    try:
+        service.return_book(member_id, book_id)
+        return True
+    except (LoanError, sqlite3.Error):
+        return False
+
+
+def run(mode, path, book_id, member_ids, desks, seconds):
+    """Run borrow/return cycles from several desks and return the counters"""
+    stop = threading.Event()
+    counts = {"borrows": 0, "returns": 0, "failures": 0}
+    lock = threading.Lock()
+
+    def desk(desk_number):
+        db = LibraryDatabase(path)
+        # Open the connection directly so every desk waits out lock contention instead of erroring.
+        db.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        db.conn.row_factory = sqlite3.Row
+        service = LoanService(db)
+        mine = member_ids[desk_number::desks]
+        borrows = returns = failures = 0
+        i = 0
+        while not stop.is_set():
+            member_id = mine[i % len(mine)]
+            i += 1
+            if mode == "legacy":
+                ok = legacy_borrow(db, member_id, book_id)
+            else:
+                ok = service_borrow(service, member_id, book_id)
+            if not ok:
+                failures += 1
+                continue
+            borrows += 1
+            if mode == "legacy":
+                ok = legacy_return(db, member_id, book_id)
+            else:
+                ok = service_return(service, member_id, book_id)
+            returns += ok
+            failures += not ok
+        db.conn.close()
+        with lock:
+            counts["borrows"] += borrows
+            counts["returns"] += returns
+            counts["failures"] += failures
+
+    threads = [threading.Thread(target=desk, args=(n,)) for n in range(desks)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    counts["elapsed"] = time.perf_counter() - start
+
+    conn = sqlite3.connect(path)
+    total, available = conn.execute(
+        "SELECT total_copies, available_copies FROM Book WHERE book_id = ?", (book_id,)
+    ).fetchone()
+    on_loan = conn.execute(
+        "SELECT COUNT(*) FROM Loan WHERE book_id = ? AND status = 'Active'", (book_id,)
+    ).fetchone()[0]
+    conn.close()
+    counts["inconsistent_copies"] = abs(total - available - on_loan)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Borrow/return contention benchmark")
+    parser.add_argument("--desks", type=int, default=8, help="concurrent circulation desks (threads)")
+    parser.add_argument("--members", type=int, default=400)
+    parser.add_argument("--copies", type=int, default=3, help="copies of the contended book")
+    parser.add_argument("--seconds", type=float, default=5.0, help="duration of each run")
+    args = parser.parse_args()
+
+    # The legacy path prints every swallowed sqlite3 error; keep the report readable.
+    real_stdout = sys.stdout
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("legacy", "service"):
+            path = os.path.join(tmp, f"{mode}.db")
+            book_id, member_ids = create_database(path, args.members, args.copies)
+            sys.stdout = open(os.devnull, "w")
+            try:
+                counts = run(mode, path, book_id, member_ids, args.desks, args.seconds)
+            finally:
+                sys.stdout.close()
+                sys.stdout = real_stdout
+            cycles = counts["returns"] / counts["elapsed"]
+            print(f"{mode:>8}: {cycles:8.1f} borrow+return cycles/s, "
+                  f"{counts['borrows']} borrows, {counts['failures']} failed attempts, "
+                  f"{counts['inconsistent_copies']} copies unaccounted for")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from library_migrations import migrate
+
+SCHEMA_SCRIPT = os.path.join(ROOT, "database_creation.sql")
+WORDS = ["river", "stone", "garden", "night", "winter", "glass", "iron", "silver", "shadow", "harbor",
+         "north", "empire", "letters", "forest", "ocean", "crown", "signal", "orchard", "mirror", "storm"]
+
+
+def create_database(path, books, members, copies):
+    """Create a benchmark database with a generated catalog and member list"""
+    rng = random.Random(7)
+    conn = sqlite3.connect(path)
+    with open(SCHEMA_SCRIPT) as script:
+        conn.executescript(script.read())
+    migrate(conn)
+    conn.executemany(
+        "INSERT INTO Book (title, author, isbn, publication_year, genre, total_copies, available_copies) "
+        "VALUES (?, ?, ?, ?, 'Benchmark', ?, ?)",
+        [(" ".join(rng.sample(WORDS, 3)).title(), f"Author {i % 500}", f"LOAD-{i:08d}", 1900 + i % 120,
+          copies, copies) for i in range(books)]
+    )
+    conn.executemany(
+        "INSERT INTO Member (first_name, last_name, email, join_date) VALUES ('Load', ?, ?, '2025-01-01')",
+        [(str(i), f"load{i}@example.com") for i in range(members)]
+    )
+    book_ids = [row[0] for row in conn.execute("SELECT book_id FROM Book WHERE genre = 'Benchmark'")]
+    member_ids = [row[0] for row in conn.execute("SELECT member_id FROM Member WHERE first_name = 'Load'")]
+    conn.commit()
+    conn.close()
+    return book_ids, member_ids
+
+
+async def request(reader, writer, method, path, payload=None):
+    """Send one keep-alive HTTP request and return the status and decoded body"""
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def client(host, port, seconds, book_ids, member_ids, write_ratio, seed, latencies):
+    """Issue a mix of catalog reads and borrow/return writes until time is up"""
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    borrowed = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        roll = rng.random()
+        if roll < write_ratio and borrowed and rng.random() < 0.5:
+            kind, method, path, payload = "return", "POST", "/return", borrowed.pop()
+        elif roll < write_ratio:
+            payload = {"member": rng.choice(member_ids), "book": rng.choice(book_ids)}
+            kind, method, path = "borrow", "POST", "/borrow"
+        elif roll < (1 + write_ratio) / 2:
+            kind, method, path, payload = "search-books", "GET", f"/search-books?term={rng.choice(WORDS)[:4]}", None
+        else:
+            kind, method, path, payload = "get-book", "GET", f"/get-book?book={rng.choice(book_ids)}", None
+        start = time.perf_counter()
+        status, body = await request(reader, writer, method, path, payload)
+        latencies.setdefault(kind, []).append(time.perf_counter() - start)
+        if kind == "borrow" and status == 200:
+            borrowed.append({"member": payload["member"], "book": payload["book"]})
+    writer.close()
+
+
+def percentiles(samples):
+    cuts = statistics.quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else samples * 99
+    return cuts[49] * 1000, cuts[98] * 1000
+
+
+async def generate_load(host, port, clients, seconds, book_ids, member_ids, write_ratio):
+    latencies = {}
+    await asyncio.gather(*(
+        client(host, port, seconds, book_ids, member_ids, write_ratio, seed, latencies) for seed in range(clients)
+    ))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for library_server.py")
+    parser.add_argument("--clients", type=int, default=32, help="concurrent keep-alive connections")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--books", type=int, default=20000)
+    parser.add_argument("--members", type=int, default=5000)
+    parser.add_argument("--copies", type=int, default=3)
+    parser.add_argument("--write-ratio", type=float, default=0.2, help="fraction of requests that borrow or return")
+    parser.add_argument("--readers", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "load.db")
+        book_ids, member_ids = create_database(path, args.books, args.members, args.copies)
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "library_server.py"), "--db", path, "--port", "0",
+             "--readers", str(args.readers), "--sweep-interval", "0"],
+            stdout=subprocess.PIPE, text=True
+        )
+        try:
+            host, port = server.stdout.readline().strip().rsplit("/", 1)[1].split(":")
+            latencies = asyncio.run(generate_load(host, int(port), args.clients, args.seconds,
+                                                  book_ids, member_ids, args.write_ratio))
+        finally:
+            server.terminate()
+            server.wait()
+
+    total = sum(len(samples) for samples in latencies.values())
+    print(f"{total} requests from {args.clients} clients in {args.seconds:.0f}s: {total / args.seconds:.0f} req/s")
+    for kind, samples in sorted(latencies.items()) + [("all", [s for v in latencies.values() for s in v])]:
+        p50, p99 = percentiles(samples)
+        print(f"{kind:>13}: {len(samples):7d} requests, p50 {p50:7.2f} ms, p99 {p99:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from entity_cache import EntityCache
+from generate_data import FIRST_NAMES, LAST_NAMES, SCALES, TITLE_WORDS, generate
+from library_management import LibraryDatabase
+from library_migrations import migrate
+from library_service import LibraryService
+from loan_service import LoanError
+
+
+def summarize(samples, errors):
+    """Latency statistics in milliseconds for one operation"""
+    samples = sorted(samples)
+    cuts = statistics.quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else samples * 99
+    return {
+        "calls": len(samples),
+        "errors": errors,
+        "ops_per_sec": round(len(samples) / sum(samples), 1) if sum(samples) else None,
+        "mean_ms": round(statistics.fmean(samples) * 1000, 4),
+        "min_ms": round(samples[0] * 1000, 4),
+        "p50_ms": round(cuts[49] * 1000, 4),
+        "p95_ms": round(cuts[94] * 1000, 4),
+        "p99_ms": round(cuts[98] * 1000, 4),
+        "max_ms": round(samples[-1] * 1000, 4),
+    }
+
+
+def time_calls(calls):
+    """Run each zero-argument call once and return the timings and the number of LoanErrors"""
+    samples, errors = [], 0
+    for call in calls:
+        start = time.perf_counter()
+        try:
+            call()
+        except LoanError:
+            errors += 1
+        samples.append(time.perf_counter() - start)
+    return samples, errors
+
+
+def run_suite(db_path, iterations, seed):
+    """Time every LibraryService operation against a copy of db_path"""
+    rng = random.Random(seed)
+    db = LibraryDatabase(db_path, profile="wal", verbose=False)
+    db.connect()
+    service = LibraryService(db, cache=EntityCache(db))
+    max_book = db.conn.execute("SELECT MAX(book_id) FROM Book").fetchone()[0]
+    max_member = db.conn.execute("SELECT MAX(member_id) FROM Member").fetchone()[0]
+    available = [row[0] for row in db.conn.execute(
+        "SELECT book_id FROM Book WHERE available_copies > 0 ORDER BY random() LIMIT ?", (iterations,)
+    )]
+    # Members with no books out, so the loan limit never rejects a borrow.
+    borrowers = [row[0] for row in db.conn.execute(
+        "SELECT member_id FROM Member WHERE member_id NOT IN "
+        "(SELECT member_id FROM MemberLoanStats WHERE active_loans + overdue_loans > 0) "
+        "ORDER BY random() LIMIT ?", (iterations,)
+    )]
+    pairs = list(zip(borrowers, available))
+
+    operations = {
+        "borrow": [lambda m=m, b=b: service.borrow(m, b) for m, b in pairs],
+        "renew": [lambda m=m, b=b: service.renew(m, b) for m, b in pairs],
+        "return": [lambda m=m, b=b: service.return_book(m, b) for m, b in pairs],
+        "search_books": [lambda t=rng.choice(TITLE_WORDS)[:rng.randint(3, 6)]: service.search_books(t)
+                         for _ in range(iterations)],
+        "search_members": [lambda t=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}": service.search_members(t)
+                           for _ in range(iterations)],
+        "get_book": [lambda b=rng.randint(1, max_book): service.get_book(b) for _ in range(iterations)],
+        "overdue_sweep": [service.sweep_overdue for _ in range(iterations)],
+        "overdue_listing": [lambda: service.overdue(sweep=False) for _ in range(iterations)],
+        "active_loans": [lambda: service.active_loans() for _ in range(iterations)],
+        "most_borrowed": [lambda: service.most_borrowed(10) for _ in range(iterations)],
+        "view_all_books": [lambda a=rng.randint(0, max_book): service.list_books(after=a)
+                           for _ in range(iterations)],
+        "view_all_members": [lambda a=rng.randint(0, max_member): service.list_members(after=a)
+                             for _ in range(iterations)],
+        "update_book": [lambda b=b: service.update_book(b, genre="Benchmark") for b in available],
+    }
+    results = {}
+    for name, calls in operations.items():
+        samples, errors = time_calls(calls)
+        if samples:
+            results[name] = summarize(samples, errors)
+    db.disconnect()
+    return results
+
+
+def environment(db_path):
+    """Describe the code, interpreter and data a run was made with"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    conn = sqlite3.connect(db_path)
+    rows = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("Book", "Member", "Staff", "Loan")}
+    conn.close()
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "rows": rows,
+    }
+
+
+def compare(previous, current, output=sys.stdout):
+    """Print the p50 and p99 change of every operation against an earlier result file"""
+    print(f"{'operation':>18} {'p50 before':>11} {'p50 now':>9} {'change':>8} {'p99 before':>11} {'p99 now':>9}",
+          file=output)
+    for name, now in current["results"].items():
+        before = previous["results"].get(name)
+        if before is None:
+            continue
+        change = (now["p50_ms"] / before["p50_ms"] - 1) * 100 if before["p50_ms"] else 0.0
+        print(f"{name:>18} {before['p50_ms']:11.3f} {now['p50_ms']:9.3f} {change:+7.1f}% "
+              f"{before['p99_ms']:11.3f} {now['p99_ms']:9.3f}", file=output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time every library operation and write the results as JSON")
+    parser.add_argument("--db", help="generated database to benchmark (it is copied, never modified)")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="tiny", help="generate a database when --db is not given")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=200, help="calls per operation")
+    parser.add_argument("--output", help="JSON results file (default: stdout)")
+    parser.add_argument("--compare", metavar="RESULTS", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work = os.path.join(tmp, "bench.db")
+        if args.db:
+            source = sqlite3.connect(args.db)
+            target = sqlite3.connect(work)
+            source.backup(target)
+            source.close()
+            with contextlib.redirect_stdout(sys.stderr):
+                migrate(target)
+            target.close()
+            dataset = {"db": os.path.abspath(args.db)}
+        else:
+            # Migration notices would otherwise end up in the JSON on stdout.
+            with contextlib.redirect_stdout(sys.stderr):
+                generate(work, seed=args.seed, progress=lambda message: print(message, file=sys.stderr),
+                         **SCALES[args.scale])
+            dataset = {"scale": args.scale, "seed": args.seed}
+        report = {
+            "environment": environment(work),
+            "dataset": dataset,
+            "iterations": args.iterations,
+            "results": run_suite(work, args.iterations, args.seed),
+        }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as previous:
+            compare(json.load(previous), report, sys.stdout if args.output else sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
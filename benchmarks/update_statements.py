@@ -0,0 +1,95 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from library_management import LibraryDatabase
+from library_migrations import migrate
+from statements import UPDATABLE_FIELDS, StatementCacheMonitor, registry
+
+SCHEMA_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database_creation.sql")
+
+
+def create_database(path, members):
+    """Create a benchmark database with the given number of members"""
+    conn = sqlite3.connect(path)
+    with open(SCHEMA_SCRIPT) as script:
+        conn.executescript(script.read())
+    migrate(conn)
+    conn.executemany(
+        "INSERT INTO Member (first_name, last_name, email, join_date) VALUES (?, ?, ?, '2025-01-01')",
+        [("Bench", str(i), f"bench{i}@example.com") for i in range(members)]
+    )
+    member_ids = [row[0] for row in conn.execute("SELECT member_id FROM Member WHERE first_name = 'Bench'")]
+    conn.commit()
+    conn.close()
+    return member_ids
+
+
+def legacy_update(db, member_id, fields):
+    """The pre-registry update_member: one SQL string per combination of fields"""
+    query = "UPDATE Member SET "
+    params = []
+    for field, value in fields.items():
+        query += f"{field} = ?, "
+        params.append(value)
+    query = query.rstrip(", ") + " WHERE member_id = ?"
+    params.append(member_id)
+    return db.execute_update(query, tuple(params))
+
+
+def registry_update(db, member_id, fields):
+    return registry.partial_update(db, "Member", member_id, **fields)
+
+
+def random_changes(rng, member_id, i):
+    """Pick a random non-empty subset of the member fields, as a clerk would fill them in"""
+    names = [name for name in UPDATABLE_FIELDS["Member"][1] if name != "email"]
+    chosen = rng.sample(names, rng.randint(1, len(names)))
+    return {name: f"{name}-{member_id}-{i}" for name in chosen}
+
+
+def run(mode, path, member_ids, updates, seed):
+    """Apply the same random updates with one path and return the cache statistics"""
+    db = LibraryDatabase(path, verbose=False)
+    db.connect()
+    update = legacy_update if mode == "legacy" else registry_update
+    rng = random.Random(seed)
+    work = [(rng.choice(member_ids), random_changes(rng, 0, i)) for i in range(updates)]
+    monitor = StatementCacheMonitor(db.conn)
+    start = time.perf_counter()
+    with db.transaction():
+        for member_id, fields in work:
+            update(db, member_id, fields)
+    elapsed = time.perf_counter() - start
+    monitor.detach()
+    db.disconnect()
+    stats = monitor.stats()
+    stats["elapsed"] = elapsed
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Statement-cache behaviour of the update_* SQL")
+    parser.add_argument("--members", type=int, default=1000)
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("legacy", "registry"):
+            path = os.path.join(tmp, f"{mode}.db")
+            member_ids = create_database(path, args.members)
+            stats = run(mode, path, member_ids, args.updates, args.seed)
+            print(f"{mode:>8}: {args.updates / stats['elapsed']:9.1f} updates/s, "
+                  f"{stats['executions']} statements, {stats['parses']} parses, "
+                  f"statement-cache hit rate {stats['hit_rate']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import argparse
+import sys
+import time
+from array import array
+
+from loan_archive import LoanArchiver
+
+# Loans up to this id are counted in BookPairs.
+LAST_LOAN_ID = "book_recommendations.last_loan_id"
+
+TOP_K = 20
+# A loan pairs with at most this many of the member's other books, those
+# first borrowed most recently; a handful of very heavy borrowers would
+# otherwise contribute most of the pairs.
+MAX_BASKET = 200
+# A rebuild counts at most this many distinct pairs in memory before adding
+# them to its work table.
+PAIR_CHUNK = 500000
+
+# BookPairs is the sparse co-occurrence matrix: how many members borrowed
+# both books, stored in both directions so each book's row is one range.
+# BookNeighbors holds each book's top-K row of it, packed as an array of
+# unsigned 32-bit (other book_id, members) pairs in native byte order, so a
+# recommendation is one primary-key read.
+RECOMMENDATION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS BookPairs (
+    book_id INTEGER NOT NULL,
+    other_id INTEGER NOT NULL,
+    members INTEGER NOT NULL,
+    PRIMARY KEY (book_id, other_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS BookNeighbors (
+    book_id INTEGER PRIMARY KEY,
+    neighbors BLOB NOT NULL
+);
+"""
+
+# Every loan up to a loan id, each member's in the order they were made; a
+# one-off read for the build.
+BASKETS = "SELECT member_id, book_id FROM LoanHistoryView WHERE loan_id <= ? ORDER BY member_id, loan_id"
+
+# The rebuild's running pair counts, one row per pair (smaller id first).
+# A TEMP table, so counting does not hold the database's write lock.
+REBUILD_PAIRS_SCHEMA = """
+CREATE TEMP TABLE IF NOT EXISTS rebuild_pairs (
+    first_id INTEGER NOT NULL,
+    second_id INTEGER NOT NULL,
+    members INTEGER NOT NULL,
+    PRIMARY KEY (first_id, second_id)
+) WITHOUT ROWID
+"""
+
+ADD_PAIR_COUNTS = """
+INSERT INTO temp.rebuild_pairs (first_id, second_id, members) VALUES (?, ?, ?)
+ON CONFLICT(first_id, second_id) DO UPDATE SET members = members + excluded.members
+"""
+
+# Both directions of every counted pair.
+COPY_PAIRS = """
+INSERT INTO BookPairs (book_id, other_id, members)
+SELECT first_id, second_id, members FROM temp.rebuild_pairs
+UNION ALL
+SELECT second_id, first_id, members FROM temp.rebuild_pairs
+"""
+
+PAIRED_BOOKS = "SELECT first_id FROM temp.rebuild_pairs UNION SELECT second_id FROM temp.rebuild_pairs"
+
+# The books a member first borrowed before a loan, most recent first.
+EARLIER_BOOKS = """
+SELECT book_id, MIN(loan_id) AS first_loan FROM LoanHistoryView
+WHERE member_id = ? AND loan_id < ?
+GROUP BY book_id
+ORDER BY first_loan DESC
+"""
+
+ADD_PAIR = """
+INSERT INTO BookPairs (book_id, other_id, members) VALUES (?, ?, 1)
+ON CONFLICT(book_id, other_id) DO UPDATE SET members = members + 1
+"""
+
+TOP_PAIRS = "SELECT other_id, members FROM BookPairs WHERE book_id = ? ORDER BY members DESC, other_id LIMIT ?"
+
+
+def pack(neighbors):
+    """Pack [(other_id, members), ...] into a BookNeighbors blob"""
+    return array("I", [value for pair in neighbors for value in pair]).tobytes()
+
+
+def unpack(blob):
+    """Return the [(other_id, members), ...] of a BookNeighbors blob, best first"""
+    values = array("I")
+    values.frombytes(blob)
+    return list(zip(values[0::2], values[1::2]))
+
+
+class CoBorrowingIndex:
+    """"Readers who borrowed this also borrowed" from loan history, kept as a pruned item-item matrix
+
+    rebuild streams every loan, member by member, counting for each pair of
+    books how many members borrowed both, in chunks of pair_chunk pairs,
+    and keeps each book's top_k partners. update adds the loans made since, one member's earlier books
+    at a time, and re-ranks only the books whose pairs changed.
+    """
+
+    def __init__(self, db, top_k=TOP_K, max_basket=MAX_BASKET, archiver=None, pair_chunk=PAIR_CHUNK):
+        self.db = db
+        self.top_k = top_k
+        self.max_basket = max_basket
+        self.pair_chunk = pair_chunk
+        # The history view also covers loans archived out of Loan.
+        self.archiver = archiver or LoanArchiver(db)
+
+    def rebuild(self):
+        """Recompute the matrix and every book's neighbors from all loan history; return the pairs counted"""
+        self.archiver.attach()
+        # Read first: loans made during the stream are left to the next
+        # update rather than marked as counted.
+        through = self.archiver.newest_loan_id()
+        self.db.execute(REBUILD_PAIRS_SCHEMA)
+        try:
+            counts = {}
+            member, seen, recent = None, set(), []
+            for member_id, book_id in self.db.execute(BASKETS, (through,)):
+                if member_id != member:
+                    member, seen, recent = member_id, set(), []
+                if book_id in seen:
+                    continue
+                for other_id in recent[-self.max_basket:]:
+                    key = (book_id, other_id) if book_id < other_id else (other_id, book_id)
+                    counts[key] = counts.get(key, 0) + 1
+                seen.add(book_id)
+                recent.append(book_id)
+                if len(counts) >= self.pair_chunk:
+                    self.add_pair_counts(counts)
+                    counts = {}
+            self.add_pair_counts(counts)
+
+            with self.db.transaction(immediate=True):
+                self.db.execute("DELETE FROM BookPairs")
+                self.db.execute("DELETE FROM BookNeighbors")
+                self.db.execute(COPY_PAIRS)
+                for (book_id,) in self.db.execute(PAIRED_BOOKS).fetchall():
+                    self.refresh_neighbors(book_id)
+                self.db.set_job_state(LAST_LOAN_ID, str(through))
+            return self.db.execute("SELECT COUNT(*) FROM temp.rebuild_pairs").fetchone()[0]
+        finally:
+            self.db.execute("DELETE FROM temp.rebuild_pairs")
+
+    def add_pair_counts(self, counts):
+        """Add a chunk of {(first_id, second_id): members} to the rebuild's work table"""
+        # Only the TEMP table is written, so the main database stays unlocked.
+        with self.db.transaction():
+            self.db.conn.executemany(ADD_PAIR_COUNTS, ((first, second, members)
+                                                       for (first, second), members in counts.items()))
+
+    def update(self, batch_size=1000):
+        """Count the loans made since the last update or rebuild; return how many loans were read"""
+        if self.db.job_state(LAST_LOAN_ID) is None:
+            # Never built: one streaming pass beats pairing every loan ever
+            # made one at a time.
+            self.rebuild()
+            return 0
+        self.archiver.attach()
+        read = 0
+        while True:
+            with self.db.transaction(immediate=True):
+                after = int(self.db.job_state(LAST_LOAN_ID))
+                loans = self.db.execute(
+                    "SELECT loan_id, member_id, book_id FROM Loan WHERE loan_id > ? ORDER BY loan_id LIMIT ?",
+                    (after, batch_size)
+                ).fetchall()
+                if not loans:
+                    break
+                touched = set()
+                for loan_id, member_id, book_id in loans:
+                    earlier = [row[0] for row in self.db.execute(EARLIER_BOOKS, (member_id, loan_id))]
+                    if book_id in earlier:
+                        continue
+                    others = earlier[:self.max_basket]
+                    self.db.conn.executemany(ADD_PAIR, [(book_id, other_id) for other_id in others])
+                    self.db.conn.executemany(ADD_PAIR, [(other_id, book_id) for other_id in others])
+                    touched.update(others)
+                    if others:
+                        touched.add(book_id)
+                for book_id in touched:
+                    self.refresh_neighbors(book_id)
+                self.db.set_job_state(LAST_LOAN_ID, str(loans[-1][0]))
+            read += len(loans)
+        return read
+
+    def refresh_neighbors(self, book_id):
+        """Re-rank one book's partners into its BookNeighbors row"""
+        neighbors = [tuple(row) for row in self.db.execute(TOP_PAIRS, (book_id, self.top_k))]
+        self.db.execute(
+            "INSERT INTO BookNeighbors (book_id, neighbors) VALUES (?, ?) "
+            "ON CONFLICT(book_id) DO UPDATE SET neighbors = excluded.neighbors",
+            (book_id, pack(neighbors))
+        )
+
+    def neighbors(self, book_id):
+        """Return [(other_id, members), ...] for a book, best first; empty if it was never co-borrowed"""
+        row = self.db.execute("SELECT neighbors FROM BookNeighbors WHERE book_id = ?", (book_id,)).fetchone()
+        return unpack(row[0]) if row is not None else []
+
+    def recommend(self, book_id, limit=5):
+        """Return the books most often borrowed by readers of a book, with their titles and authors"""
+        neighbors = self.neighbors(book_id)[:limit]
+        if not neighbors:
+            return []
+        books = {row["book_id"]: row for row in self.db.execute(
+            f"SELECT book_id, title, author FROM Book WHERE book_id IN ({', '.join('?' * len(neighbors))})",
+            [other_id for other_id, _ in neighbors]
+        )}
+        # Books removed since the last update are left out.
+        return [{"book_id": other_id, "title": books[other_id]["title"], "author": books[other_id]["author"],
+                 "members": members}
+                for other_id, members in neighbors if other_id in books]
+
+
+def main():
+    # Imported here: library_management itself imports this module.
+    from library_management import LibraryDatabase
+    from library_migrations import migrate
+
+    parser = argparse.ArgumentParser(description="Build or update the co-borrowing recommendations")
+    parser.add_argument("--db", default="library_management.db")
+    parser.add_argument("--rebuild", action="store_true", help="recount every pair from all loan history")
+    parser.add_argument("--archive", help="archive database holding archived loans")
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--book", type=int, help="print the recommendations for a book")
+    args = parser.parse_args()
+
+    db = LibraryDatabase(args.db, profile="wal", verbose=False)
+    if not db.connect():
+        sys.exit(1)
+    try:
+        migrate(db.conn)
+        index = CoBorrowingIndex(db, args.top_k, archiver=LoanArchiver(db, args.archive))
+        started = time.perf_counter()
+        if args.rebuild:
+            print(f"Counted {index.rebuild()} book pairs in {time.perf_counter() - started:.2f}s.")
+        else:
+            print(f"Added {index.update()} loans in {time.perf_counter() - started:.2f}s.")
+        if args.book is not None:
+            for book in index.recommend(args.book, args.top_k):
+                print(f"ID: {book['book_id']}, Title: {book['title']}, Author: {book['author']}, "
+                      f"Borrowed by {book['members']} of the same readers")
+    finally:
+        db.disconnect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+# Branch lists the shards and is only filled in the global database. Every
+# shard logs the copies it sends in TransferOut and the transfers it has
+# taken in, by sender and id, in TransferIn; a transfer is two local
+# transactions, and the log lets an interrupted one be finished exactly once.
+# branch_shards.prepare creates these tables in the global database and in
+# every shard; the migrations leave them out of unsharded databases.
+BRANCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS Branch (
+    branch_id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    shard_path TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS TransferOut (
+    transfer_id INTEGER PRIMARY KEY,
+    to_branch INTEGER NOT NULL,
+    isbn TEXT NOT NULL,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL,
+    publication_year INTEGER NOT NULL,
+    genre TEXT,
+    copies INTEGER NOT NULL CHECK (copies > 0),
+    status TEXT NOT NULL DEFAULT 'Sent' CHECK (status IN ('Sent', 'Received')),
+    sent_date DATE NOT NULL,
+    received_date DATE
+);
+
+CREATE INDEX IF NOT EXISTS idx_transfer_out_sent ON TransferOut(transfer_id) WHERE status = 'Sent';
+
+CREATE TABLE IF NOT EXISTS TransferIn (
+    from_branch INTEGER NOT NULL,
+    transfer_id INTEGER NOT NULL,
+    book_id INTEGER NOT NULL,
+    copies INTEGER NOT NULL,
+    received_date DATE NOT NULL,
+    PRIMARY KEY (from_branch, transfer_id)
+) WITHOUT ROWID;
+"""
@@ -0,0 +1,442 @@
+import argparse
+import contextlib
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from branch_schema import BRANCH_SCHEMA
+from library_migrations import migrate
+from library_search import SEARCH_TARGETS, build_match_query
+from library_service import LibraryService, NotFoundError, ServiceError
+from loan_service import MAX_ACTIVE_LOANS, LoanError
+
+SCHEMA_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database_creation.sql")
+
+_, _, _, BOOK_RANK = SEARCH_TARGETS["book"]
+
+# One shard's best matches. Their bm25 ranks are not comparable with another
+# shard's: each shard weighs terms by its own document counts and lengths.
+RANKED_BOOKS = f"""
+SELECT Book.* FROM Book_fts
+JOIN Book ON Book.book_id = Book_fts.rowid
+WHERE Book_fts MATCH ?
+ORDER BY {BOOK_RANK}
+LIMIT ?
+"""
+
+# The shards' candidates are ranked together in one index over just them,
+# tokenized and weighted like Book_fts. Every candidate matches, so bm25's
+# IDF is the same for all of them: the order comes from term frequency and
+# field length under the same column weights.
+CANDIDATE_SCHEMA = """
+CREATE VIRTUAL TABLE Candidate USING fts5(title, author, isbn, tokenize='unicode61 remove_diacritics 2')
+"""
+
+RANKED_CANDIDATES = f"""
+SELECT rowid, {BOOK_RANK.replace("Book_fts", "Candidate")} AS rank FROM Candidate
+WHERE Candidate MATCH ?
+ORDER BY rank, rowid
+"""
+
+SEND_COPIES = """
+UPDATE Book SET total_copies = total_copies - :copies, available_copies = available_copies - :copies
+WHERE book_id = :book AND available_copies >= :copies AND total_copies > :copies
+RETURNING isbn, title, author, publication_year, genre
+"""
+
+# Transferred copies join the receiving branch's copies of the same ISBN, or
+# become a new book there.
+RECEIVE_COPIES = """
+INSERT INTO Book (title, author, isbn, publication_year, genre, total_copies, available_copies)
+VALUES (:title, :author, :isbn, :publication_year, :genre, :copies, :copies)
+ON CONFLICT(isbn) DO UPDATE SET
+    total_copies = total_copies + excluded.total_copies,
+    available_copies = available_copies + excluded.available_copies
+RETURNING book_id
+"""
+
+
+# A handful of rows, read whole when the library opens.
+BRANCHES = "SELECT branch_id, name, shard_path FROM Branch ORDER BY branch_id"
+
+# Only transfers not yet received are in idx_transfer_out_sent.
+PENDING_TRANSFERS = "SELECT * FROM TransferOut WHERE status = 'Sent' ORDER BY transfer_id"
+
+
+def today():
+    return datetime.now().strftime('%Y-%m-%d')
+
+
+def base_schema():
+    """Return the CREATE statements of database_creation.sql, without its sample rows"""
+    with open(SCHEMA_SCRIPT) as script:
+        return [statement for statement in script.read().split(";") if statement.strip().upper().startswith("CREATE")]
+
+
+def prepare(db_path):
+    """Create the base schema in a new database file, apply any pending migrations and add the branch tables"""
+    conn = sqlite3.connect(db_path)
+    try:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Book'").fetchone() is None:
+            for statement in base_schema():
+                conn.execute(statement)
+        migrate(conn)
+        conn.executescript(BRANCH_SCHEMA)
+    finally:
+        conn.close()
+
+
+def rerank(books, match):
+    """Rank the candidates of every branch by bm25 over all of them together, ties by branch and book"""
+    books = sorted(books, key=lambda book: (book["branch_id"], book["book_id"]))
+    scorer = sqlite3.connect(":memory:")
+    try:
+        scorer.execute(CANDIDATE_SCHEMA)
+        scorer.executemany(
+            "INSERT INTO Candidate (rowid, title, author, isbn) VALUES (?, ?, ?, ?)",
+            [(position, book["title"], book["author"], book["isbn"]) for position, book in enumerate(books)]
+        )
+        ranked = scorer.execute(RANKED_CANDIDATES, (match,)).fetchall()
+    finally:
+        scorer.close()
+    return [{**books[position], "rank": rank} for position, rank in ranked]
+
+
+class BranchShard:
+    """One branch's database of books, loans, holds and fines; members are read from the global database"""
+
+    def __init__(self, branch_id, name, db_path, members_path, readers=2):
+        # Imported here: library_management itself imports this module.
+        from connection_pool import ConnectionPool
+
+        self.branch_id = branch_id
+        self.name = name
+        self.db_path = db_path
+        self.members_path = members_path
+        self.pool = ConnectionPool(db_path, readers, setup=self.attach_members)
+        self.services = {id(db): LibraryService(db) for db in [self.pool.writer_db] + self.pool.reader_dbs}
+
+    def attach_members(self, db):
+        """Attach the global database read-only; a TEMP view named Member hides the shard's own, unused, table"""
+        # Read-only, so a shard's BEGIN IMMEDIATE locks only the shard:
+        # branches write in parallel, and only borrows take the global lock.
+        db.conn.execute("ATTACH DATABASE ? AS members", (Path(self.members_path).as_uri() + "?mode=ro",))
+        db.conn.execute("CREATE TEMP VIEW Member AS SELECT * FROM members.Member")
+
+    def run(self, method, **kwargs):
+        """Call a LibraryService method on this shard, on a reader connection if it only reads"""
+        if method in LibraryService.READ_OPERATIONS:
+            if method == "overdue":
+                # Readers are query_only; sweeps run with the other jobs.
+                kwargs["sweep"] = False
+            with self.pool.reader() as db:
+                return getattr(self.services[id(db)], method)(**kwargs)
+        with self.pool.writer() as db:
+            return getattr(self.services[id(db)], method)(**kwargs)
+
+    def ranked_books(self, match, limit):
+        """Return this branch's best limit matches, or its first limit books by id, tagged with the branch"""
+        with self.pool.reader() as db:
+            if match:
+                rows = db.execute(RANKED_BOOKS, (match, limit)).fetchall()
+            else:
+                rows = db.execute("SELECT * FROM Book ORDER BY book_id LIMIT ?", (limit,)).fetchall()
+        return [{**dict(row), "branch_id": self.branch_id, "branch": self.name} for row in rows]
+
+    def loans_out(self, member_id):
+        with self.pool.reader() as db:
+            row = db.execute(
+                "SELECT active_loans + overdue_loans FROM MemberLoanStats WHERE member_id = ?", (member_id,)
+            ).fetchone()
+        return row[0] if row is not None else 0
+
+    def send(self, book_id, copies, to_branch):
+        """Take copies of a book off this branch's shelf and log them as sent; return the transfer id"""
+        with self.pool.writer() as db, db.transaction(immediate=True):
+            book = db.execute(SEND_COPIES, {"copies": copies, "book": book_id}).fetchone()
+            if book is None:
+                raise ServiceError(
+                    f"Book {book_id} not found, or fewer than {copies} copies on the shelf; "
+                    f"a branch keeps at least one copy of each book it holds."
+                )
+            cursor = db.execute(
+                "INSERT INTO TransferOut (to_branch, isbn, title, author, publication_year, genre, copies, sent_date) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (to_branch, book["isbn"], book["title"], book["author"], book["publication_year"], book["genre"],
+                 copies, today())
+            )
+        return cursor.lastrowid
+
+    def receive(self, from_branch, transfer):
+        """Shelve the copies of a transfer unless they already were; return the receiving book id"""
+        with self.pool.writer() as db, db.transaction(immediate=True):
+            received = db.execute(
+                "SELECT book_id FROM TransferIn WHERE from_branch = ? AND transfer_id = ?",
+                (from_branch, transfer["transfer_id"])
+            ).fetchone()
+            if received is not None:
+                return received[0]
+            book_id = db.execute(RECEIVE_COPIES, dict(transfer)).fetchone()[0]
+            db.execute(
+                "INSERT INTO TransferIn (from_branch, transfer_id, book_id, copies, received_date) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (from_branch, transfer["transfer_id"], book_id, transfer["copies"], today())
+            )
+            # Patrons waiting here get the new copies first.
+            self.services[id(db)].loans.holds.fill(db, book_id)
+        return book_id
+
+    def mark_received(self, transfer_id):
+        with self.pool.writer() as db:
+            db.execute(
+                "UPDATE TransferOut SET status = 'Received', received_date = ? "
+                "WHERE transfer_id = ? AND status = 'Sent'",
+                (today(), transfer_id)
+            )
+
+    def transfer(self, transfer_id):
+        with self.pool.reader() as db:
+            return db.execute("SELECT * FROM TransferOut WHERE transfer_id = ?", (transfer_id,)).fetchone()
+
+    def pending_transfers(self):
+        """Return the transfers sent from this branch and not yet known to be received"""
+        with self.pool.reader() as db:
+            return db.execute(PENDING_TRANSFERS).fetchall()
+
+    def close(self):
+        self.pool.close()
+
+
+class ShardedLibrary:
+    """Branch-aware data layer: Book and Loan operations go to per-branch shards, Member stays global
+
+    The global database holds Member, Staff and the Branch list. Each branch
+    has its own shard, a complete library database whose connections attach
+    the global one, so loans, holds and fines at a branch read members as
+    before while books and loans never leave the branch. Searches across
+    branches run on every shard at once on a thread pool, and the shards'
+    candidates are ranked together.
+
+    A transfer between branches cannot be one transaction: SQLite commits
+    each WAL database separately. It is two, each logged: the sending shard
+    takes the copies off its shelf and records them in TransferOut, then the
+    receiving shard shelves them and records the transfer in TransferIn.
+    Receiving checks TransferIn first, so a transfer interrupted between the
+    two is finished exactly once by resume_transfers, which runs on open.
+    """
+
+    def __init__(self, db_path, readers=2, workers=8):
+        # Imported here: library_management itself imports this module.
+        from connection_pool import ConnectionPool
+
+        self.db_path = db_path
+        self.readers = readers
+        prepare(db_path)
+        self.pool = ConnectionPool(db_path, readers)
+        self.services = {id(db): LibraryService(db) for db in [self.pool.writer_db] + self.pool.reader_dbs}
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shard")
+        self.shards = {}
+        with self.pool.reader() as db:
+            branches = db.execute(BRANCHES).fetchall()
+        for branch_id, name, shard_path in branches:
+            self.open_shard(branch_id, name, shard_path)
+        self.resume_transfers()
+
+    def shard_file(self, shard_path):
+        """Shard paths are relative to the global database's directory"""
+        return os.path.join(os.path.dirname(os.path.abspath(self.db_path)), shard_path)
+
+    def open_shard(self, branch_id, name, shard_path):
+        path = self.shard_file(shard_path)
+        prepare(path)
+        self.shards[branch_id] = BranchShard(branch_id, name, path, os.path.abspath(self.db_path), self.readers)
+
+    def add_branch(self, name, shard_path):
+        """Register a branch and create its shard"""
+        try:
+            with self.pool.writer() as db:
+                branch_id = db.execute(
+                    "INSERT INTO Branch (name, shard_path) VALUES (?, ?)", (name, shard_path)
+                ).lastrowid
+        except sqlite3.IntegrityError:
+            raise ServiceError(f"Branch {name} already exists.")
+        self.open_shard(branch_id, name, shard_path)
+        return {"branch_id": branch_id}
+
+    def branches(self):
+        return [{"branch_id": shard.branch_id, "name": shard.name, "shard_path": shard.db_path}
+                for shard in self.shards.values()]
+
+    def shard(self, branch):
+        try:
+            return self.shards[branch]
+        except KeyError:
+            raise NotFoundError(f"Branch {branch} not found.")
+
+    def on_branch(self, branch, method, **kwargs):
+        """Run a LibraryService operation on one branch's shard"""
+        return self.shard(branch).run(method, **kwargs)
+
+    def on_members(self, method, **kwargs):
+        """Run a LibraryService operation, such as register_member or search_staff, on the global database"""
+        if method in LibraryService.READ_OPERATIONS:
+            with self.pool.reader() as db:
+                return getattr(self.services[id(db)], method)(**kwargs)
+        with self.pool.writer() as db:
+            return getattr(self.services[id(db)], method)(**kwargs)
+
+    def fan_out(self, call):
+        """Call call(shard) for every branch in parallel; return {branch_id: result}"""
+        futures = {branch_id: self.executor.submit(call, shard) for branch_id, shard in self.shards.items()}
+        return {branch_id: future.result() for branch_id, future in futures.items()}
+
+    def for_each_branch(self, method, **kwargs):
+        """Run a LibraryService operation, such as sweep_overdue, on every shard"""
+        return self.fan_out(lambda shard: shard.run(method, **kwargs))
+
+    def search_books(self, term, page=1, page_size=20):
+        """Search every branch's catalog in parallel; return one page of the merged ranking"""
+        match = build_match_query(term)
+        offset = (max(page, 1) - 1) * page_size
+        # Each branch's top offset + page_size is enough for the merged page.
+        results = self.fan_out(lambda shard: shard.ranked_books(match, offset + page_size))
+        if not match:
+            # Every branch's books by id, in one order.
+            merged = heapq.merge(*results.values(), key=lambda book: (book["book_id"], book["branch_id"]))
+            return list(itertools.islice(merged, offset, offset + page_size))
+        return rerank([book for books in results.values() for book in books], match)[offset:offset + page_size]
+
+    def loans_out(self, member):
+        return sum(self.fan_out(lambda shard: shard.loans_out(member)).values())
+
+    @contextmanager
+    def member_lock(self):
+        """Hold the global database's write lock, serializing every branch's borrows and member removals
+
+        BEGIN IMMEDIATE takes the lock a write would, from any thread or
+        process; shards attach the global database read-only, so nothing
+        else at a branch waits for it.
+        """
+        with self.pool.writer() as db, db.transaction(immediate=True):
+            yield db
+
+    def borrow(self, branch, member, book):
+        """Lend a copy at a branch, counting the member's loans at every branch toward the limit"""
+        shard = self.shard(branch)
+        # Held from the count until the loan commits at the branch.
+        with self.member_lock():
+            if self.loans_out(member) >= MAX_ACTIVE_LOANS:
+                raise LoanError(f"Member has reached the maximum loan limit ({MAX_ACTIVE_LOANS} books)!")
+            return shard.run("borrow", member=member, book=book)
+
+    def remove_member(self, member):
+        """Remove a member with no books on loan at any branch"""
+        # Under the borrows' lock, so no loan starts between the check and
+        # the delete.
+        with self.member_lock() as db:
+            if self.loans_out(member):
+                raise ServiceError(f"Member {member} still has books on loan.")
+            return self.services[id(db)].remove_member(member=member)
+
+    def transfer(self, from_branch, to_branch, book, copies=1):
+        """Move copies of a book from one branch's shelf to another's"""
+        if from_branch == to_branch:
+            raise ServiceError("A transfer needs two different branches.")
+        if copies <= 0:
+            raise ServiceError("Transfer at least one copy.")
+        source = self.shard(from_branch)
+        self.shard(to_branch)
+        transfer_id = source.send(book, copies, to_branch)
+        book_id = self.deliver(source, source.transfer(transfer_id))
+        return {"transfer_id": transfer_id, "from_branch": from_branch, "to_branch": to_branch,
+                "book_id": book_id, "copies": copies}
+
+    def deliver(self, source, transfer):
+        """Shelve a sent transfer at its branch, then mark it received at the sender"""
+        book_id = self.shard(transfer["to_branch"]).receive(source.branch_id, transfer)
+        source.mark_received(transfer["transfer_id"])
+        return book_id
+
+    def resume_transfers(self):
+        """Finish every transfer that was sent but not marked received; return how many"""
+        resumed = 0
+        for shard in self.shards.values():
+            for transfer in shard.pending_transfers():
+                self.deliver(shard, transfer)
+                resumed += 1
+        return resumed
+
+    def close(self):
+        self.executor.shutdown()
+        for shard in self.shards.values():
+            shard.close()
+        self.pool.close()
+
+
+# Maintenance run on every shard by run-jobs, as the HTTP server runs them on
+# its one database.
+BRANCH_JOBS = ("sweep_overdue", "expire_holds", "assess_fines", "refresh_reports", "update_recommendations")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Branch shards: add branches, search them all, transfer books")
+    parser.add_argument("--db", default="library_management.db", help="the global database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("branches", help="List the branches and their shards")
+    add = subparsers.add_parser("add-branch", help="Register a branch and create its shard")
+    add.add_argument("name")
+    add.add_argument("shard_path", help="shard database file, relative to the global database")
+    search = subparsers.add_parser("search-books", help="Search books at every branch")
+    search.add_argument("term")
+    search.add_argument("--page", type=int, default=1)
+    search.add_argument("--page-size", type=int, default=20)
+    for name, help_text in (("borrow", "Lend a copy at a branch"), ("return", "Return a loan at a branch")):
+        loan = subparsers.add_parser(name, help=help_text)
+        loan.add_argument("--branch", type=int, required=True)
+        loan.add_argument("--member", type=int, required=True)
+        loan.add_argument("--book", type=int, required=True)
+    transfer = subparsers.add_parser("transfer", help="Move copies of a book to another branch")
+    transfer.add_argument("--from", dest="from_branch", type=int, required=True)
+    transfer.add_argument("--to", dest="to_branch", type=int, required=True)
+    transfer.add_argument("--book", type=int, required=True)
+    transfer.add_argument("--copies", type=int, default=1)
+    subparsers.add_parser("run-jobs", help="Run the overdue sweep and the other periodic jobs at every branch")
+    args = parser.parse_args()
+
+    # stdout carries only JSON; migration notices go to stderr.
+    with contextlib.redirect_stdout(sys.stderr):
+        library = ShardedLibrary(args.db)
+    try:
+        if args.command == "branches":
+            result = library.branches()
+        elif args.command == "add-branch":
+            with contextlib.redirect_stdout(sys.stderr):
+                result = library.add_branch(args.name, args.shard_path)
+        elif args.command == "search-books":
+            result = library.search_books(args.term, args.page, args.page_size)
+        elif args.command == "borrow":
+            result = library.borrow(args.branch, args.member, args.book)
+        elif args.command == "return":
+            result = library.on_branch(args.branch, "return_book", member=args.member, book=args.book)
+        elif args.command == "transfer":
+            result = library.transfer(args.from_branch, args.to_branch, args.book, args.copies)
+        else:
+            result = {job: library.for_each_branch(job) for job in BRANCH_JOBS}
+    except (ServiceError, LoanError, sqlite3.Error) as e:
+        print(json.dumps({"command": args.command, "ok": False, "error": str(e)}))
+        return 1
+    finally:
+        library.close()
+    print(json.dumps({"command": args.command, "ok": True, "result": result}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
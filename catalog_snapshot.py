@@ -0,0 +1,374 @@
+import argparse
+import bisect
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+
+from book_recommendations import unpack
+from library_management import LibraryDatabase
+from library_search import TOKEN_PATTERN
+
+SNAPSHOT_ROWS = """
+SELECT book_id, title, author, isbn, publication_year, genre, total_copies, available_copies
+FROM Book ORDER BY book_id
+"""
+
+NEIGHBOR_ROWS = "SELECT book_id, neighbors FROM BookNeighbors"
+
+# Column bits of a posting, and the weight of a match in each column. These
+# are the bm25 column weights of the full-text search, used as fixed scores:
+# a title hit outranks an author hit, which outranks an ISBN hit, but term
+# frequency and field length are ignored, so books that match in the same
+# columns keep book_id order rather than bm25's.
+TITLE, AUTHOR, ISBN = 1, 2, 4
+COLUMN_WEIGHTS = {TITLE: 10, AUTHOR: 5, ISBN: 1}
+MASK_WEIGHTS = [sum(weight for bit, weight in COLUMN_WEIGHTS.items() if mask & bit) for mask in range(8)]
+
+NO_YEAR = -(2 ** 31)
+
+
+def fold(text):
+    """Lower-case text and strip diacritics, like the unicode61 tokenizer with remove_diacritics"""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokens(text):
+    return TOKEN_PATTERN.findall(fold(text or ""))
+
+
+class StringColumn:
+    """Strings packed end to end into one UTF-8 buffer, with an offset per row"""
+
+    __slots__ = ("data", "offsets")
+
+    def __init__(self, values):
+        encoded = [(value or "").encode("utf-8") for value in values]
+        self.offsets = array("I", [0])
+        for value in encoded:
+            self.offsets.append(self.offsets[-1] + len(value))
+        self.data = b"".join(encoded)
+
+    def __getitem__(self, row):
+        return self.data[self.offsets[row]:self.offsets[row + 1]].decode("utf-8")
+
+
+class CodedColumn:
+    """Repetitive strings such as authors and genres, stored once each (interned) and referenced by code"""
+
+    __slots__ = ("values", "codes")
+
+    def __init__(self, values):
+        self.values = []
+        self.codes = array("I")
+        codes = {}
+        for value in values:
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(self.values)
+                self.values.append(sys.intern(value) if isinstance(value, str) else value)
+            self.codes.append(code)
+
+    def __getitem__(self, row):
+        return self.values[self.codes[row]]
+
+
+class BookRecord:
+    """One book materialized from a snapshot; indexable like a sqlite3.Row"""
+
+    __slots__ = ("book_id", "title", "author", "isbn", "publication_year", "genre", "total_copies",
+                 "available_copies")
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+    def keys(self):
+        return self.__slots__
+
+
+class CatalogSnapshot:
+    """Read-only, column-oriented copy of Book with a prebuilt token index for search
+
+    Rows are positions in book_id order. The index maps every folded token of
+    a title, author or ISBN to the rows containing it, with a column mask per
+    row; its terms are sorted, so a prefix is one binary search away. The
+    co-borrowing neighbors of each row are kept the same way, end to end.
+    """
+
+    def __init__(self, rows, loaded_at=None, neighbors=()):
+        rows = list(rows)
+        self.loaded_at = loaded_at if loaded_at is not None else time.time()
+        self.book_ids = array("q", (row[0] for row in rows))
+        self.titles = StringColumn(row[1] for row in rows)
+        self.authors = CodedColumn(row[2] for row in rows)
+        self.isbns = StringColumn(row[3] for row in rows)
+        self.years = array("i", (NO_YEAR if row[4] is None else row[4] for row in rows))
+        self.genres = CodedColumn(row[5] for row in rows)
+        self.total_copies = array("i", (row[6] for row in rows))
+        self.available_copies = array("i", (row[7] for row in rows))
+        self.build_index(rows)
+        self.build_neighbors(neighbors)
+
+    def build_index(self, rows):
+        postings = {}
+        for position, row in enumerate(rows):
+            masks = {}
+            for bit, text in ((TITLE, row[1]), (AUTHOR, row[2]), (ISBN, row[3])):
+                for token in tokens(text):
+                    masks[token] = masks.get(token, 0) | bit
+            for token, mask in masks.items():
+                postings.setdefault(token, []).append((position << 3) | mask)
+        # Every posting list end to end in one array, term by term, with the
+        # start of each term's list in term_starts: a few bytes per posting
+        # instead of an object per term.
+        terms = sorted(postings)
+        self.terms = StringColumn(terms)
+        self.term_count = len(terms)
+        self.term_starts = array("I", [0])
+        self.positions = array("I")
+        self.masks = bytearray()
+        for term in terms:
+            for posting in postings[term]:
+                self.positions.append(posting >> 3)
+                self.masks.append(posting & 7)
+            self.term_starts.append(len(self.positions))
+
+    def build_neighbors(self, neighbors):
+        """Keep each row's co-borrowed books as positions, best first; books no longer in the catalog are dropped"""
+        lists = {}
+        for book_id, blob in neighbors:
+            position = self.position(book_id)
+            if position is not None:
+                lists[position] = [other for other in (self.position(other_id) for other_id, _ in unpack(blob))
+                                   if other is not None]
+        self.neighbor_starts = array("I", [0])
+        self.neighbor_positions = array("I")
+        for position in range(len(self.book_ids)):
+            self.neighbor_positions.extend(lists.get(position, ()))
+            self.neighbor_starts.append(len(self.neighbor_positions))
+
+    @classmethod
+    def from_database(cls, db):
+        """Build a snapshot from one consistent read of Book and its co-borrowing neighbors"""
+        loaded_at = time.time()
+        with db.transaction():
+            rows = db.execute(SNAPSHOT_ROWS).fetchall()
+            try:
+                neighbors = db.conn.execute(NEIGHBOR_ROWS).fetchall()
+            except sqlite3.OperationalError:
+                # A database from before the recommendations were added.
+                neighbors = []
+        return cls(rows, loaded_at, neighbors)
+
+    def __len__(self):
+        return len(self.book_ids)
+
+    def record(self, position):
+        year = self.years[position]
+        return BookRecord(
+            self.book_ids[position], self.titles[position], self.authors[position], self.isbns[position],
+            None if year == NO_YEAR else year, self.genres[position],
+            self.total_copies[position], self.available_copies[position],
+        )
+
+    def position(self, book_id):
+        """Return the row of a book id, or None"""
+        position = bisect.bisect_left(self.book_ids, book_id)
+        if position < len(self.book_ids) and self.book_ids[position] == book_id:
+            return position
+        return None
+
+    def get_book(self, book_id):
+        """Return one book by id, or None"""
+        position = self.position(book_id)
+        return None if position is None else self.record(position)
+
+    def also_borrowed(self, book_id, limit=3):
+        """Return the books most often borrowed by readers of a book, best first"""
+        position = self.position(book_id)
+        if position is None:
+            return []
+        start = self.neighbor_starts[position]
+        end = min(self.neighbor_starts[position + 1], start + limit)
+        return [self.record(other) for other in self.neighbor_positions[start:end]]
+
+    def list_books(self, after=None, limit=20):
+        """Return up to limit books in book_id order after a book_id, like a keyset page"""
+        start = 0 if after is None else bisect.bisect_right(self.book_ids, after)
+        return [self.record(position) for position in range(start, min(start + limit, len(self.book_ids)))]
+
+    def first_term(self, prefix):
+        """Binary search for the index of the first term not less than prefix"""
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.terms[middle] < prefix:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def prefix_matches(self, prefix):
+        """Return {position: column mask} over every term starting with prefix"""
+        matches = {}
+        index = self.first_term(prefix)
+        while index < self.term_count and self.terms[index].startswith(prefix):
+            start, end = self.term_starts[index], self.term_starts[index + 1]
+            for position, mask in zip(self.positions[start:end], self.masks[start:end]):
+                matches[position] = matches.get(position, 0) | mask
+            index += 1
+        return matches
+
+    def search_books(self, search_term, page=1, page_size=20):
+        """Return one page of books matching every word of search_term as a prefix, best matches first"""
+        words = tokens(search_term)
+        offset = (max(page, 1) - 1) * page_size
+        if not words:
+            return [self.record(position) for position in range(offset, min(offset + page_size, len(self)))]
+        # Rarest-looking (longest) word first keeps the intersection small.
+        words.sort(key=len, reverse=True)
+        scores = None
+        for word in words:
+            matches = self.prefix_matches(word)
+            if scores is None:
+                scores = {position: MASK_WEIGHTS[mask] for position, mask in matches.items()}
+            else:
+                scores = {position: score + MASK_WEIGHTS[matches[position]]
+                          for position, score in scores.items() if position in matches}
+            if not scores:
+                return []
+        ranked = sorted(scores, key=lambda position: (-scores[position], position))
+        return [self.record(position) for position in ranked[offset:offset + page_size]]
+
+
+class KioskCatalog:
+    """The current snapshot of a database, swapped for a fresh one on reload"""
+
+    def __init__(self, db_path, reload_interval=300.0):
+        self.db_path = db_path
+        self.reload_interval = reload_interval
+        self.snapshot = None
+        self.stopped = threading.Event()
+        self.reload()
+
+    def reload(self):
+        """Read Book and the recommendations into a new snapshot and swap it in; searches under way finish on the old one"""
+        db = LibraryDatabase(self.db_path, verbose=False)
+        if not db.connect():
+            raise Exception(f"Failed to connect to the database {self.db_path}.")
+        try:
+            snapshot = CatalogSnapshot.from_database(db)
+        finally:
+            # The file is only open while a snapshot is read.
+            db.disconnect()
+        # Replacing one attribute is atomic; no reader sees a half-built index.
+        self.snapshot = snapshot
+        return snapshot
+
+    def reload_periodically(self):
+        while not self.stopped.wait(self.reload_interval):
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"Snapshot reload failed: {e}", file=sys.stderr)
+
+    def start(self):
+        """Reload every reload_interval seconds on a background thread"""
+        threading.Thread(target=self.reload_periodically, name="snapshot-reload", daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+
+
+class Kiosk:
+    """Public catalog terminal: search and browse books from a snapshot, never from SQL"""
+
+    def __init__(self, catalog, page_size=20):
+        self.catalog = catalog
+        self.page_size = page_size
+
+    def display_menu(self):
+        """Display the kiosk menu until the user exits"""
+        while True:
+            print("\nLibrary Catalog")
+            print("1. Search Books")
+            print("2. View All Books")
+            print("0. Exit")
+            choice = input("Enter your choice: ")
+            if choice == "1":
+                self.search_books()
+            elif choice == "2":
+                self.view_all_books()
+            elif choice == "0":
+                print("Exiting...")
+                return
+            else:
+                print("Invalid choice.")
+
+    def search_books(self):
+        """Search for books by title, author, or ISBN"""
+        search_term = input("Enter search term (title, author, or ISBN): ").strip()
+        page = 1
+        while True:
+            books = self.catalog.snapshot.search_books(search_term, page, self.page_size)
+            if not books:
+                print("No books found matching the search term." if page == 1 else "No more results.")
+                return
+            for book in books:
+                self.print_book(book)
+                also = self.catalog.snapshot.also_borrowed(book.book_id)
+                if also:
+                    print(f"    Readers who borrowed this also borrowed: {'; '.join(other.title for other in also)}")
+            if len(books) < self.page_size or input("Enter 'n' for more results: ").strip().lower() != "n":
+                return
+            page += 1
+
+    def view_all_books(self):
+        """View all books, one page at a time"""
+        after = None
+        while True:
+            books = self.catalog.snapshot.list_books(after, self.page_size)
+            if not books:
+                print("No books found." if after is None else "No more books.")
+                return
+            print("\nAll Books:")
+            for book in books:
+                self.print_book(book)
+            if input("Enter 'n' for the next page, or press Enter to finish: ").strip().lower() != "n":
+                return
+            after = books[-1].book_id
+
+    def print_book(self, book):
+        """Print a single book"""
+        print(f"ID: {book.book_id}, Title: {book.title}, Author: {book.author}, "
+              f"ISBN: {book.isbn}, Year: {book.publication_year}, "
+              f"Genre: {book.genre}, Available Copies: {book.available_copies} of {book.total_copies}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read-only catalog kiosk served from an in-memory snapshot")
+    parser.add_argument("--db", default="library_management.db")
+    parser.add_argument("--reload-interval", type=float, default=300.0, help="seconds between snapshot reloads")
+    args = parser.parse_args()
+
+    catalog = KioskCatalog(args.db, args.reload_interval)
+    catalog.start()
+    try:
+        Kiosk(catalog).display_menu()
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        catalog.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+import argparse
+import bisect
+import contextlib
+import heapq
+import json
+import sys
+import threading
+import time
+
+# One row per book: just the columns the summary answers from, with the
+# circulation counter already joined in.
+SUMMARY_ROWS = """
+SELECT Book.book_id, Book.isbn, Book.genre, Book.publication_year, Book.total_copies, Book.available_copies,
+       COALESCE(BookCirculation.total_loans, 0)
+FROM Book
+LEFT JOIN BookCirculation ON BookCirculation.book_id = Book.book_id
+"""
+
+SUMMARY_ROW = SUMMARY_ROWS + "WHERE Book.book_id = ?"
+
+# Fields of a book entry: (isbn, genre, decade, total_copies, available_copies, total_loans)
+ISBN, GENRE, DECADE, TOTAL, AVAILABLE, LOANS = range(6)
+
+
+def decade_of(year):
+    return year // 10 * 10 if isinstance(year, int) else None
+
+
+class CatalogSummary:
+    """In-memory availability, genre and decade facets, and circulation ranking of the whole catalog
+
+    Built from Book with one scan and then kept current one book at a time:
+    every path that changes a book or lends or returns a copy calls
+    refresh_book, which re-reads that book's row and moves its contribution.
+    Queries never touch the database.
+    """
+
+    def __init__(self, max_age=300.0):
+        # Like the entity cache TTL, max_age bounds how long changes made by
+        # another process (which cannot refresh this summary) stay invisible.
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.loaded_at = None
+        self.changed_while_loading = None
+        self.clear()
+
+    def clear(self):
+        """Forget everything; the next query rebuilds the summary"""
+        with self.lock:
+            self.loaded_at = None
+            self.books = {}
+            self.by_isbn = {}
+            self.genres = {}
+            self.decades = {}
+            # Circulation ranking: total_loans -> book ids, plus the distinct
+            # totals in ascending order. Lending a copy moves one id up one
+            # level, so the ranking never needs sorting.
+            self.levels = {}
+            self.level_keys = []
+
+    def is_stale(self):
+        return self.loaded_at is None or (
+            self.max_age is not None and time.monotonic() - self.loaded_at > self.max_age
+        )
+
+    def ensure_loaded(self, db):
+        """Build the summary on first use, and again once it is older than max_age"""
+        if self.is_stale():
+            self.load(db)
+        return self
+
+    def load(self, db):
+        """Rebuild the summary with one scan of Book"""
+        loaded_at = time.monotonic()
+        with self.lock:
+            self.changed_while_loading = set()
+        rows = db.execute(SUMMARY_ROWS).fetchall()
+        with self.lock:
+            # Books refreshed during the scan may be older in rows than in
+            # the entries being replaced; they are read again below.
+            changed, self.changed_while_loading = self.changed_while_loading, None
+            self.books, self.by_isbn, self.genres, self.decades = {}, {}, {}, {}
+            self.levels, self.level_keys = {}, []
+            for book_id, isbn, genre, year, total, available, loans in rows:
+                self.add(book_id, (isbn, genre, decade_of(year), total, available, loans))
+            self.loaded_at = loaded_at
+        for book_id in changed:
+            self.refresh_book(db, book_id)
+
+    def refresh_book(self, db, book_id):
+        """Bring one book's entry in line with its row, after it was added, changed, removed, lent or returned"""
+        with self.lock:
+            if self.changed_while_loading is not None:
+                self.changed_while_loading.add(book_id)
+            if self.loaded_at is None:
+                return
+        row = db.execute(SUMMARY_ROW, (book_id,)).fetchone()
+        with self.lock:
+            if book_id in self.books:
+                self.remove(book_id)
+            if row is not None:
+                _, isbn, genre, year, total, available, loans = row
+                self.add(book_id, (isbn, genre, decade_of(year), total, available, loans))
+
+    # Maintenance; callers hold the lock.
+
+    def add(self, book_id, entry):
+        self.books[book_id] = entry
+        self.by_isbn[entry[ISBN]] = book_id
+        for facets, value in ((self.genres, entry[GENRE]), (self.decades, entry[DECADE])):
+            counts = facets.setdefault(value, [0, 0, 0, 0])
+            counts[0] += 1
+            counts[1] += entry[TOTAL]
+            counts[2] += entry[AVAILABLE]
+            counts[3] += entry[LOANS]
+        level = self.levels.get(entry[LOANS])
+        if level is None:
+            level = self.levels[entry[LOANS]] = set()
+            bisect.insort(self.level_keys, entry[LOANS])
+        level.add(book_id)
+
+    def remove(self, book_id):
+        entry = self.books.pop(book_id)
+        if self.by_isbn.get(entry[ISBN]) == book_id:
+            del self.by_isbn[entry[ISBN]]
+        for facets, value in ((self.genres, entry[GENRE]), (self.decades, entry[DECADE])):
+            counts = facets[value]
+            counts[0] -= 1
+            counts[1] -= entry[TOTAL]
+            counts[2] -= entry[AVAILABLE]
+            counts[3] -= entry[LOANS]
+            if counts[0] == 0:
+                del facets[value]
+        level = self.levels[entry[LOANS]]
+        level.discard(book_id)
+        if not level:
+            del self.levels[entry[LOANS]]
+            del self.level_keys[bisect.bisect_left(self.level_keys, entry[LOANS])]
+
+    # Queries
+
+    def availability(self, book_id=None, isbn=None):
+        """Copies of one book, by id or ISBN, or None if there is no such book"""
+        with self.lock:
+            if book_id is None:
+                book_id = self.by_isbn.get(isbn)
+            entry = self.books.get(book_id)
+            if entry is None:
+                return None
+            return {
+                "book_id": book_id,
+                "isbn": entry[ISBN],
+                "total_copies": entry[TOTAL],
+                "available_copies": entry[AVAILABLE],
+                "on_loan": entry[TOTAL] - entry[AVAILABLE],
+            }
+
+    @staticmethod
+    def facet_rows(name, facets):
+        return sorted(
+            ({name: value, "titles": titles, "copies": copies, "available": available, "total_loans": loans}
+             for value, (titles, copies, available, loans) in facets.items()),
+            key=lambda row: (-row["titles"], str(row[name]))
+        )
+
+    def genre_facets(self):
+        """Titles, copies, available copies and loans per genre, largest genre first"""
+        with self.lock:
+            return self.facet_rows("genre", self.genres)
+
+    def decade_facets(self):
+        """The same counts per publication decade, oldest first"""
+        with self.lock:
+            return sorted(self.facet_rows("decade", self.decades),
+                          key=lambda row: (row["decade"] is None, row["decade"] or 0))
+
+    def facets_of(self, book_ids):
+        """Genre and decade counts over a set of books, such as the matches of a search"""
+        genres, decades = {}, {}
+        with self.lock:
+            for book_id in book_ids:
+                entry = self.books.get(book_id)
+                if entry is None:
+                    continue
+                for facets, value in ((genres, entry[GENRE]), (decades, entry[DECADE])):
+                    counts = facets.setdefault(value, [0, 0, 0, 0])
+                    counts[0] += 1
+                    counts[1] += entry[TOTAL]
+                    counts[2] += entry[AVAILABLE]
+                    counts[3] += entry[LOANS]
+        return {"genres": self.facet_rows("genre", genres), "decades": self.facet_rows("decade", decades)}
+
+    def top_circulating(self, limit=10, genre=None):
+        """The most borrowed books, optionally within one genre, ties broken by book id"""
+        top = []
+        with self.lock:
+            for loans in reversed(self.level_keys):
+                level = self.levels[loans]
+                if genre is not None:
+                    level = [book_id for book_id in level if self.books[book_id][GENRE] == genre]
+                for book_id in heapq.nsmallest(limit - len(top), level):
+                    entry = self.books[book_id]
+                    top.append({"book_id": book_id, "genre": entry[GENRE], "total_loans": loans,
+                                "on_loan": entry[TOTAL] - entry[AVAILABLE]})
+                if len(top) >= limit:
+                    break
+        return top
+
+    def stats(self):
+        with self.lock:
+            return {
+                "books": len(self.books),
+                "genres": len(self.genres),
+                "decades": len(self.decades),
+                "circulation_levels": len(self.level_keys),
+                "age_seconds": None if self.loaded_at is None else round(time.monotonic() - self.loaded_at, 1),
+            }
+
+
+class DeferredRefresh:
+    """Stands in for a CatalogSummary inside a write transaction others can read around
+
+    Readers on other connections must not see a change before it commits,
+    so refresh_book only notes the book; publish re-reads the noted books
+    into the shared summary after COMMIT. clear, called when the
+    transaction rolled back, drops the notes: nothing was published.
+    """
+
+    def __init__(self, summary):
+        self.summary = summary
+        self.book_ids = set()
+
+    def refresh_book(self, db, book_id):
+        self.book_ids.add(book_id)
+
+    def clear(self):
+        self.book_ids = set()
+
+    def publish(self, db):
+        """Refresh every noted book from committed data; call outside any transaction"""
+        book_ids, self.book_ids = self.book_ids, set()
+        for book_id in book_ids:
+            self.summary.refresh_book(db, book_id)
+
+
+def main():
+    # Imported here: library_management itself imports this module.
+    from library_management import LibraryDatabase
+    from library_migrations import migrate
+
+    parser = argparse.ArgumentParser(description="Print catalog facets and the most borrowed books")
+    parser.add_argument("--db", default="library_management.db")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    db = LibraryDatabase(args.db, verbose=False)
+    if not db.connect():
+        return
+    try:
+        # Migration messages go to stderr so stdout stays JSON.
+        with contextlib.redirect_stdout(sys.stderr):
+            migrate(db.conn)
+        started = time.perf_counter()
+        summary = CatalogSummary().ensure_loaded(db)
+        print(f"Built the summary of {len(summary.books)} books in {time.perf_counter() - started:.2f}s.")
+        print(json.dumps({
+            "genres": summary.genre_facets(),
+            "decades": summary.decade_facets(),
+            "top": summary.top_circulating(args.top),
+        }, indent=2))
+    finally:
+        db.disconnect()
+
+
+if __name__ == "__main__":
+    main()
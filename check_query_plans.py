@@ -0,0 +1,305 @@
+import builtins
+import contextlib
+import io
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+from book_recommendations import BASKETS, CoBorrowingIndex
+from branch_shards import BRANCHES, PENDING_TRANSFERS, ShardedLibrary
+from catalog_snapshot import NEIGHBOR_ROWS, SNAPSHOT_ROWS, CatalogSnapshot
+from catalog_summary import SUMMARY_ROWS
+from circulation_counters import BOOK_MISMATCHES, MEMBER_MISMATCHES, CirculationCounters
+from circulation_reports import COUNTED_LOANS, RECOUNT_RETURNS, CirculationReports, statements
+from library_export import EXPORT_TABLES, TABLE_ROWS, export_all
+from library_import import import_file
+from library_management import LibraryDatabase, LibraryManagementSystem
+from loan_archive import ROW_COUNT, LoanArchiver
+from loan_fines import FINE_POLICIES
+
+SCHEMA_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database_creation.sql")
+
+# Every menu operation, with the answers it reads from input(). Together with
+# the JOBS below they issue every statement the application sends to SQLite.
+OPERATIONS = [
+    # First, so the operations below also refresh the loaded summary.
+    ("view_catalog_summary", []),
+    ("borrow_book", ["1", "4"]),
+    ("renew_book", ["1", "4"]),
+    ("return_book", ["1", "4"]),
+    ("view_overdue_loans", ["n", "p", ""]),
+    ("view_active_loans", ["n", "p", ""]),
+    ("view_most_borrowed", []),
+    # Book 10 has one copy on the shelf: lend it, queue a hold, and return it
+    # so the copy is set aside for the hold and then borrowed through it.
+    ("borrow_book", ["2", "10"]),
+    ("place_hold", ["3", "10"]),
+    ("view_book_holds", ["10"]),
+    ("return_book", ["2", "10"]),
+    ("borrow_book", ["3", "10"]),
+    ("place_hold", ["4", "10"]),
+    ("cancel_hold", ["4", "10"]),
+    ("set_fine_policy", ["Fiction", "Student", "10", "2", "500"]),
+    ("view_fine_policies", []),
+    ("assess_fines", []),
+    ("view_member_fines", ["1"]),
+    ("pay_fine", ["1"]),
+    ("view_loans_per_day", ["", ""]),
+    ("view_top_titles", ["2020-01-01", ""]),
+    ("view_genre_demand", ["", ""]),
+    ("view_loan_duration", ["", ""]),
+    ("view_member_cohorts", ["", ""]),
+    # Builds the recommendations, then borrows so the next look is an update.
+    ("view_also_borrowed", ["4"]),
+    ("borrow_book", ["1", "10"]),
+    ("view_also_borrowed", ["4"]),
+    ("add_book", ["Plan Book", "Plan Author", "PLAN-0001", "2020", "Testing", "2"]),
+    ("update_book", ["1", "New Title", "", "", "", "", ""]),
+    ("update_book", ["1", "", "", "", "", "", "4"]),
+    ("view_all_books", ["n", "n", "p", ""]),
+    ("search_books", ["tolkien"]),
+    ("search_books", ["978-0-74"]),
+    ("register_member", ["Plan", "Member", "plan.member@example.com", "", "", "", "", "", "Student"]),
+    ("update_member", ["1", "", "", "", "555-0100", "", "", "", "", ""]),
+    ("view_all_members", ["n", "p", ""]),
+    ("search_members", ["john smith"]),
+    ("add_staff", ["Plan", "Staff", "plan.staff@example.com", "", "Clerk"]),
+    ("update_staff", ["1", "", "", "", "", "Manager"]),
+    ("view_all_staff", ["n", "p", ""]),
+    ("search_staff", ["alice"]),
+    ("authorize_staff", ["1"]),
+    ("remove_book", ["3"]),
+    ("remove_member", ["8"]),
+    ("remove_staff", ["4"]),
+]
+
+
+def import_files(system, tmp):
+    books = os.path.join(tmp, "books.csv")
+    with open(books, "w", encoding="utf-8") as output:
+        output.write("title,author,isbn,publication_year,genre,total_copies\n"
+                     "Plan Import,Plan Author,PLAN-0002,2021,Testing,3\n"
+                     "The Hobbit,J.R.R. Tolkien,978-0-261-10221-4,1937,Fantasy,1\n")
+    members = os.path.join(tmp, "members.jsonl")
+    with open(members, "w", encoding="utf-8") as output:
+        output.write(json.dumps({"first_name": "Plan", "last_name": "Import", "email": "plan.import@example.com",
+                                 "member_type": "Student"}) + "\n")
+    import_file(system.db, "books", books)
+    import_file(system.db, "members", members)
+
+
+def archive_loans(system, tmp):
+    archiver = LoanArchiver(system.db, os.path.join(tmp, "history.db"), partition_by_year=True)
+    archiver.run(keep_days=0)
+    archiver.member_history(1)
+    archiver.stats()
+    # Reports and recommendations rebuilt over the archive just written.
+    CirculationReports(system.db).rebuild(archiver)
+    index = CoBorrowingIndex(system.db, archiver=archiver)
+    index.rebuild()
+    index.update()
+
+
+def branch_shards(system, tmp):
+    library = ShardedLibrary(os.path.join(tmp, "global.db"), readers=1, workers=2)
+    try:
+        library.add_branch("North", "north.db")
+        library.add_branch("South", "south.db")
+        member = library.on_members("register_member", first_name="Plan", last_name="Branch",
+                                    email="plan.branch@example.com")["member_id"]
+        book = library.on_branch(1, "add_book", title="Plan Shard", author="Plan Author", isbn="PLAN-0003",
+                                 year=2022, genre="Testing", copies=3)["book_id"]
+        library.search_books("plan")
+        library.search_books("")
+        library.borrow(1, member, book)
+        transfer = library.transfer(1, 2, book)
+        library.on_branch(1, "return_book", member=member, book=book)
+        library.loans_out(member)
+        for job in ("sweep_overdue", "expire_holds", "assess_fines", "refresh_reports", "update_recommendations"):
+            library.for_each_branch(job)
+        library.on_branch(2, "get_book", book=transfer["book_id"])
+        library.resume_transfers()
+    finally:
+        library.close()
+
+
+# The jobs outside the menus, run after the OPERATIONS on the same database.
+JOBS = [
+    ("library_import", import_files),
+    ("CirculationReports.refresh", lambda system, tmp: CirculationReports(system.db).refresh()),
+    ("LoanArchiver.run", archive_loans),
+    ("CirculationCounters.verify", lambda system, tmp: CirculationCounters(system.db).verify()),
+    ("CatalogSnapshot.from_database", lambda system, tmp: CatalogSnapshot.from_database(system.db)),
+    ("library_export", lambda system, tmp: export_all(system.db, os.path.join(tmp, "export"))),
+    ("ShardedLibrary", branch_shards),
+]
+
+# FTS5's own statements on its shadow tables, such as the one-row config read
+# when a connection first uses an index.
+FTS5_SHADOW = re.compile(r"'\w+'\.'\w+_fts_(config|data|idx|docsize|content)'")
+
+SKIPPED_STATEMENTS = re.compile(r"^\s*(--|BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE|PRAGMA)", re.IGNORECASE)
+# Attached databases and temporary tables and views exist only on the
+# connection that created them; they are recreated on that connection's
+# planning connection as they were issued.
+CONNECTION_SCHEMA = re.compile(r"^\s*(ATTACH|CREATE TEMP|DROP VIEW IF EXISTS temp\.)", re.IGNORECASE)
+SCAN = re.compile(r"^SCAN ([\w.]+)")
+# Subqueries the plan runs as co-routines or materializes; scanning their
+# output is not a table scan, and their own plans are checked line by line.
+SUBQUERY = re.compile(r"^(?:CO-ROUTINE|MATERIALIZE) ([\w.]+)")
+# A table or view and its alias, as in "FROM LoanHistoryView AS l".
+ALIAS = re.compile(r"\b(?:temp\.)?(\w+)\s+AS\s+(\w+)", re.IGNORECASE)
+# Literals and parameters, compared as "?" against INTENTIONAL_SCANS.
+VALUES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|[?:@$]\w*")
+# A scan in index order that stops at a literal LIMIT this small, with no
+# OFFSET, like the first page of a keyset listing, only reads as many rows as
+# it returns.
+BOUNDED_LIMIT = re.compile(r"\bLIMIT (\d+)\s*$", re.IGNORECASE)
+MAX_BOUNDED_ROWS = 100
+
+
+# Statements that read a whole table by design: the summary and the kiosk
+# snapshot are built once per process, the fine policies and the branch list
+# are a handful of rows, the co-borrowing build, the report rebuild, the
+# counter check and the export read all loans or rows once, and the pending
+# transfers are only those still in flight. Literals and parameters are
+# compared as "?".
+INTENTIONAL_SCANS = [
+    SUMMARY_ROWS, SNAPSHOT_ROWS, NEIGHBOR_ROWS, FINE_POLICIES, BRANCHES, PENDING_TRANSFERS,
+    BASKETS, COUNTED_LOANS, MEMBER_MISMATCHES, BOOK_MISMATCHES,
+    *statements(RECOUNT_RETURNS, returns="LoanHistoryView AS l"),
+    *(TABLE_ROWS.format(table=table, key=key) for table, key in EXPORT_TABLES.items()),
+]
+INTENTIONAL = {VALUES.sub("?", " ".join(sql.split())) for sql in INTENTIONAL_SCANS}
+# The archiver's row counts, of Loan and of each history table.
+INTENTIONAL_PATTERNS = [re.compile("^" + re.escape(ROW_COUNT).replace(r"\{table\}", r"[\w.]+") + "$")]
+
+def capture_statements(db_path, tmp):
+    """Run every operation and job; return (operation, connection, sql) for each statement issued
+
+    Every LibraryDatabase connection opened meanwhile, by the menus, the
+    jobs or the pools, is traced. Connections are numbered by when they were
+    opened and mapped to their database files.
+    """
+    captured = []
+    paths = []
+    current = [None]
+    real_connect = LibraryDatabase.connect
+
+    def traced_connect(self):
+        connected = real_connect(self)
+        if connected:
+            connection = len(paths)
+            paths.append(os.path.abspath(self.db_path))
+            self.conn.set_trace_callback(lambda sql: captured.append((current[0], connection, sql)))
+        return connected
+
+    LibraryDatabase.connect = traced_connect
+    real_input = builtins.input
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            system = LibraryManagementSystem(db_path)
+        # Small pages so the listings exercise their next/previous page queries.
+        system.page_size = 3
+        for name, answers in OPERATIONS:
+            current[0] = name
+            replies = iter(answers)
+            builtins.input = lambda prompt="": next(replies)
+            with contextlib.redirect_stdout(io.StringIO()):
+                getattr(system, name)()
+        builtins.input = real_input
+        for name, job in JOBS:
+            current[0] = name
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                job(system, tmp)
+    finally:
+        LibraryDatabase.connect = real_connect
+        builtins.input = real_input
+        system.db.verbose = False
+        system.db.disconnect()
+    return captured, paths
+
+
+def full_scans(conn, sql):
+    """Return the tables the query plan reads from end to end"""
+    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+    words = sql.upper().split()
+    limit = BOUNDED_LIMIT.search(sql.strip())
+    if (limit and int(limit.group(1)) <= MAX_BOUNDED_ROWS and "OFFSET" not in words and "WHERE" not in words
+            and not any("TEMP B-TREE" in detail for detail in plan)):
+        return []
+    # Temporary tables are the jobs' work areas, holding one batch of ids.
+    # Views run as subqueries; the plan names them by their alias.
+    work_tables = {row[0] for row in conn.execute("SELECT name FROM temp.sqlite_master WHERE type = 'table'")}
+    views = {row[0] for row in conn.execute(
+        "SELECT name FROM temp.sqlite_master WHERE type = 'view' UNION SELECT name FROM sqlite_master WHERE type = 'view'"
+    )}
+    not_tables = {match.group(1) for match in map(SUBQUERY.match, plan) if match} | work_tables | views
+    not_tables |= {alias for name, alias in ALIAS.findall(sql) if name in not_tables}
+    scans = []
+    for detail in plan:
+        match = SCAN.match(detail)
+        if not match or "VIRTUAL TABLE" in detail or detail.startswith("SCAN CONSTANT ROW"):
+            continue
+        name = match.group(1)
+        if name.removeprefix("temp.") in not_tables:
+            continue
+        # The schema table, read to find the loan history tables.
+        if "sqlite_master" in detail:
+            continue
+        # A partial index is walked end to end too; it may hold most of the
+        # table, like every active loan.
+        scans.append(name)
+    return scans
+
+
+def intentional(sql):
+    """Whether a statement is one of the INTENTIONAL_SCANS, whatever values it was run with"""
+    return VALUES.sub("?", sql) in INTENTIONAL or any(pattern.match(sql) for pattern in INTENTIONAL_PATTERNS)
+
+
+def main():
+    failures = []
+    checked = set()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "plans.db")
+        conn = sqlite3.connect(db_path)
+        with open(SCHEMA_SCRIPT) as script:
+            conn.executescript(script.read())
+        conn.close()
+
+        statements, paths = capture_statements(db_path, tmp)
+        # Open the planning connections only after everything has run:
+        # EXPLAIN does not notice schema changes made by other connections.
+        planners = [sqlite3.connect(path) for path in paths]
+        for operation, connection, sql in statements:
+            conn = planners[connection]
+            if CONNECTION_SCHEMA.match(sql):
+                # Attaching again, to the same name, on a second traced
+                # connection's replay is harmless to skip.
+                with contextlib.suppress(sqlite3.OperationalError):
+                    conn.execute(sql)
+                continue
+            if operation is None or SKIPPED_STATEMENTS.match(sql) or FTS5_SHADOW.search(sql):
+                continue
+            key = (operation, " ".join(sql.split()))
+            if key in checked:
+                continue
+            checked.add(key)
+            scans = full_scans(conn, sql)
+            if scans and not intentional(key[1]):
+                failures.append((operation, scans, key[1]))
+        for conn in planners:
+            conn.close()
+
+    print(f"Checked {len(checked)} statements from {len(OPERATIONS)} operations and {len(JOBS)} jobs.")
+    for operation, scans, sql in failures:
+        print(f"FULL SCAN of {', '.join(scans)} in {operation}: {sql}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+import argparse
+import sys
+
+# Per-member and per-book loan counters, maintained by triggers on Loan so
+# the loan-limit check and the circulation statistics are single-row reads.
+COUNTER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS MemberLoanStats (
+    member_id INTEGER PRIMARY KEY,
+    active_loans INTEGER NOT NULL DEFAULT 0,
+    overdue_loans INTEGER NOT NULL DEFAULT 0,
+    total_loans INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS BookCirculation (
+    book_id INTEGER PRIMARY KEY,
+    on_loan INTEGER NOT NULL DEFAULT 0,
+    total_loans INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_book_circulation_total ON BookCirculation(total_loans);
+
+CREATE TRIGGER IF NOT EXISTS Loan_counters_ai AFTER INSERT ON Loan BEGIN
+    INSERT INTO MemberLoanStats (member_id, active_loans, overdue_loans, total_loans)
+    VALUES (new.member_id, new.status = 'Active', new.status = 'Overdue', 1)
+    ON CONFLICT(member_id) DO UPDATE SET
+        active_loans = active_loans + (new.status = 'Active'),
+        overdue_loans = overdue_loans + (new.status = 'Overdue'),
+        total_loans = total_loans + 1;
+    INSERT INTO BookCirculation (book_id, on_loan, total_loans)
+    VALUES (new.book_id, new.status IN ('Active', 'Overdue'), 1)
+    ON CONFLICT(book_id) DO UPDATE SET
+        on_loan = on_loan + (new.status IN ('Active', 'Overdue')),
+        total_loans = total_loans + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Loan_counters_ad AFTER DELETE ON Loan BEGIN
+    UPDATE MemberLoanStats SET
+        active_loans = active_loans - (old.status = 'Active'),
+        overdue_loans = overdue_loans - (old.status = 'Overdue'),
+        total_loans = total_loans - 1
+    WHERE member_id = old.member_id;
+    UPDATE BookCirculation SET
+        on_loan = on_loan - (old.status IN ('Active', 'Overdue')),
+        total_loans = total_loans - 1
+    WHERE book_id = old.book_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Loan_counters_au AFTER UPDATE OF status, member_id, book_id ON Loan
+WHEN old.status IS NOT new.status OR old.member_id IS NOT new.member_id OR old.book_id IS NOT new.book_id
+BEGIN
+    UPDATE MemberLoanStats SET
+        active_loans = active_loans - (old.status = 'Active'),
+        overdue_loans = overdue_loans - (old.status = 'Overdue'),
+        total_loans = total_loans - 1
+    WHERE member_id = old.member_id;
+    INSERT INTO MemberLoanStats (member_id, active_loans, overdue_loans, total_loans)
+    VALUES (new.member_id, new.status = 'Active', new.status = 'Overdue', 1)
+    ON CONFLICT(member_id) DO UPDATE SET
+        active_loans = active_loans + (new.status = 'Active'),
+        overdue_loans = overdue_loans + (new.status = 'Overdue'),
+        total_loans = total_loans + 1;
+    UPDATE BookCirculation SET
+        on_loan = on_loan - (old.status IN ('Active', 'Overdue')),
+        total_loans = total_loans - 1
+    WHERE book_id = old.book_id;
+    INSERT INTO BookCirculation (book_id, on_loan, total_loans)
+    VALUES (new.book_id, new.status IN ('Active', 'Overdue'), 1)
+    ON CONFLICT(book_id) DO UPDATE SET
+        on_loan = on_loan + (new.status IN ('Active', 'Overdue')),
+        total_loans = total_loans + 1;
+END;
+"""
+
+REBUILD_COUNTERS = """
+DELETE FROM MemberLoanStats;
+DELETE FROM BookCirculation;
+INSERT INTO MemberLoanStats (member_id, active_loans, overdue_loans, total_loans)
+SELECT member_id, SUM(status = 'Active'), SUM(status = 'Overdue'), COUNT(*)
+FROM Loan GROUP BY member_id;
+INSERT INTO BookCirculation (book_id, on_loan, total_loans)
+SELECT book_id, SUM(status IN ('Active', 'Overdue')), COUNT(*)
+FROM Loan GROUP BY book_id;
+"""
+
+# Loans per member and book that are still in Loan or were moved out by the
+# loan archiver, which keeps its totals in ArchivedMemberLoans and
+# ArchivedBookLoans (migration 8). The rebuild and the consistency check
+# count from these, so archived loans stay in the lifetime totals.
+MEMBER_LOANS = """
+SELECT member_id, SUM(active) AS active_loans, SUM(overdue) AS overdue_loans, SUM(loans) AS total_loans
+FROM (SELECT member_id, status = 'Active' AS active, status = 'Overdue' AS overdue, 1 AS loans FROM Loan
+      UNION ALL
+      SELECT member_id, 0, 0, total_loans FROM ArchivedMemberLoans)
+GROUP BY member_id
+"""
+
+BOOK_LOANS = """
+SELECT book_id, SUM(out) AS on_loan, SUM(loans) AS total_loans
+FROM (SELECT book_id, status IN ('Active', 'Overdue') AS out, 1 AS loans FROM Loan
+      UNION ALL
+      SELECT book_id, 0, total_loans FROM ArchivedBookLoans)
+GROUP BY book_id
+"""
+
+REBUILD_COUNTERS_V2 = f"""
+DELETE FROM MemberLoanStats;
+DELETE FROM BookCirculation;
+INSERT INTO MemberLoanStats (member_id, active_loans, overdue_loans, total_loans)
+{MEMBER_LOANS};
+INSERT INTO BookCirculation (book_id, on_loan, total_loans)
+{BOOK_LOANS};
+"""
+
+# Counter rows that disagree with a fresh count, including stored rows for
+# members or books that no longer have any loans.
+MEMBER_MISMATCHES = f"""
+SELECT l.member_id, s.active_loans, s.overdue_loans, s.total_loans,
+       l.active_loans AS expected_active, l.overdue_loans AS expected_overdue, l.total_loans AS expected_total
+FROM ({MEMBER_LOANS}) AS l
+LEFT JOIN MemberLoanStats AS s ON s.member_id = l.member_id
+WHERE s.member_id IS NULL OR s.active_loans != l.active_loans
+   OR s.overdue_loans != l.overdue_loans OR s.total_loans != l.total_loans
+UNION ALL
+SELECT s.member_id, s.active_loans, s.overdue_loans, s.total_loans, 0, 0, 0
+FROM MemberLoanStats AS s
+WHERE (s.active_loans != 0 OR s.overdue_loans != 0 OR s.total_loans != 0)
+  AND NOT EXISTS (SELECT 1 FROM Loan WHERE Loan.member_id = s.member_id)
+  AND NOT EXISTS (SELECT 1 FROM ArchivedMemberLoans AS a WHERE a.member_id = s.member_id)
+"""
+
+BOOK_MISMATCHES = f"""
+SELECT l.book_id, c.on_loan, c.total_loans, l.on_loan AS expected_on_loan, l.total_loans AS expected_total
+FROM ({BOOK_LOANS}) AS l
+LEFT JOIN BookCirculation AS c ON c.book_id = l.book_id
+WHERE c.book_id IS NULL OR c.on_loan != l.on_loan OR c.total_loans != l.total_loans
+UNION ALL
+SELECT c.book_id, c.on_loan, c.total_loans, 0, 0
+FROM BookCirculation AS c
+WHERE (c.on_loan != 0 OR c.total_loans != 0)
+  AND NOT EXISTS (SELECT 1 FROM Loan WHERE Loan.book_id = c.book_id)
+  AND NOT EXISTS (SELECT 1 FROM ArchivedBookLoans AS a WHERE a.book_id = c.book_id)
+"""
+
+
+class CirculationCounters:
+    """Read, verify and rebuild the trigger-maintained loan counters"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def loans_out(self, member_id):
+        """Return how many books a member currently has out"""
+        rows = self.db.execute_query(
+            "SELECT active_loans + overdue_loans AS loans_out FROM MemberLoanStats WHERE member_id = ?",
+            (member_id,)
+        )
+        return rows[0]["loans_out"] if rows else 0
+
+    def most_borrowed(self, limit=10):
+        """Return the books with the most loans, most borrowed first"""
+        return self.db.execute_query(
+            """
+            SELECT Book.book_id, Book.title, Book.author, BookCirculation.total_loans, BookCirculation.on_loan
+            FROM BookCirculation
+            JOIN Book ON Book.book_id = BookCirculation.book_id
+            ORDER BY BookCirculation.total_loans DESC
+            LIMIT ?
+            """,
+            (limit,)
+        )
+
+    def verify(self):
+        """Return the member and book counter rows that disagree with Loan and the archived totals"""
+        return self.db.execute_query(MEMBER_MISMATCHES), self.db.execute_query(BOOK_MISMATCHES)
+
+    def rebuild(self):
+        """Recompute every counter from Loan and the archived totals in one transaction"""
+        with self.db.transaction(immediate=True):
+            for statement in REBUILD_COUNTERS_V2.split(";"):
+                if statement.strip():
+                    self.db.conn.execute(statement)
+
+
+def main():
+    # Imported here: library_management itself imports this module.
+    from library_management import LibraryDatabase
+    from library_migrations import migrate
+
+    parser = argparse.ArgumentParser(description="Check or rebuild the circulation counters")
+    parser.add_argument("--db", default="library_management.db")
+    parser.add_argument("--rebuild", action="store_true", help="recompute every counter from Loan")
+    args = parser.parse_args()
+
+    db = LibraryDatabase(args.db, profile="wal", verbose=False)
+    if not db.connect():
+        sys.exit(1)
+    try:
+        migrate(db.conn)
+        counters = CirculationCounters(db)
+        if args.rebuild:
+            counters.rebuild()
+            print("Counters rebuilt from Loan.")
+        members, books = counters.verify()
+        for row in members:
+            print(f"Member {row['member_id']}: stored {row['active_loans']}/{row['overdue_loans']}/{row['total_loans']}, "
+                  f"expected {row['expected_active']}/{row['expected_overdue']}/{row['expected_total']} "
+                  f"(active/overdue/total)")
+        for row in books:
+            print(f"Book {row['book_id']}: stored {row['on_loan']}/{row['total_loans']}, "
+                  f"expected {row['expected_on_loan']}/{row['expected_total']} (on loan/total)")
+        print("Counters are consistent." if not members and not books else
+              f"{len(members)} member and {len(books)} book counters are inconsistent; run with --rebuild.")
+    finally:
+        db.disconnect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import argparse
+import contextlib
+import json
+import sys
+from datetime import datetime, timedelta
+
+from loan_archive import LoanArchiver
+
+# Loans up to this id are counted in the rollups.
+LAST_LOAN_ID = "circulation_reports.last_loan_id"
+# Returns on this day and later are recounted by the next refresh.
+RETURNS_FROM = "circulation_reports.returns_from"
+
+# Daily pre-aggregates of Loan. A loan is counted on its loan date once, when
+# the refresh first sees it; returns are counted on their return date.
+# loan_days is the total time out of the loans returned that day, so an
+# average duration over any range is two sums. A member's cohort is the
+# month they joined.
+REPORT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS DailyCirculation (
+    day DATE PRIMARY KEY,
+    loans INTEGER NOT NULL DEFAULT 0,
+    returns INTEGER NOT NULL DEFAULT 0,
+    late_returns INTEGER NOT NULL DEFAULT 0,
+    loan_days INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS DailyBookLoans (
+    day DATE NOT NULL,
+    book_id INTEGER NOT NULL,
+    loans INTEGER NOT NULL,
+    PRIMARY KEY (day, book_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS DailyGenreLoans (
+    day DATE NOT NULL,
+    genre TEXT NOT NULL,
+    loans INTEGER NOT NULL,
+    PRIMARY KEY (day, genre)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS MonthlyMemberActivity (
+    month TEXT NOT NULL,
+    member_id INTEGER NOT NULL,
+    cohort TEXT NOT NULL,
+    loans INTEGER NOT NULL,
+    PRIMARY KEY (month, member_id)
+) WITHOUT ROWID;
+"""
+
+# Adds the loans with ids in (:after, :through] of {loans} to every rollup.
+ADD_LOANS = """
+INSERT INTO DailyCirculation (day, loans)
+SELECT date(l.loan_date), COUNT(*) FROM {loans} WHERE l.loan_id > :after AND l.loan_id <= :through GROUP BY 1
+ON CONFLICT(day) DO UPDATE SET loans = loans + excluded.loans;
+INSERT INTO DailyBookLoans (day, book_id, loans)
+SELECT date(l.loan_date), l.book_id, COUNT(*) FROM {loans} WHERE l.loan_id > :after AND l.loan_id <= :through
+GROUP BY 1, 2
+ON CONFLICT(day, book_id) DO UPDATE SET loans = loans + excluded.loans;
+INSERT INTO DailyGenreLoans (day, genre, loans)
+SELECT date(l.loan_date), COALESCE(Book.genre, 'Unknown'), COUNT(*)
+FROM {loans} LEFT JOIN Book ON Book.book_id = l.book_id
+WHERE l.loan_id > :after AND l.loan_id <= :through
+GROUP BY 1, 2
+ON CONFLICT(day, genre) DO UPDATE SET loans = loans + excluded.loans;
+INSERT INTO MonthlyMemberActivity (month, member_id, cohort, loans)
+SELECT strftime('%Y-%m', l.loan_date), l.member_id, COALESCE(strftime('%Y-%m', Member.join_date), 'Unknown'), COUNT(*)
+FROM {loans} LEFT JOIN Member ON Member.member_id = l.member_id
+WHERE l.loan_id > :after AND l.loan_id <= :through
+GROUP BY 1, 2
+ON CONFLICT(month, member_id) DO UPDATE SET loans = loans + excluded.loans
+"""
+
+# Returns are updates to rows already counted, so the return columns of
+# recent days are recounted rather than added to.
+RECOUNT_RETURNS = """
+UPDATE DailyCirculation SET returns = 0, late_returns = 0, loan_days = 0 WHERE day >= :since;
+INSERT INTO DailyCirculation (day, returns, late_returns, loan_days)
+SELECT date(l.return_date), COUNT(*), SUM(l.return_date > l.due_date),
+       SUM(CAST(julianday(l.return_date) - julianday(l.loan_date) AS INTEGER))
+FROM {returns}
+WHERE l.status = 'Returned' AND l.return_date >= :since
+GROUP BY 1
+ON CONFLICT(day) DO UPDATE SET
+    returns = excluded.returns, late_returns = excluded.late_returns, loan_days = excluded.loan_days
+"""
+
+CLEAR_ROLLUPS = """
+DELETE FROM DailyCirculation;
+DELETE FROM DailyBookLoans;
+DELETE FROM DailyGenreLoans;
+DELETE FROM MonthlyMemberActivity
+"""
+
+
+# One row per day with any circulation: read whole, after a rebuild.
+COUNTED_LOANS = "SELECT COALESCE(SUM(loans), 0) FROM DailyCirculation"
+
+
+def statements(script, **sources):
+    return [statement for statement in script.format(**sources).split(";") if statement.strip()]
+
+
+def period(start=None, end=None, days=30):
+    """Default a report's date range to the last days days, ending today"""
+    end = end or datetime.now().strftime('%Y-%m-%d')
+    start = start or (datetime.strptime(end, '%Y-%m-%d') - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    return start, end
+
+
+class CirculationReports:
+    """Circulation reports answered from daily rollup tables, and the job that keeps them current
+
+    refresh only reads loans added since its last run, by loan_id, and the
+    returns since its last run, through the returned-loan index. The
+    archiver only moves loans a refresh has already counted, so archival
+    does not disturb the rollups; rebuild recounts everything, archived
+    history included.
+    """
+
+    def __init__(self, db, batch_size=10000):
+        self.db = db
+        self.batch_size = batch_size
+
+    def refresh(self, today=None):
+        """Roll up loans and returns since the previous refresh; return how many loans were added"""
+        today = today or datetime.now().strftime('%Y-%m-%d')
+        if self.db.job_state(LAST_LOAN_ID) is None:
+            # Never built: loans archived before now are only in history.
+            return self.rebuild(today=today)
+        added = 0
+        while True:
+            # Each window of loan ids commits with its mark, so an interrupted
+            # refresh resumes where it stopped.
+            with self.db.transaction(immediate=True):
+                after = int(self.db.job_state(LAST_LOAN_ID, "0"))
+                newest = self.db.execute("SELECT MAX(loan_id) FROM Loan").fetchone()[0] or 0
+                through = min(newest, after + self.batch_size)
+                if through <= after:
+                    break
+                for statement in statements(ADD_LOANS, loans="Loan AS l"):
+                    self.db.execute(statement, {"after": after, "through": through})
+                self.db.set_job_state(LAST_LOAN_ID, str(through))
+                added += self.db.execute(
+                    "SELECT COUNT(*) FROM Loan WHERE loan_id > ? AND loan_id <= ?", (after, through)
+                ).fetchone()[0]
+        with self.db.transaction(immediate=True):
+            since = self.db.job_state(RETURNS_FROM, "")
+            # Left to itself the planner prefers the equality on
+            # idx_loan_status_id, which reads every returned loan.
+            for statement in statements(RECOUNT_RETURNS, returns="Loan AS l INDEXED BY idx_loan_returned_date"):
+                self.db.execute(statement, {"since": since})
+            self.db.set_job_state(RETURNS_FROM, today)
+        return added
+
+    def rebuild(self, archiver=None, today=None):
+        """Recompute every rollup from Loan and the archived loan history in one transaction; return the loans counted"""
+        today = today or datetime.now().strftime('%Y-%m-%d')
+        archiver = archiver or LoanArchiver(self.db)
+        archiver.attach()
+        with self.db.transaction(immediate=True):
+            for statement in statements(CLEAR_ROLLUPS):
+                self.db.execute(statement)
+            through = archiver.newest_loan_id()
+            for statement in statements(ADD_LOANS, loans="LoanHistoryView AS l"):
+                self.db.execute(statement, {"after": 0, "through": through})
+            for statement in statements(RECOUNT_RETURNS, returns="LoanHistoryView AS l"):
+                self.db.execute(statement, {"since": ""})
+            self.db.set_job_state(LAST_LOAN_ID, str(through))
+            self.db.set_job_state(RETURNS_FROM, today)
+            return self.db.execute(COUNTED_LOANS).fetchone()[0]
+
+    # Reports; start and end are inclusive 'YYYY-MM-DD' dates.
+
+    def loans_per_day(self, start=None, end=None):
+        """Loans, returns and late returns for each day with any"""
+        return self.db.execute(
+            "SELECT day, loans, returns, late_returns FROM DailyCirculation WHERE day BETWEEN ? AND ? ORDER BY day",
+            period(start, end)
+        ).fetchall()
+
+    def top_titles(self, start=None, end=None, limit=10):
+        """The most borrowed books over a period"""
+        return self.db.execute(
+            """
+            SELECT d.book_id, Book.title, Book.author, SUM(d.loans) AS loans
+            FROM DailyBookLoans AS d
+            LEFT JOIN Book ON Book.book_id = d.book_id
+            WHERE d.day BETWEEN ? AND ?
+            GROUP BY d.book_id
+            ORDER BY loans DESC, d.book_id
+            LIMIT ?
+            """,
+            (*period(start, end), limit)
+        ).fetchall()
+
+    def genre_demand(self, start=None, end=None):
+        """Loans per genre over a period, most borrowed first"""
+        return self.db.execute(
+            "SELECT genre, SUM(loans) AS loans FROM DailyGenreLoans WHERE day BETWEEN ? AND ? "
+            "GROUP BY genre ORDER BY loans DESC, genre",
+            period(start, end)
+        ).fetchall()
+
+    def loan_duration(self, start=None, end=None):
+        """Returns, late returns and the average days out of the loans returned over a period"""
+        return self.db.execute(
+            """
+            SELECT COALESCE(SUM(returns), 0) AS returns, COALESCE(SUM(late_returns), 0) AS late_returns,
+                   ROUND(SUM(loan_days) * 1.0 / NULLIF(SUM(returns), 0), 2) AS average_days
+            FROM DailyCirculation WHERE day BETWEEN ? AND ?
+            """,
+            period(start, end)
+        ).fetchone()
+
+    def member_cohorts(self, start=None, end=None):
+        """Members active (with a loan) and their loans per month, by the month they joined
+
+        start and end are 'YYYY-MM' months; the default is the last twelve.
+        """
+        start, end = period(start and start + "-01", end and end + "-01", days=335)
+        return self.db.execute(
+            """
+            SELECT cohort, month, COUNT(*) AS active_members, SUM(loans) AS loans
+            FROM MonthlyMemberActivity
+            WHERE month BETWEEN ? AND ?
+            GROUP BY cohort, month
+            ORDER BY cohort, month
+            """,
+            (start[:7], end[:7])
+        ).fetchall()
+
+
+def main():
+    # Imported here: library_management itself imports this module.
+    from library_management import LibraryDatabase
+    from library_migrations import migrate
+
+    parser = argparse.ArgumentParser(description="Refresh or rebuild the circulation rollups and print the reports")
+    parser.add_argument("--db", default="library_management.db")
+    parser.add_argument("--rebuild", action="store_true", help="recompute the rollups from all loan history")
+    parser.add_argument("--archive", help="archive database holding archived loans, counted by --rebuild")
+    parser.add_argument("--start", help="first day of the reports (default: 30 days ago)")
+    parser.add_argument("--end", help="last day of the reports (default: today)")
+    args = parser.parse_args()
+
+    db = LibraryDatabase(args.db, profile="wal", verbose=False)
+    if not db.connect():
+        sys.exit(1)
+    try:
+        # Migration messages go to stderr so stdout stays JSON.
+        with contextlib.redirect_stdout(sys.stderr):
+            migrate(db.conn)
+        reports = CirculationReports(db)
+        if args.rebuild:
+            counted = reports.rebuild(LoanArchiver(db, args.archive, partition_by_year=False))
+            print(f"Rebuilt the rollups from {counted} loans.", file=sys.stderr)
+        else:
+            print(f"Rolled up {reports.refresh()} new loans.", file=sys.stderr)
+        print(json.dumps({
+            "loans_per_day": [dict(row) for row in reports.loans_per_day(args.start, args.end)],
+            "top_titles": [dict(row) for row in reports.top_titles(args.start, args.end)],
+            "genre_demand": [dict(row) for row in reports.genre_demand(args.start, args.end)],
+            "loan_duration": dict(reports.loan_duration(args.start, args.end)),
+        }, indent=2))
+    finally:
+        db.disconnect()
+
+
+if __name__ == "__main__":
+    main()
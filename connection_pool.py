@@ -0,0 +1,67 @@
+import queue
+import threading
+from contextlib import contextmanager
+
+from library_management import LibraryDatabase
+
+
+class ConnectionPool:
+    """One writer connection and a fixed set of reader connections to one database file"""
+
+    def __init__(self, db_path, readers=4, profile="wal", pragmas=None, setup=None):
+        self.db_path = db_path
+        # Called with every new connection, e.g. to attach databases.
+        self.setup = setup
+        self.write_lock = threading.Lock()
+        self.writer_db = self.open(profile, pragmas)
+        # Readers can never take the write lock by accident, so a long report
+        # query only ever waits on the WAL, not on another writer.
+        reader_pragmas = dict(pragmas or {})
+        reader_pragmas["query_only"] = "ON"
+        self.readers = queue.Queue()
+        self.reader_dbs = []
+        for _ in range(readers):
+            db = self.open(profile, reader_pragmas)
+            self.reader_dbs.append(db)
+            self.readers.put(db)
+
+    def open(self, profile, pragmas):
+        """Open a pooled connection that may be handed between threads"""
+        pragmas = dict(pragmas or {})
+        query_only = pragmas.pop("query_only", None)
+        db = LibraryDatabase(self.db_path, profile, pragmas, check_same_thread=False, verbose=False)
+        if not db.connect():
+            raise Exception(f"Failed to connect to the database {self.db_path}.")
+        if self.setup is not None:
+            self.setup(db)
+        # Last: query_only refuses even temporary tables and views.
+        if query_only is not None:
+            db.conn.execute(f"PRAGMA query_only = {query_only}")
+        return db
+
+    @contextmanager
+    def writer(self):
+        """Borrow the writer connection; writes from all threads are serialized"""
+        with self.write_lock:
+            yield self.writer_db
+
+    @contextmanager
+    def reader(self, timeout=None):
+        """Borrow a reader connection, waiting for one to be returned if all are in use"""
+        db = self.readers.get(timeout=timeout)
+        try:
+            yield db
+        finally:
+            self.readers.put(db)
+
+    def enable_metrics(self, metrics, **hooks):
+        """Record the statements of every pooled connection in one QueryMetrics"""
+        for db in [self.writer_db] + self.reader_dbs:
+            db.enable_metrics(metrics, **hooks)
+
+    def close(self):
+        """Close every connection in the pool"""
+        with self.write_lock:
+            self.writer_db.disconnect()
+        for db in self.reader_dbs:
+            db.disconnect()
@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import OrderedDict
+
+from statements import registry
+
+
+class LRUCache:
+    """Bounded, thread-safe LRU cache whose entries also expire after ttl seconds"""
+
+    def __init__(self, maxsize=10000, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        # Bumped by every invalidation, so a value loaded before a concurrent
+        # invalidation is not stored after it.
+        self.generation = 0
+
+    def get(self, key, load):
+        """Return the cached value for key, calling load(key) on a miss"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > now:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+                self.expirations += 1
+            self.misses += 1
+            generation = self.generation
+        value = load(key)
+        # Misses are not cached: an id that does not exist yet may be
+        # inserted later, and nothing would invalidate the negative entry.
+        if value is not None:
+            self.put(key, value, now, generation)
+        return value
+
+    def put(self, key, value, now=None, generation=None):
+        """Store a value, evicting the least recently used entry if full"""
+        expires = (now if now is not None else time.monotonic()) + self.ttl
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Drop one entry"""
+        with self.lock:
+            self.generation += 1
+            if self.entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        """Drop every entry"""
+        with self.lock:
+            self.generation += 1
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+
+    def stats(self):
+        """Return hit/miss/eviction counters and the current size"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+class EntityCache:
+    """Read-through cache of Book and Member rows by primary key"""
+
+    def __init__(self, db, maxsize=10000, ttl=300.0):
+        # The TTL bounds how long a change made by another process (which
+        # cannot invalidate this cache) stays invisible here.
+        self.db = db
+        self.books = LRUCache(maxsize, ttl)
+        self.members = LRUCache(maxsize, ttl)
+
+    def load_book(self, book_id):
+        rows = registry.query(self.db, "book.by_id", (book_id,))
+        return rows[0] if rows else None
+
+    def load_member(self, member_id):
+        rows = registry.query(self.db, "member.by_id", (member_id,))
+        return rows[0] if rows else None
+
+    def get_book(self, book_id):
+        """Return the Book row for book_id, or None if there is none"""
+        return self.books.get(book_id, self.load_book)
+
+    def get_member(self, member_id):
+        """Return the Member row for member_id, or None if there is none"""
+        return self.members.get(member_id, self.load_member)
+
+    def invalidate_book(self, book_id):
+        """Forget a book after it was updated, removed, lent or returned"""
+        self.books.invalidate(book_id)
+
+    def invalidate_member(self, member_id):
+        """Forget a member after it was updated or removed"""
+        self.members.invalidate(member_id)
+
+    def stats(self):
+        """Return the statistics of both caches"""
+        return {"books": self.books.stats(), "members": self.members.stats()}
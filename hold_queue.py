@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+
+HOLD_PICKUP_DAYS = 7
+
+# A hold is 'Waiting' in its book's queue, 'Ready' once a returned copy is
+# set aside for it, and then 'Fulfilled' when borrowed, 'Expired' when not
+# picked up in time, or 'Cancelled'. A 'Ready' copy is counted in neither
+# available_copies nor any loan.
+HOLD_SCHEMA = """
+CREATE TABLE IF NOT EXISTS Hold (
+    hold_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    book_id INTEGER NOT NULL,
+    member_id INTEGER NOT NULL,
+    placed_date DATE NOT NULL,
+    status TEXT NOT NULL DEFAULT 'Waiting'
+        CHECK (status IN ('Waiting', 'Ready', 'Fulfilled', 'Expired', 'Cancelled')),
+    ready_date DATE,
+    expires_date DATE,
+    FOREIGN KEY (book_id) REFERENCES Book(book_id),
+    FOREIGN KEY (member_id) REFERENCES Member(member_id)
+);
+
+-- Each book's queue in order, holding only the holds still waiting.
+CREATE INDEX IF NOT EXISTS idx_hold_book_waiting ON Hold(book_id, hold_id) WHERE status = 'Waiting';
+-- At most one open hold per member and book.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_hold_member_book_open ON Hold(member_id, book_id)
+    WHERE status IN ('Waiting', 'Ready');
+CREATE INDEX IF NOT EXISTS idx_hold_ready_expires ON Hold(expires_date) WHERE status = 'Ready';
+"""
+
+# Sets a copy aside for the head of a book's queue, found through
+# idx_hold_book_waiting in the allocating statement itself, so holds placed
+# on any connection are served in order.
+ALLOCATE_NEXT = """
+UPDATE Hold SET status = 'Ready', ready_date = ?, expires_date = ?
+WHERE hold_id = (SELECT hold_id FROM Hold WHERE book_id = ? AND status = 'Waiting' ORDER BY hold_id LIMIT 1)
+RETURNING hold_id, member_id
+"""
+
+OPEN_HOLD = """
+SELECT hold_id, status FROM Hold
+WHERE member_id = ? AND book_id = ? AND status IN ('Waiting', 'Ready')
+"""
+
+HOLD_LISTING = """
+SELECT Hold.hold_id, Hold.member_id, Member.first_name, Member.last_name, Hold.placed_date
+FROM Hold
+JOIN Member ON Member.member_id = Hold.member_id
+"""
+
+
+class HoldQueue:
+    """First-come, first-served queues of holds on books, kept in the Hold table
+
+    Each book's queue is the idx_hold_book_waiting range of its waiting
+    holds. Placing a hold and handing a returned copy to the next one are
+    one indexed statement each.
+    """
+
+    def __init__(self, pickup_days=HOLD_PICKUP_DAYS):
+        self.pickup_days = pickup_days
+
+    def place(self, db, member_id, book_id):
+        """Add a hold to the end of a book's queue and return its id"""
+        cursor = db.execute(
+            "INSERT INTO Hold (book_id, member_id, placed_date) VALUES (?, ?, ?)",
+            (book_id, member_id, datetime.now().strftime('%Y-%m-%d'))
+        )
+        return cursor.lastrowid
+
+    def allocate(self, db, book_id):
+        """Set a copy aside for the next waiting hold and return (hold_id, member_id), or None if nobody is waiting"""
+        ready_date = datetime.now()
+        expires_date = (ready_date + timedelta(days=self.pickup_days)).strftime('%Y-%m-%d')
+        hold = db.execute(ALLOCATE_NEXT, (ready_date.strftime('%Y-%m-%d'), expires_date, book_id)).fetchone()
+        return tuple(hold) if hold is not None else None
+
+    def release(self, db, book_id):
+        """Give a copy that came back to the next waiting hold, or put it back on the shelf; return the hold or None"""
+        hold = self.allocate(db, book_id)
+        if hold is None:
+            db.execute("UPDATE Book SET available_copies = available_copies + 1 WHERE book_id = ?", (book_id,))
+        return hold
+
+    def fill(self, db, book_id):
+        """Move copies on the shelf to waiting holds, after copies were added to a book; return the holds served"""
+        served = []
+        while db.execute("SELECT available_copies > 0 FROM Book WHERE book_id = ?", (book_id,)).fetchone()[0]:
+            hold = self.allocate(db, book_id)
+            if hold is None:
+                break
+            db.execute("UPDATE Book SET available_copies = available_copies - 1 WHERE book_id = ?", (book_id,))
+            served.append(hold)
+        return served
+
+    def claim(self, db, member_id, book_id):
+        """Mark a member's open hold on a book fulfilled as they borrow it; True if a copy was set aside for it"""
+        # A waiting hold is closed too, or it would later be handed a copy
+        # of a book the member already has.
+        hold = db.execute(OPEN_HOLD, (member_id, book_id)).fetchone()
+        if hold is None:
+            return False
+        db.execute("UPDATE Hold SET status = 'Fulfilled' WHERE hold_id = ?", (hold[0],))
+        return hold[1] == 'Ready'
+
+    def cancel(self, db, member_id, book_id):
+        """Cancel a member's open hold on a book, passing a copy set aside for it on; return the hold's old status"""
+        hold = db.execute(OPEN_HOLD, (member_id, book_id)).fetchone()
+        if hold is None:
+            return None
+        db.execute("UPDATE Hold SET status = 'Cancelled' WHERE hold_id = ?", (hold[0],))
+        if hold[1] == 'Ready':
+            self.release(db, book_id)
+        return hold[1]
+
+    def expire(self, db, today=None):
+        """Expire ready holds not picked up in time and pass their copies on; return the ids of the books affected"""
+        today = today or datetime.now().strftime('%Y-%m-%d')
+        books = [row[0] for row in db.execute(
+            "UPDATE Hold SET status = 'Expired' WHERE status = 'Ready' AND expires_date < ? RETURNING book_id",
+            (today,)
+        ).fetchall()]
+        for book_id in books:
+            self.release(db, book_id)
+        return books
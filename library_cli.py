@@ -0,0 +1,261 @@
+import argparse
+import contextlib
+import json
+import shlex
+import sqlite3
+import sys
+import time
+
+from catalog_summary import CatalogSummary
+from entity_cache import EntityCache
+from library_management import LibraryDatabase
+from library_migrations import migrate
+from library_service import LibraryService, ServiceError
+from loan_service import LoanError
+from query_metrics import QueryMetrics
+
+# Subcommands: name -> (LibraryService method, help, arguments). An argument
+# is (name, type) when required or (name, type, default) when optional; names
+# without a leading "--" are positional. Batch lines use the same table.
+LISTING = [("--after", int, None), ("--limit", int, 20)]
+SEARCH = [("term", str), ("--page", int, 1), ("--page-size", int, 20)]
+LOAN = [("--member", int), ("--book", int)]
+PERSON = [("--first-name", str), ("--last-name", str), ("--email", str), ("--phone", str, "")]
+PERIOD = [("--start", str, None), ("--end", str, None)]
+ADDRESS = [("--street", str, ""), ("--city", str, ""), ("--state", str, ""), ("--zip-code", str, "")]
+
+COMMANDS = {
+    "borrow": ("borrow", "Lend a copy of a book to a member", LOAN),
+    "renew": ("renew", "Renew a member's loan of a book", LOAN),
+    "return": ("return_book", "Return a member's loan of a book", LOAN),
+    "place-hold": ("place_hold", "Queue a member for the next copy of a book", LOAN),
+    "cancel-hold": ("cancel_hold", "Cancel a member's hold on a book", LOAN),
+    "expire-holds": ("expire_holds", "Pass on copies whose holds were not picked up in time", []),
+    "book-holds": ("book_holds", "List the holds waiting for a book, in queue order", [("--book", int)] + LISTING),
+    "sweep-overdue": ("sweep_overdue", "Mark loans past their due date as overdue", []),
+    "archive-loans": ("archive_loans", "Move loans returned before a date into LoanHistory", [
+        ("--before", str, None), ("--keep-days", int, 365),
+    ]),
+    "overdue": ("overdue", "List overdue loans", LISTING),
+    "active-loans": ("active_loans", "List active loans", LISTING),
+    "most-borrowed": ("most_borrowed", "List the most borrowed books", [("--limit", int, 10)]),
+    "get-book": ("get_book", "Show one book", [("--book", int)]),
+    "get-member": ("get_member", "Show one member", [("--member", int)]),
+    "list-books": ("list_books", "List books in ID order", LISTING),
+    "list-members": ("list_members", "List members in ID order", LISTING),
+    "list-staff": ("list_staff", "List staff in ID order", LISTING),
+    "search-books": ("search_books", "Search books by title, author, or ISBN", SEARCH),
+    "search-members": ("search_members", "Search members by name or email", SEARCH),
+    "search-staff": ("search_staff", "Search staff by name or email", SEARCH),
+    "availability": ("availability", "Show how many copies of a book are free", [
+        ("--book", int, None), ("--isbn", str, None),
+    ]),
+    "genre-facets": ("genre_facets", "Count titles and copies per genre", []),
+    "decade-facets": ("decade_facets", "Count titles and copies per publication decade", []),
+    "search-facets": ("search_facets", "Count the matches of a book search per genre and decade", [("term", str)]),
+    "top-circulating": ("top_circulating", "List the most borrowed books from the catalog summary", [
+        ("--limit", int, 10), ("--genre", str, None),
+    ]),
+    "assess-fines": ("assess_fines", "Bring the fines of every overdue loan up to today", []),
+    "member-fines": ("member_fines", "List a member's accruing and due fines", [("--member", int)]),
+    "pay-fine": ("pay_fine", "Record payment of a returned loan's fine", [("--loan", int)]),
+    "waive-fine": ("waive_fine", "Waive a returned loan's fine", [("--loan", int)]),
+    "fine-policies": ("fine_policies", "List the fine policies", []),
+    "set-fine-policy": ("set_fine_policy", "Add or change the fine policy of a genre and member type", [
+        ("--daily-cents", int), ("--genre", str, "*"), ("--member-type", str, "*"), ("--grace-days", int, 0),
+        ("--max-cents", int, None),
+    ]),
+    "refresh-reports": ("refresh_reports", "Roll up loans and returns since the last refresh", []),
+    "loans-per-day": ("loans_per_day", "Report loans, returns and late returns per day", PERIOD),
+    "top-titles": ("top_titles", "Report the most borrowed titles over a period", PERIOD + [("--limit", int, 10)]),
+    "genre-demand": ("genre_demand", "Report loans per genre over a period", PERIOD),
+    "loan-duration": ("loan_duration", "Report the average days out of loans returned over a period", PERIOD),
+    "member-cohorts": ("member_cohorts", "Report active members per month by the month they joined", PERIOD),
+    "update-recommendations": ("update_recommendations", "Count co-borrowed books in loans made since the last update",
+                               []),
+    "also-borrowed": ("also_borrowed", "List the books most often borrowed by readers of a book", [
+        ("--book", int), ("--limit", int, 5),
+    ]),
+    "add-book": ("add_book", "Add a book", [
+        ("--title", str), ("--author", str), ("--isbn", str), ("--year", int), ("--genre", str), ("--copies", int),
+    ]),
+    "update-book": ("update_book", "Change some fields of a book", [
+        ("--book", int), ("--title", str, None), ("--author", str, None), ("--isbn", str, None),
+        ("--year", int, None), ("--genre", str, None), ("--copies", int, None),
+    ]),
+    "remove-book": ("remove_book", "Remove a book", [("--book", int)]),
+    "register-member": ("register_member", "Register a member", PERSON + ADDRESS + [
+        ("--member-type", str, "Standard"),
+    ]),
+    "update-member": ("update_member", "Change some fields of a member", [("--member", int)] + [
+        (name, kind, None) for name, kind, *_ in PERSON + ADDRESS + [("--member-type", str)]
+    ]),
+    "remove-member": ("remove_member", "Remove a member", [("--member", int)]),
+    "add-staff": ("add_staff", "Add a staff member", PERSON + [("--role", str)]),
+    "update-staff": ("update_staff", "Change some fields of a staff member", [("--staff", int)] + [
+        (name, kind, None) for name, kind, *_ in PERSON + [("--role", str)]
+    ]),
+    "remove-staff": ("remove_staff", "Remove a staff member", [("--staff", int)]),
+}
+
+
+class CommandError(Exception):
+    """Raised when a command line or batch line cannot be parsed"""
+
+
+# Everything an operation may fail with; reported per operation, never fatal.
+OPERATION_ERRORS = (CommandError, ServiceError, LoanError, ValueError, sqlite3.Error)
+
+
+class ArgumentParser(argparse.ArgumentParser):
+    # Batch mode parses every line with the same parser, so a bad line must
+    # raise instead of exiting the process.
+    def error(self, message):
+        raise CommandError(f"{self.prog}: {message}")
+
+
+def argument_dest(name):
+    """Return the keyword a command argument is passed to LibraryService as"""
+    return name.lstrip("-").replace("-", "_")
+
+
+def run_command(service, command, args):
+    """Call the LibraryService method behind a command with its parsed arguments"""
+    method, _, arguments = COMMANDS[command]
+    kwargs = {argument_dest(name): getattr(args, argument_dest(name)) for name, *_ in arguments}
+    return getattr(service, method)(**kwargs)
+
+
+def build_parser():
+    """Build the argument parser, one subcommand per entry in COMMANDS plus batch"""
+    parser = ArgumentParser(prog="library_management.py", description="Library management from the command line")
+    parser.add_argument("--db", default="library_management.db")
+    parser.add_argument("--metrics-file", help="write query statistics here in Prometheus text format on exit")
+    parser.add_argument("--slow-log", help="append statements slower than --slow-ms, with their plans, to this file")
+    parser.add_argument("--slow-ms", type=float, default=100.0)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command, (_, help_text, arguments) in COMMANDS.items():
+        subparser = subparsers.add_parser(command, help=help_text)
+        for name, kind, *default in arguments:
+            if not name.startswith("--"):
+                subparser.add_argument(name, type=kind)
+            elif default:
+                subparser.add_argument(name, type=kind, default=default[0])
+            else:
+                subparser.add_argument(name, type=kind, required=True)
+    batch = subparsers.add_parser("batch", help="Run one operation per line from a file or stdin")
+    batch.add_argument("file", nargs="?", default="-", help="JSON Lines or command lines; '-' reads stdin")
+    batch.add_argument("--group-size", type=int, default=500, help="operations per transaction")
+    return parser
+
+
+def line_to_argv(line):
+    """Turn a batch line into subcommand arguments"""
+    line = line.strip()
+    if not line.startswith("{"):
+        return shlex.split(line)
+    try:
+        operation = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise CommandError(f"invalid JSON: {e}")
+    if not isinstance(operation, dict) or operation.get("command") not in COMMANDS:
+        raise CommandError("a JSON line needs a known \"command\"")
+    command = operation.pop("command")
+    positional = {name for name, *_ in COMMANDS[command][2] if not name.startswith("--")}
+    argv = [command]
+    for key, value in operation.items():
+        # null leaves the argument out, so an optional field stays unchanged
+        # and a missing required one is reported by the parser.
+        if value is None:
+            continue
+        if isinstance(value, (bool, list, dict)):
+            raise CommandError(f"\"{key}\" must be a string or a number")
+        argv += [str(value)] if key in positional else [f"--{key.replace('_', '-')}", str(value)]
+    return argv
+
+
+def run_batch(service, parser, lines, group_size, output=sys.stdout):
+    """Run batch lines in transactions of group_size operations and write one JSON result per line"""
+    totals = {"operations": 0, "succeeded": 0, "failed": 0}
+    work = ((number, line) for number, line in enumerate(lines, 1) if line.strip() and not line.lstrip().startswith("#"))
+    done = False
+    while not done:
+        results = []
+        try:
+            # One write transaction per group amortizes the commit; each
+            # operation gets its own savepoint, so a failed one is undone
+            # without losing the rest of its group.
+            with service.db.transaction(immediate=True):
+                for number, line in work:
+                    results.append(run_line(service, parser, number, line))
+                    if len(results) >= group_size:
+                        break
+                else:
+                    done = True
+        except sqlite3.Error as e:
+            service.discard_cached()
+            results = [{**result, "ok": False, "error": f"transaction rolled back: {e}"} for result in results]
+        for result in results:
+            totals["operations"] += 1
+            totals["succeeded" if result["ok"] else "failed"] += 1
+            output.write(json.dumps(result) + "\n")
+    return totals
+
+
+def run_line(service, parser, number, line):
+    """Run one batch line in its own savepoint and return its JSON result"""
+    command = None
+    try:
+        args = parser.parse_args(line_to_argv(line))
+        command = args.command
+        if command == "batch":
+            raise CommandError("batch cannot be nested")
+        with service.db.transaction():
+            result = run_command(service, command, args)
+        return {"line": number, "command": command, "ok": True, "result": result}
+    except OPERATION_ERRORS as e:
+        return {"line": number, "command": command, "ok": False, "error": str(e)}
+
+
+def main(argv=None):
+    parser = build_parser()
+    try:
+        args = parser.parse_args(argv)
+    except CommandError as e:
+        parser.print_usage(sys.stderr)
+        print(e, file=sys.stderr)
+        return 2
+
+    db = LibraryDatabase(args.db, profile="wal", verbose=False)
+    if not db.connect():
+        return 1
+    metrics = QueryMetrics(args.slow_ms, args.slow_log) if args.metrics_file or args.slow_log else None
+    if metrics is not None:
+        db.enable_metrics(metrics, trace=True)
+    try:
+        # stdout carries only JSON; migration notices go to stderr.
+        with contextlib.redirect_stdout(sys.stderr):
+            migrate(db.conn)
+        service = LibraryService(db, cache=EntityCache(db), summary=CatalogSummary())
+        if args.command == "batch":
+            started = time.perf_counter()
+            with (sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")) as lines:
+                totals = run_batch(service, parser, lines, args.group_size)
+            totals["seconds"] = round(time.perf_counter() - started, 3)
+            print(json.dumps(totals), file=sys.stderr)
+            return 1 if totals["failed"] else 0
+        try:
+            result = run_command(service, args.command, args)
+        except OPERATION_ERRORS as e:
+            print(json.dumps({"command": args.command, "ok": False, "error": str(e)}))
+            return 1
+        print(json.dumps({"command": args.command, "ok": True, "result": result}))
+        return 0
+    finally:
+        db.disconnect()
+        if args.metrics_file:
+            metrics.write_prometheus(args.metrics_file)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+import argparse
+import bz2
+import csv
+import gzip
+import json
+import lzma
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from library_management import LibraryDatabase
+
+# Exported tables and the key each one is written in order of.
+EXPORT_TABLES = {
+    "Book": "book_id",
+    "Member": "member_id",
+    "Staff": "staff_id",
+    "Loan": "loan_id",
+}
+
+# One table in key order, streamed whole.
+TABLE_ROWS = "SELECT * FROM {table} ORDER BY {key}"
+
+OPENERS = {None: open, "gz": gzip.open, "bz2": bz2.open, "xz": lzma.open}
+
+
+def open_output(path, compression):
+    """Open an output file for text writing, compressed if requested"""
+    opener = OPENERS[compression]
+    if opener is open:
+        return open(path, "w", newline="", encoding="utf-8")
+    return opener(path, "wt", newline="", encoding="utf-8")
+
+
+def export_table(db, table, out_dir, fmt="csv", compression=None, batch_size=1000):
+    """Stream one table to a CSV or JSONL file and return the number of rows written"""
+    path = os.path.join(out_dir, f"{table}.{fmt}" + (f".{compression}" if compression else ""))
+    columns = [column[0] for column in db.conn.execute(f"SELECT * FROM {table} LIMIT 0").description]
+    rows = db.stream_query(TABLE_ROWS.format(table=table, key=EXPORT_TABLES[table]), batch_size=batch_size)
+    count = 0
+    with open_output(path, compression) as output:
+        if fmt == "csv":
+            writer = csv.writer(output)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow(tuple(row))
+                count += 1
+        else:
+            for row in rows:
+                output.write(json.dumps(dict(zip(columns, row))) + "\n")
+                count += 1
+    return count
+
+
+def export_all(db, out_dir, fmt="csv", compression=None, tables=tuple(EXPORT_TABLES)):
+    """Export the tables one after another from a single read transaction"""
+    os.makedirs(out_dir, exist_ok=True)
+    # One read transaction gives every table the same snapshot. Under WAL it
+    # does not block writers, so circulation carries on during the dump.
+    with db.transaction():
+        return {table: export_table(db, table, out_dir, fmt, compression) for table in tables}
+
+
+def snapshot(db, dest_path, pages=4096):
+    """Copy the database to dest_path with SQLite's online backup API"""
+    target = LibraryDatabase(dest_path, verbose=False)
+    if not target.connect():
+        raise Exception(f"Failed to open snapshot file {dest_path}.")
+    try:
+        # Copying a few thousand pages per step lets writers in between steps.
+        db.conn.backup(target.conn, pages=pages)
+    finally:
+        target.disconnect()
+    return dest_path
+
+
+def export_parallel(db, out_dir, fmt="csv", compression=None, tables=tuple(EXPORT_TABLES), workers=None):
+    """Snapshot the database, then export each table on its own reader connection"""
+    os.makedirs(out_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_path = snapshot(db, os.path.join(tmp, "snapshot.db"))
+
+        def export_one(table):
+            reader = LibraryDatabase(snapshot_path, pragmas={"query_only": "ON"},
+                                     check_same_thread=False, verbose=False)
+            if not reader.connect():
+                raise Exception(f"Failed to open snapshot file {snapshot_path}.")
+            try:
+                return table, export_table(reader, table, out_dir, fmt, compression)
+            finally:
+                reader.disconnect()
+
+        with ThreadPoolExecutor(max_workers=workers or len(tables)) as pool:
+            return dict(pool.map(export_one, tables))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the library database")
+    parser.add_argument("out_dir", help="directory to write one file per table into")
+    parser.add_argument("--db", default="library_management.db")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="csv")
+    parser.add_argument("--compress", choices=["gz", "bz2", "xz"])
+    parser.add_argument("--tables", nargs="+", choices=sorted(EXPORT_TABLES), default=list(EXPORT_TABLES))
+    parser.add_argument("--parallel", action="store_true", help="export tables concurrently from a snapshot")
+    parser.add_argument("--snapshot", metavar="PATH", help="only write a backup copy of the database to PATH")
+    args = parser.parse_args()
+
+    db = LibraryDatabase(args.db, profile="wal", verbose=False)
+    if not db.connect():
+        sys.exit(1)
+    started = time.perf_counter()
+    try:
+        if args.snapshot:
+            snapshot(db, args.snapshot)
+            print(f"Snapshot written to {args.snapshot}.")
+            return
+        export = export_parallel if args.parallel else export_all
+        counts = export(db, args.out_dir, args.format, args.compress, tuple(args.tables))
+    except sqlite3.Error as e:
+        print(f"Export failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        db.disconnect()
+    for table, count in counts.items():
+        print(f"{table}: {count} rows")
+    print(f"Exported {sum(counts.values())} rows in {time.perf_counter() - started:.2f}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+from library_management import LibraryDatabase
+from library_migrations import migrate
+
+BOOK_UPSERT = """
+INSERT INTO Book (title, author, isbn, publication_year, genre, total_copies, available_copies)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(isbn) DO UPDATE SET
+    title = excluded.title,
+    author = excluded.author,
+    publication_year = excluded.publication_year,
+    genre = excluded.genre,
+    total_copies = excluded.total_copies,
+    available_copies = excluded.total_copies - (Book.total_copies - Book.available_copies)
+"""
+
+MEMBER_UPSERT = """
+INSERT INTO Member (first_name, last_name, email, phone, street, city, state, zip_code, join_date, member_type)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(email) DO UPDATE SET
+    first_name = excluded.first_name,
+    last_name = excluded.last_name,
+    phone = excluded.phone,
+    street = excluded.street,
+    city = excluded.city,
+    state = excluded.state,
+    zip_code = excluded.zip_code,
+    member_type = excluded.member_type
+"""
+
+# MARC tags read from MARCBreaker-style (.mrk) records.
+MARC_FIELDS = {
+    "020": ("isbn", "a"),
+    "100": ("author", "a"),
+    "245": ("title", "a"),
+    "260": ("publication_year", "c"),
+    "264": ("publication_year", "c"),
+    "650": ("genre", "a"),
+    "949": ("total_copies", "c"),
+}
+
+
+def text(record, field, required=False):
+    """Return a stripped text field, raising ValueError if a required one is missing"""
+    value = record.get(field)
+    value = "" if value is None else str(value).strip()
+    if required and not value:
+        raise ValueError(f"{field} is required")
+    return value
+
+
+def integer(record, field, default=None):
+    """Return an integer field, raising ValueError if it is not a whole number"""
+    value = text(record, field)
+    if not value:
+        if default is None:
+            raise ValueError(f"{field} is required")
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{field} must be a whole number, got {value!r}")
+
+
+def book_params(record):
+    """Validate a book record against the Book table's constraints"""
+    total_copies = integer(record, "total_copies", default=1)
+    if total_copies <= 0:
+        raise ValueError("total_copies must be greater than 0")
+    available_copies = integer(record, "available_copies", default=total_copies)
+    if not 0 <= available_copies <= total_copies:
+        raise ValueError("available_copies must be between 0 and total_copies")
+    return (
+        text(record, "title", required=True),
+        text(record, "author", required=True),
+        text(record, "isbn", required=True),
+        integer(record, "publication_year"),
+        text(record, "genre") or None,
+        total_copies,
+        available_copies,
+    )
+
+
+def member_params(record):
+    """Validate a member record against the Member table's constraints"""
+    join_date = text(record, "join_date") or datetime.now().strftime('%Y-%m-%d')
+    try:
+        datetime.strptime(join_date, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"join_date must be YYYY-MM-DD, got {join_date!r}")
+    member_type = text(record, "member_type") or "Standard"
+    if member_type == "*":
+        # '*' is the fine policies' wildcard, not a type a member can have.
+        raise ValueError("member_type cannot be '*'")
+    return (
+        text(record, "first_name", required=True),
+        text(record, "last_name", required=True),
+        text(record, "email", required=True),
+        text(record, "phone"),
+        text(record, "street"),
+        text(record, "city"),
+        text(record, "state"),
+        text(record, "zip_code"),
+        join_date,
+        member_type,
+    )
+
+
+ENTITIES = {
+    "books": (BOOK_UPSERT, book_params),
+    "members": (MEMBER_UPSERT, member_params),
+}
+
+
+def read_csv(path):
+    """Yield (line number, record) pairs from a CSV file with a header row"""
+    with open(path, newline="", encoding="utf-8") as source:
+        reader = csv.DictReader(source)
+        for record in reader:
+            yield reader.line_num, record
+
+
+def read_jsonl(path):
+    """Yield (line number, record) pairs from a JSON Lines file"""
+    with open(path, encoding="utf-8") as source:
+        for line_number, line in enumerate(source, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Passed through as text so the importer rejects it with the line.
+                record = line.rstrip("\n")
+            yield line_number, record
+
+
+def read_mrk(path):
+    """Yield (line number, record) pairs from MARCBreaker (.mrk) book records"""
+    with open(path, encoding="utf-8") as source:
+        record, start = {}, None
+        for line_number, line in enumerate(source, 1):
+            line = line.rstrip("\n")
+            if not line.strip():
+                if record:
+                    yield start, record
+                record, start = {}, None
+                continue
+            if not line.startswith("=") or len(line) < 4:
+                continue
+            start = start or line_number
+            field = MARC_FIELDS.get(line[1:4])
+            if field is None or field[0] in record:
+                continue
+            name, code = field
+            for subfield in line[6:].split("$")[1:]:
+                if subfield[:1] == code:
+                    value = subfield[1:].strip(" /:;,.")
+                    if name == "publication_year":
+                        value = "".join(ch for ch in value if ch.isdigit())[:4]
+                    record[name] = value
+                    break
+        if record:
+            yield start, record
+
+
+READERS = {".csv": read_csv, ".jsonl": read_jsonl, ".json": read_jsonl, ".mrk": read_mrk}
+
+
+class BulkImporter:
+    """Stream records into Book or Member in chunked, upserting transactions"""
+
+    def __init__(self, db, entity, errors_path, chunk_size=5000, report_every=5.0):
+        self.db = db
+        self.sql, self.validate = ENTITIES[entity]
+        self.errors_path = errors_path
+        self.errors = None
+        self.chunk_size = chunk_size
+        self.report_every = report_every
+        self.loaded = 0
+        self.rejected = 0
+        self.started = None
+        self.last_report = None
+
+    def reject(self, line_number, record, error):
+        """Append a rejected record to the error file"""
+        if self.errors is None:
+            self.errors = open(self.errors_path, "w", encoding="utf-8")
+        self.errors.write(json.dumps({"line": line_number, "error": error, "record": record}) + "\n")
+        self.rejected += 1
+
+    def flush(self, chunk):
+        """Write one chunk in a single transaction, isolating bad rows if it fails"""
+        try:
+            with self.db.transaction():
+                self.db.conn.executemany(self.sql, [params for _, _, params in chunk])
+            self.loaded += len(chunk)
+        except sqlite3.Error:
+            # Something the validator could not see (e.g. a constraint on an
+            # upserted row) failed the batch; retry row by row to find it.
+            with self.db.transaction():
+                for line_number, record, params in chunk:
+                    try:
+                        self.db.conn.execute(self.sql, params)
+                        self.loaded += 1
+                    except sqlite3.Error as e:
+                        self.reject(line_number, record, str(e))
+
+    def report(self, final=False):
+        """Print progress and throughput to stderr"""
+        now = time.perf_counter()
+        if not final and now - self.last_report < self.report_every:
+            return
+        self.last_report = now
+        rate = self.loaded / max(now - self.started, 1e-9)
+        print(f"{'Finished' if final else 'Progress'}: {self.loaded} rows loaded, "
+              f"{self.rejected} rejected, {rate:,.0f} rows/sec", file=sys.stderr)
+
+    def run(self, records):
+        """Import every (line number, record) pair and return the row counts"""
+        self.started = self.last_report = time.perf_counter()
+        chunk = []
+        try:
+            for line_number, record in records:
+                try:
+                    if not isinstance(record, dict):
+                        raise ValueError("record is not a JSON object")
+                    chunk.append((line_number, record, self.validate(record)))
+                except ValueError as e:
+                    self.reject(line_number, record, str(e))
+                    continue
+                if len(chunk) >= self.chunk_size:
+                    self.flush(chunk)
+                    chunk = []
+                    self.report()
+            if chunk:
+                self.flush(chunk)
+        finally:
+            if self.errors is not None:
+                self.errors.close()
+        self.report(final=True)
+        return {"loaded": self.loaded, "rejected": self.rejected}
+
+
+def import_file(db, entity, path, fmt=None, errors_path=None, chunk_size=5000):
+    """Import a CSV, JSONL or MRK file into Book or Member"""
+    reader = READERS[fmt or os.path.splitext(path)[1].lower()]
+    errors_path = errors_path or path + ".rejects.jsonl"
+    return BulkImporter(db, entity, errors_path, chunk_size).run(reader(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import books or members")
+    parser.add_argument("entity", choices=sorted(ENTITIES))
+    parser.add_argument("path", help="CSV, JSONL or MRK file to import")
+    parser.add_argument("--db", default="library_management.db")
+    parser.add_argument("--format", choices=sorted(READERS), help="file format, by default taken from the extension")
+    parser.add_argument("--errors", help="where to write rejected rows (default: <path>.rejects.jsonl)")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="rows per transaction")
+    args = parser.parse_args()
+
+    db = LibraryDatabase(args.db, profile="bulk", verbose=False)
+    if not db.connect():
+        sys.exit(1)
+    try:
+        migrate(db.conn)
+        result = import_file(db, args.entity, args.path, args.format, args.errors, args.chunk_size)
+    finally:
+        db.disconnect()
+    if result["rejected"]:
+        print(f"Rejected rows were written to {args.errors or args.path + '.rejects.jsonl'}.")
+
+
+if __name__ == "__main__":
+    main()
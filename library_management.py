@@ -1,16 +1,145 @@
 import sqlite3
-from datetime import datetime, timedelta
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from catalog_summary import CatalogSummary
+from entity_cache import EntityCache
+from hold_queue import HOLD_LISTING
+from library_migrations import migrate
+from library_service import LOAN_LISTING, LibraryService, NotFoundError, ServiceError
+from loan_fines import dollars
+from loan_service import LoanError
+from menu_dispatcher import MenuDispatcher
+
+# Connection settings applied with PRAGMA right after connecting. "wal" lets
+# readers and the writer work concurrently and keeps the page cache warm;
+# "bulk" trades durability for speed during one-off loads.
+PRAGMA_PROFILES = {
+    "default": {},
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -65536,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+    },
+    "bulk": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "busy_timeout": 5000,
+        "cache_size": -262144,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+    },
+}
+
+BACK = ("0", "Back to Main Menu", None)
+
+# Every menu and its choices, run by MenuDispatcher: a handler is a
+# LibraryManagementSystem method, "menu:<name>" for a submenu, or None to go
+# back.
+MENUS = {
+    "main": ("Library Management System", [
+        ("1", "Loan Management", "menu:loans"),
+        ("2", "Book Management", "menu:books"),
+        ("3", "Member Management", "menu:members"),
+        ("4", "Staff Management", "menu:staff"),
+        ("5", "Reports", "menu:reports"),
+        ("6", "Fines", "menu:fines"),
+        ("0", "Exit", None),
+    ]),
+    "loans": ("Loan Management", [
+        ("1", "Borrow Book", "borrow_book"),
+        ("2", "Renew Book", "renew_book"),
+        ("3", "Return Book", "return_book"),
+        ("4", "View Overdue Loans", "view_overdue_loans"),
+        ("5", "View Active Loans", "view_active_loans"),
+        ("6", "View Most Borrowed Books", "view_most_borrowed"),
+        ("7", "Place Hold", "place_hold"),
+        ("8", "Cancel Hold", "cancel_hold"),
+        ("9", "View Holds on a Book", "view_book_holds"),
+        BACK,
+    ]),
+    "books": ("Book Management", [
+        ("1", "Add Book", "add_book"),
+        ("2", "Update Book", "update_book"),
+        ("3", "Remove Book", "remove_book"),
+        ("4", "View All Books", "view_all_books"),
+        ("5", "Search Books", "search_books"),
+        ("6", "Catalog Summary", "view_catalog_summary"),
+        ("7", "Readers Also Borrowed", "view_also_borrowed"),
+        BACK,
+    ]),
+    "members": ("Member Management", [
+        ("1", "Register Member", "register_member"),
+        ("2", "Update Member", "update_member"),
+        ("3", "Remove Member", "remove_member"),
+        ("4", "View All Members", "view_all_members"),
+        ("5", "Search Members", "search_members"),
+        BACK,
+    ]),
+    "staff": ("Staff Management", [
+        ("1", "Add Staff Member", "add_staff"),
+        ("2", "Update Staff Member", "update_staff"),
+        ("3", "Remove Staff Member", "remove_staff"),
+        ("4", "View All Staff Members", "view_all_staff"),
+        ("5", "Search Staff Members", "search_staff"),
+        BACK,
+    ]),
+    "reports": ("Reports", [
+        ("1", "Loans per Day", "view_loans_per_day"),
+        ("2", "Top Titles", "view_top_titles"),
+        ("3", "Genre Demand", "view_genre_demand"),
+        ("4", "Loan Duration", "view_loan_duration"),
+        ("5", "Member Activity Cohorts", "view_member_cohorts"),
+        BACK,
+    ]),
+    "fines": ("Fines", [
+        ("1", "View Member Fines", "view_member_fines"),
+        ("2", "Pay Fine", "pay_fine"),
+        ("3", "Waive Fine", "waive_fine"),
+        ("4", "Assess Overdue Fines", "assess_fines"),
+        ("5", "View Fine Policies", "view_fine_policies"),
+        ("6", "Set Fine Policy", "set_fine_policy"),
+        BACK,
+    ]),
+}
 
 class LibraryDatabase:
-    def __init__(self, db_path="library_database.db"):
+    def __init__(self, db_path="library_database.db", profile="default", pragmas=None,
+                 check_same_thread=True, verbose=True):
         self.db_path = db_path
         self.conn = None
+        self.pragmas = dict(PRAGMA_PROFILES[profile])
+        self.pragmas.update(pragmas or {})
+        self.check_same_thread = check_same_thread
+        self.verbose = verbose
+        self.depth = 0
+        self.group_commit_ops = None
+        self.group_commit_delay = None
+        self.pending_ops = 0
+        self.pending_since = None
+        self.flush_timer = None
+        # Serializes group-commit statements with the timer that flushes them.
+        self.commit_lock = threading.RLock()
+        self.metrics = None
+        self.vm_ticks = 0
+        self.progress_steps = 0
     
     def connect(self):
         """Connect to the database"""
         try:
-            self.conn = sqlite3.connect(self.db_path)
-            print("Connected to the database successfully.")
+            # Autocommit mode: statements outside a transaction scope commit
+            # on their own, and scopes issue BEGIN/COMMIT explicitly.
+            self.conn = sqlite3.connect(self.db_path, isolation_level=None,
+                                        check_same_thread=self.check_same_thread)
+            for name, value in self.pragmas.items():
+                self.conn.execute(f"PRAGMA {name} = {value}")
+            if self.verbose:
+                print("Connected to the database successfully.")
             self.conn.row_factory = sqlite3.Row
             return True
         except sqlite3.Error as e:
@@ -20,229 +149,253 @@ class LibraryDatabase:
     def disconnect(self):
         """Disconnect from the database"""
         if self.conn:
+            self.disable_group_commit()
             self.conn.close()
-            print("Disconnected from the database.")
+            if self.verbose:
+                print("Disconnected from the database.")
     
     def execute_query(self, query, params=()):
         """Execute a query and return the result"""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(query, params)
-            self.conn.commit()
-            return cursor.fetchall()
+            # Disabled instrumentation costs this one attribute check.
+            if self.metrics is None:
+                return self.run_query(query, params)
+            return self.metrics.observe(self, query, params, self.run_query)
         except sqlite3.Error as e:
+            if self.depth > 0:
+                raise
             print(f"Error executing query: {e}")
             return None
-        
+
+    def execute(self, query, params=()):
+        """Execute one statement and return its cursor; unlike execute_query, errors propagate"""
+        if self.metrics is None:
+            return self.conn.execute(query, params)
+        return self.metrics.observe(self, query, params, self.conn.execute)
+
+    def run_query(self, query, params=()):
+        cursor = self.conn.cursor()
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
     def execute_update(self, query, params=()):
         """Execute an update query (INSERT, UPDATE, DELETE)"""
         try:
+            if self.metrics is None:
+                return self.run_update(query, params)
+            return self.metrics.observe(self, query, params, self.run_update)
+        except sqlite3.Error as e:
+            if self.depth > 0:
+                # Inside a scope the failure must reach transaction(), which
+                # rolls back everything the scope did; otherwise the statements
+                # before this one would still be committed.
+                raise
+            print(f"Error executing update: {e}")
+            return None
+
+    def run_update(self, query, params=()):
+        if not self.group_commit_ops:
             cursor = self.conn.cursor()
             cursor.execute(query, params)
-            self.conn.commit()
             return cursor.rowcount
+        with self.commit_lock:
+            if self.depth == 0 and not self.conn.in_transaction:
+                self.conn.execute("BEGIN")
+                self.pending_since = time.monotonic()
+                # The deadline is kept by a timer, so a batch left open while
+                # the caller waits (for input, a request, the next job) does
+                # not hold the write lock past max_delay_ms.
+                self.flush_timer = threading.Timer(self.group_commit_delay, self.flush)
+                self.flush_timer.daemon = True
+                self.flush_timer.start()
+            cursor = self.conn.cursor()
+            cursor.execute(query, params)
+            if self.depth == 0:
+                self.pending_ops += 1
+                self.flush_if_due()
+            return cursor.rowcount
+
+    def enable_metrics(self, metrics, trace=False, progress_steps=0):
+        """Record execute_query/execute_update statistics in a QueryMetrics, optionally with SQLite hooks"""
+        self.metrics = metrics
+        if trace:
+            self.conn.set_trace_callback(metrics.trace)
+        if progress_steps:
+            # Called every progress_steps VM instructions; counting the calls
+            # gives each statement's approximate VM work.
+            self.progress_steps = progress_steps
+            self.conn.set_progress_handler(self.count_vm_steps, progress_steps)
+
+    def count_vm_steps(self):
+        self.vm_ticks += 1
+        return 0
+
+    def disable_metrics(self):
+        """Stop recording statistics and remove the SQLite hooks"""
+        self.metrics = None
+        self.conn.set_trace_callback(None)
+        self.conn.set_progress_handler(None, 0)
+        self.progress_steps = 0
+
+    def stream_query(self, query, params=(), batch_size=1000):
+        """Yield the rows of a query lazily, batch_size rows at a time
+
+        Errors are raised rather than printed: a stream that just stopped
+        would look like the complete result.
+        """
+        cursor = self.conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
+
+    def keyset_page(self, select, key, after=None, before=None, limit=20, where="", params=()):
+        """Return up to limit rows in key order, starting after or ending before a key value"""
+        conditions = [where] if where else []
+        params = list(params)
+        order = "ASC"
+        if before is not None:
+            conditions.append(f"{key} < ?")
+            params.append(before)
+            order = "DESC"
+        elif after is not None:
+            conditions.append(f"{key} > ?")
+            params.append(after)
+        query = select
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {key} {order} LIMIT ?"
+        params.append(limit)
+        rows = self.execute_query(query, tuple(params))
+        if rows and before is not None:
+            rows.reverse()
+        return rows
+
+    def job_state(self, name, default=None):
+        """Return the stored progress marker of an incremental background job"""
+        rows = self.execute_query("SELECT value FROM JobState WHERE name = ?", (name,))
+        return rows[0]["value"] if rows else default
+
+    def set_job_state(self, name, value):
+        """Store the progress marker of an incremental background job"""
+        return self.execute_update(
+            "INSERT INTO JobState (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            (name, value)
+        )
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """Group the enclosed statements into one commit; nested scopes use savepoints"""
+        if self.depth == 0:
+            self.flush()
+            self.conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        else:
+            self.conn.execute(f"SAVEPOINT scope_{self.depth}")
+        self.depth += 1
+        try:
+            yield self
+        except BaseException:
+            self.depth -= 1
+            if self.depth == 0:
+                self.conn.rollback()
+            else:
+                self.conn.execute(f"ROLLBACK TO scope_{self.depth}")
+                self.conn.execute(f"RELEASE scope_{self.depth}")
+            raise
+        self.depth -= 1
+        if self.depth == 0:
+            self.conn.commit()
+        else:
+            self.conn.execute(f"RELEASE scope_{self.depth}")
+
+    def unit_of_work(self, work, *args, immediate=False):
+        """Run work(db, *args) in one transaction and return its result"""
+        try:
+            with self.transaction(immediate=immediate):
+                return work(self, *args)
         except sqlite3.Error as e:
-            print(f"Error executing update: {e}")
-            self.conn.rollback()
+            print(f"Error executing unit of work: {e}")
             return None
-        
+
+    def enable_group_commit(self, max_ops=100, max_delay_ms=50):
+        """Commit execute_update calls every max_ops statements or max_delay_ms milliseconds"""
+        if self.check_same_thread:
+            # The deadline flush commits from the timer's thread.
+            raise ValueError("Group commit needs a connection opened with check_same_thread=False.")
+        self.group_commit_ops = max_ops
+        self.group_commit_delay = max_delay_ms / 1000.0
+
+    def disable_group_commit(self):
+        """Flush pending statements and go back to one commit per statement"""
+        self.flush()
+        self.group_commit_ops = None
+        self.group_commit_delay = None
+
+    def flush_if_due(self):
+        """Commit a group-commit batch once it is full or old enough"""
+        if self.pending_ops and (
+            self.pending_ops >= self.group_commit_ops
+            or time.monotonic() - self.pending_since >= self.group_commit_delay
+        ):
+            self.flush()
+
+    def flush(self):
+        """Commit any statements held back by group commit"""
+        with self.commit_lock:
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+                self.flush_timer = None
+            if self.pending_ops and self.depth == 0 and self.conn.in_transaction:
+                self.conn.commit()
+            self.pending_ops = 0
+            self.pending_since = None
+
+
 class LibraryManagementSystem:
-    def __init__(self, db_path="library_management.db"):
-        self.db = LibraryDatabase(db_path)
+    def __init__(self, db_path="library_management.db", profile="wal"):
+        self.db = LibraryDatabase(db_path, profile)
         if not self.db.connect():
             raise Exception("Failed to connect to the database.")
+        migrate(self.db.conn)
+        self.page_size = 20
+        self.cache = EntityCache(self.db)
+        self.summary = CatalogSummary()
+        self.service = LibraryService(self.db, cache=self.cache, summary=self.summary)
+        self.search = self.service.search
+        self.loans = self.service.loans
+        self.sweeper = self.service.sweeper
+        self.counters = self.service.counters
+        self.reports = self.service.reports
+        self.dispatcher = MenuDispatcher(self, MENUS, guards={"staff": "authorize_staff"})
     
-    def display_menu(self):
-        """Display the main menu"""
-        print("\nLibrary Management System")
-        print("1. Loan Management")
-        print("2. Book Management")
-        print("3. Member Management")
-        print("4. Staff Management")
-        print("0. Exit")
-        choice = input("Enter your choice: ")
-        if choice == "1":
-            self.loan_management_menu()
-        elif choice == "2":
-            self.book_management_menu()
-        elif choice == "3":
-            self.member_management_menu()
-        elif choice == "4":
-            self.staff_management_menu()
-        elif choice == "0":
-            print("Exiting...")
-        else:
-            print("Invalid choice.")
-
-    def loan_management_menu(self):
-        """Display the loan management menu"""
-        print("\nLoan Management")
-        print("1. Borrow Book")
-        print("2. Renew Book")
-        print("3. Return Book")
-        print("4. View Overdue Loans")
-        print("5. View Active Loans")
-        print("0. Back to Main Menu")
-        choice = input("Enter your choice: ")
-        if choice == "1":
-            self.borrow_book()
-        elif choice == "2":
-            self.renew_book()
-        elif choice == "3":
-            self.return_book()
-        elif choice == "4":
-            self.view_overdue_loans()
-        elif choice == "5":
-            self.view_active_loans()
-        elif choice == "0":
-            self.display_menu()
-        else:
-            print("Invalid choice.")
-
-    def book_management_menu(self):
-        """Display the book management menu"""
-        print("\nBook Management")
-        print("1. Add Book")
-        print("2. Update Book")
-        print("3. Remove Book")
-        print("4. View All Books")
-        print("5. Search Books")
-        print("0. Back to Main Menu")
-        choice = input("Enter your choice: ")
-        if choice == "1":
-            self.add_book()
-        elif choice == "2":
-            self.update_book()
-        elif choice == "3":
-            self.remove_book()
-        elif choice == "4":
-            self.view_all_books()
-        elif choice == "5":
-            self.search_books()
-        elif choice == "0":
-            self.display_menu()
-        else:
-            print("Invalid choice.")
-
-    def member_management_menu(self):
-        """Display the member management menu"""
-        print("\nMember Management")
-        print("1. Register Member")
-        print("2. Update Member")
-        print("3. Remove Member")
-        print("4. View All Members")
-        print("5. Search Members")
-        print("0. Back to Main Menu")
-        choice = input("Enter your choice: ")
-        if choice == "1":
-            self.register_member()
-        elif choice == "2":
-            self.update_member()
-        elif choice == "3":
-            self.remove_member()
-        elif choice == "4":
-            self.view_all_members()
-        elif choice == "5":
-            self.search_members()
-        elif choice == "0":
-            self.display_menu()
-        else:
-            print("Invalid choice.")
-
-    def staff_management_menu(self):
-        """Display the staff management menu"""
+    def authorize_staff(self):
+        """Let only managers and head librarians into Staff Management"""
         staff_id = input("Enter your Staff ID to access Staff Management: ")
         query = "SELECT role FROM Staff WHERE staff_id = ?"
         result = self.db.execute_query(query, (staff_id,))
         if not result or result[0]["role"] not in ["Manager", "Head Librarian"]:
             print("Access denied. You do not have permission to manage staff.")
-            return
-
-        print("\nStaff Management")
-        print("1. Add Staff Member")
-        print("2. Update Staff Member")
-        print("3. Remove Staff Member")
-        print("4. View All Staff Members")
-        print("5. Search Staff Members")
-        print("0. Back to Main Menu")
-        choice = input("Enter your choice: ")
-        if choice == "1":
-            self.add_staff()
-        elif choice == "2":
-            self.update_staff()
-        elif choice == "3":
-            self.remove_staff()
-        elif choice == "4":
-            self.view_all_staff()
-        elif choice == "5":
-            self.search_staff()
-        elif choice == "0":
-            self.display_menu()
-        else:
-            print("Invalid choice.")
+            return False
+        return True
 
     def borrow_book(self):
         """Process book borrowing"""
         try:
             member_id = int(input("Enter Member ID: "))
             book_id = int(input("Enter Book ID: "))
-            
-            # Check if member exists
-            member_check = self.db.execute_query("SELECT * FROM MEMBER WHERE member_id = ?", (member_id,))
-            if not member_check:
-                print("Member not found!")
-                return
-            
-            # Check if book exists and is available
-            book_check = self.db.execute_query(
-                "SELECT * FROM BOOK WHERE book_id = ? AND available_copies > 0", 
-                (book_id,)
-            )
-            if not book_check:
-                print("Book not found or no copies available!")
-                return
-            
-            # Check member's current loan count
-            loan_count = self.db.execute_query(
-                "SELECT COUNT(*) as count FROM LOAN WHERE member_id = ? AND status = 'Active'",
-                (member_id,)
-            )[0]['count']
-            
-            if loan_count >= 5:
-                print("Member has reached the maximum loan limit (5 books)!")
-                return
-            
-            # Create loan record
-            loan_date = datetime.now().strftime('%Y-%m-%d')
-            due_date = (datetime.now() + timedelta(days=14)).strftime('%Y-%m-%d')
-            
-            insert_loan = """
-            INSERT INTO LOAN (member_id, book_id, loan_date, due_date, status)
-            VALUES (?, ?, ?, ?, 'Active')
-            """
-            
-            # Update available copies
-            update_book = """
-            UPDATE BOOK SET available_copies = available_copies - 1 
-            WHERE book_id = ?
-            """
-            
-            # Execute queries
-            if (self.db.execute_update(insert_loan, (member_id, book_id, loan_date, due_date)) > 0 and
-                self.db.execute_update(update_book, (book_id,)) > 0):
-
-                member_name = f"{member_check[0]['first_name']} {member_check[0]['last_name']}"
-                book_title = book_check[0]['title']
-                
-                print(f"Book borrowed successfully!")
-                print(f"Member: {member_name}")
-                print(f"Book: {book_title}")
-                print(f"Due Date: {due_date}")
-            else:
-                print("Failed to process book borrowing!")
-                
+
+            loan = self.service.borrow(member_id, book_id)
+            print(f"Book borrowed successfully!")
+            print(f"Member: {loan['member_name']}")
+            print(f"Book: {loan['title']}")
+            print(f"Due Date: {loan['due_date']}")
+
         except ValueError:
             print("Please enter valid numeric IDs!")
+        except LoanError as e:
+            print(e)
         except Exception as e:
             print(f"Error: {e}")
 
@@ -251,29 +404,14 @@ class LibraryManagementSystem:
         try:
             member_id = int(input("Enter Member ID: "))
             book_id = int(input("Enter Book ID: "))
-            
-            # Check if loan exists
-            loan_check = self.db.execute_query(
-                "SELECT * FROM LOAN WHERE member_id = ? AND book_id = ? AND status = 'Active'",
-                (member_id, book_id)
-            )
-            if not loan_check:
-                print("No active loan found for this book and member!")
-                return
-            
-            # Renew the loan
-            new_due_date = (datetime.now() + timedelta(days=14)).strftime('%Y-%m-%d')
-            update_loan = """
-            UPDATE LOAN SET due_date = ? WHERE member_id = ? AND book_id = ? AND status = 'Active'
-            """
-            
-            if self.db.execute_update(update_loan, (new_due_date, member_id, book_id)) > 0:
-                print(f"Book renewed successfully! New Due Date: {new_due_date}")
-            else:
-                print("Failed to renew the book!")
-                
+
+            loan = self.service.renew(member_id, book_id)
+            print(f"Book renewed successfully! New Due Date: {loan['due_date']}")
+
         except ValueError:
             print("Please enter valid numeric IDs!")
+        except LoanError as e:
+            print(e)
         except Exception as e:
             print(f"Error: {e}")
 
@@ -282,83 +420,253 @@ class LibraryManagementSystem:
         try:
             member_id = int(input("Enter Member ID: "))
             book_id = int(input("Enter Book ID: "))
-            
-            # Check if loan exists
-            loan_check = self.db.execute_query(
-                "SELECT * FROM LOAN WHERE member_id = ? AND book_id = ? AND status = 'Active'",
-                (member_id, book_id)
-            )
-            if not loan_check:
-                print("No active loan found for this book and member!")
-                return
-            
-            # Update the loan status to 'Returned'
-            update_loan = """
-            UPDATE LOAN SET status = 'Returned' WHERE member_id = ? AND book_id = ? AND status = 'Active'
-            """
-            
-            # Update available copies
-            update_book = """
-            UPDATE BOOK SET available_copies = available_copies + 1 
-            WHERE book_id = ?
-            """
-            
-            if (self.db.execute_update(update_loan, (member_id, book_id)) > 0 and
-                self.db.execute_update(update_book, (book_id,)) > 0):
-
-                print("Book returned successfully!")
-            else:
-                print("Failed to return the book!")
-                
+
+            loan = self.service.return_book(member_id, book_id)
+            print("Book returned successfully!")
+            if loan["fine_cents"]:
+                print(f"Returned late: a fine of {dollars(loan['fine_cents'])} is due.")
+            if loan["held_for"]:
+                print(f"Set the copy aside for hold {loan['held_for']['hold_id']} "
+                      f"(Member ID: {loan['held_for']['member_id']}).")
+
+        except ValueError:
+            print("Please enter valid numeric IDs!")
+        except LoanError as e:
+            print(e)
+        except Exception as e:
+            print(f"Error: {e}")
+
+    def place_hold(self):
+        """Queue a member for the next copy of a book"""
+        try:
+            member_id = int(input("Enter Member ID: "))
+            book_id = int(input("Enter Book ID: "))
+
+            hold = self.service.place_hold(member_id, book_id)
+            print(f"Hold placed! Hold ID: {hold['hold_id']}, Position in queue: {hold['position']}")
+
+        except ValueError:
+            print("Please enter valid numeric IDs!")
+        except LoanError as e:
+            print(e)
+        except Exception as e:
+            print(f"Error: {e}")
+
+    def cancel_hold(self):
+        """Cancel a member's hold on a book"""
+        try:
+            member_id = int(input("Enter Member ID: "))
+            book_id = int(input("Enter Book ID: "))
+
+            self.service.cancel_hold(member_id, book_id)
+            print("Hold cancelled successfully!")
+
         except ValueError:
             print("Please enter valid numeric IDs!")
+        except LoanError as e:
+            print(e)
+        except Exception as e:
+            print(f"Error: {e}")
+
+    def view_book_holds(self):
+        """View the holds waiting for a book, in queue order"""
+        try:
+            book_id = int(input("Enter Book ID: "))
+            self.page_through(
+                HOLD_LISTING, "Hold.hold_id", self.print_hold, f"Holds on Book {book_id}", "No holds on this book.",
+                where="Hold.book_id = ? AND Hold.status = 'Waiting'", params=(book_id,)
+            )
+        except ValueError:
+            print("Please enter a valid numeric Book ID.")
         except Exception as e:
             print(f"Error: {e}")
 
     def view_overdue_loans(self):
         """View all overdue loans"""
         try:
-            today = datetime.now().strftime('%Y-%m-%d')
-            query = """
-            SELECT LOAN.loan_id, MEMBER.first_name, MEMBER.last_name, BOOK.title, LOAN.due_date 
-            FROM LOAN 
-            JOIN MEMBER ON LOAN.member_id = MEMBER.member_id 
-            JOIN BOOK ON LOAN.book_id = BOOK.book_id 
-            WHERE LOAN.status = 'Active' AND LOAN.due_date < ?
-            """
-            overdue_loans = self.db.execute_query(query, (today,))
-            
-            if overdue_loans:
-                print("\nOverdue Loans:")
-                for loan in overdue_loans:
-                    print(f"Loan ID: {loan['loan_id']}, Member: {loan['first_name']} {loan['last_name']}, "
-                          f"Book: {loan['title']}, Due Date: {loan['due_date']}")
-            else:
-                print("No overdue loans found.")
-                
+            # Only Active loans already past due are read, so this is a
+            # single index probe after the nightly run.
+            self.sweeper.run()
+            self.page_through(
+                LOAN_LISTING, "LOAN.loan_id", self.print_loan, "Overdue Loans", "No overdue loans found.",
+                where="LOAN.status = 'Overdue'"
+            )
         except Exception as e:
             print(f"Error: {e}")
 
     def view_active_loans(self):
         """View all active loans"""
         try:
-            query = """
-            SELECT LOAN.loan_id, MEMBER.first_name, MEMBER.last_name, BOOK.title, LOAN.due_date 
-            FROM LOAN 
-            JOIN MEMBER ON LOAN.member_id = MEMBER.member_id 
-            JOIN BOOK ON LOAN.book_id = BOOK.book_id 
-            WHERE LOAN.status = 'Active'
-            """
-            active_loans = self.db.execute_query(query)
-            
-            if active_loans:
-                print("\nActive Loans:")
-                for loan in active_loans:
-                    print(f"Loan ID: {loan['loan_id']}, Member: {loan['first_name']} {loan['last_name']}, "
-                          f"Book: {loan['title']}, Due Date: {loan['due_date']}")
+            self.page_through(
+                LOAN_LISTING, "LOAN.loan_id", self.print_loan, "Active Loans", "No active loans found.",
+                where="LOAN.status = 'Active'"
+            )
+        except Exception as e:
+            print(f"Error: {e}")
+
+    def view_most_borrowed(self):
+        """View the most borrowed books"""
+        try:
+            books = self.service.most_borrowed(10)
+            if books:
+                print("\nMost Borrowed Books:")
+                for book in books:
+                    print(f"ID: {book['book_id']}, Title: {book['title']}, Author: {book['author']}, "
+                          f"Total Loans: {book['total_loans']}, On Loan: {book['on_loan']}")
             else:
-                print("No active loans found.")
-                
+                print("No loans recorded yet.")
+        except Exception as e:
+            print(f"Error: {e}")
+
+    def report_period(self, unit="YYYY-MM-DD", default="30 days ago"):
+        """Roll up the loans since the last refresh and ask for a report's first and last day"""
+        # Incremental, like the overdue sweep: only loans and returns since
+        # the last refresh are read.
+        self.reports.refresh()
+        start = input(f"Enter start ({unit}, blank for {default}): ").strip() or None
+        end = input(f"Enter end ({unit}, blank for now): ").strip() or None
+        return start, end
+
+    def view_loans_per_day(self):
+        """View loans, returns and late returns per day"""
+        try:
+            days = self.service.loans_per_day(*self.report_period())
+            if days:
+                print("\nLoans per Day:")
+                for day in days:
+                    print(f"{day['day']}: {day['loans']} loans, {day['returns']} returns "
+                          f"({day['late_returns']} late)")
+            else:
+                print("No loans in this period.")
+        except Exception as e:
+            print(f"Error: {e}")
+
+    def view_top_titles(self):
+        """View the most borrowed titles over a period"""
+        try:
+            books = self.service.top_titles(*self.report_period())
+            if books:
+                print("\nTop Titles:")
+                for book in books:
+                    print(f"ID: {book['book_id']}, Title: {book['title']}, Author: {book['author']}, "
+                          f"Loans: {book['loans']}")
+            else:
+                print("No loans in this period.")
+        except Exception as e:
+            print(f"Error: {e}")
+
+    def view_genre_demand(self):
+        """View loans per genre over a period"""
+        try:
+            genres = self.service.genre_demand(*self.report_period())
+            if genres:
+                print("\nGenre Demand:")
+                for genre in genres:
+                    print(f"{genre['genre']}: {genre['loans']} loans")
+            else:
+                print("No loans in this period.")
+        except Exception as e:
+            print(f"Error: {e}")
+
+    def view_loan_duration(self):
+        """View the average time out of the loans returned over a period"""
+        try:
+            duration = self.service.loan_duration(*self.report_period())
+            if duration["returns"]:
+                print(f"\n{duration['returns']} loans returned, {duration['late_returns']} late, "
+                      f"after {duration['average_days']} days on average.")
+            else:
+                print("No returns in this period.")
+        except Exception as e:
+            print(f"Error: {e}")
+
+    def view_member_cohorts(self):
+        """View members active per month, grouped by the month they joined"""
+        try:
+            cohorts = self.service.member_cohorts(*self.report_period("YYYY-MM", "12 months ago"))
+            if cohorts:
+                print("\nMember Activity by Join Month:")
+                for cohort in cohorts:
+                    print(f"Joined {cohort['cohort']}, {cohort['month']}: {cohort['active_members']} active members, "
+                          f"{cohort['loans']} loans")
+            else:
+                print("No loans in this period.")
+        except Exception as e:
+            print(f"Error: {e}")
+
+    def view_member_fines(self):
+        """View a member's accruing and due fines"""
+        try:
+            member_id = int(input("Enter Member ID: "))
+            result = self.service.member_fines(member_id)
+            if result["fines"]:
+                print("\nOpen Fines:")
+                for fine in result["fines"]:
+                    print(f"Loan ID: {fine['loan_id']}, Title: {fine['title']}, Days Overdue: {fine['days_overdue']}, "
+                          f"Amount: {dollars(fine['amount_cents'])}, Status: {fine['status']}")
+                print(f"Total: {dollars(result['total_cents'])}")
+            else:
+                print("No open fines for this member.")
+        except ValueError:
+            print("Please enter a valid numeric Member ID.")
+        except Exception as e:
+            print(f"Error: {e}")
+
+    def pay_fine(self):
+        """Record payment of a returned loan's fine"""
+        self.close_fine(self.service.pay_fine, "paid")
+
+    def waive_fine(self):
+        """Waive a returned loan's fine"""
+        self.close_fine(self.service.waive_fine, "waived")
+
+    def close_fine(self, operation, verb):
+        try:
+            loan_id = int(input("Enter Loan ID: "))
+            fine = operation(loan_id)
+            print(f"Fine of {dollars(fine['amount_cents'])} {verb}.")
+        except ValueError:
+            print("Please enter a valid numeric Loan ID.")
+        except NotFoundError as e:
+            print(e)
+        except Exception as e:
+            print(f"Error: {e}")
+
+    def assess_fines(self):
+        """Bring the fines of every overdue loan up to today"""
+        try:
+            result = self.service.assess_fines(force=True)
+            print(f"Assessed {result['assessed']} fines.")
+        except Exception as e:
+            print(f"Error: {e}")
+
+    def view_fine_policies(self):
+        """View the fine policies"""
+        try:
+            print("\nFine Policies ('*' matches any):")
+            for policy in self.service.fine_policies():
+                cap = dollars(policy['max_cents']) if policy['max_cents'] is not None else "none"
+                print(f"Genre: {policy['genre']}, Member Type: {policy['member_type']}, "
+                      f"Per Day: {dollars(policy['daily_cents'])}, Grace Days: {policy['grace_days']}, Cap: {cap}")
+        except Exception as e:
+            print(f"Error: {e}")
+
+    def set_fine_policy(self):
+        """Add or change the fine policy of a genre and member type"""
+        try:
+            genre = input("Enter genre (blank for any): ").strip()
+            member_type = input("Enter member type (blank for any): ").strip()
+            daily_cents = int(input("Enter fine per day in cents: "))
+            grace_days = int(input("Enter grace days (blank for 0): ").strip() or 0)
+            max_cents = input("Enter maximum fine in cents (blank for no cap): ").strip()
+            self.service.set_fine_policy(
+                daily_cents, genre, member_type, grace_days, int(max_cents) if max_cents else None
+            )
+            print("Fine policy saved.")
+        except ValueError:
+            print("Please enter whole numbers for amounts and days.")
+        except ServiceError as e:
+            print(e)
         except Exception as e:
             print(f"Error: {e}")
 
@@ -376,13 +684,7 @@ class LibraryManagementSystem:
                 print("Total copies must be greater than 0.")
                 return
 
-            available_copies = total_copies
-
-            query = """
-            INSERT INTO Book (title, author, isbn, publication_year, genre, total_copies, available_copies)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """
-            result = self.db.execute_update(query, (title, author, isbn, publication_year, genre, total_copies, available_copies))
+            result = self.attempt(self.service.add_book, title, author, isbn, publication_year, genre, total_copies)
             if result:
                 print("Book added successfully!")
             else:
@@ -403,35 +705,10 @@ class LibraryManagementSystem:
             genre = input("Enter new genre (leave blank to keep current): ").strip()
             total_copies = input("Enter new total copies (leave blank to keep current): ").strip()
 
-            query = "UPDATE Book SET "
-            params = []
-
-            if title:
-                query += "title = ?, "
-                params.append(title)
-            if author:
-                query += "author = ?, "
-                params.append(author)
-            if isbn:
-                query += "isbn = ?, "
-                params.append(isbn)
-            if publication_year:
-                query += "publication_year = ?, "
-                params.append(int(publication_year))
-            if genre:
-                query += "genre = ?, "
-                params.append(genre)
-            if total_copies:
-                query += "total_copies = ?, available_copies = ? "
-                params.append(int(total_copies))
-                params.append(int(total_copies))  # Reset available copies to total copies
-            else:
-                query = query.rstrip(", ")  # Remove trailing comma
-
-            query += " WHERE book_id = ?"
-            params.append(book_id)
-
-            result = self.db.execute_update(query, tuple(params))
+            result = self.attempt(
+                self.service.update_book, book_id, title=title, author=author, isbn=isbn,
+                year=publication_year, genre=genre, copies=total_copies
+            )
             if result:
                 print("Book updated successfully!")
             else:
@@ -445,8 +722,7 @@ class LibraryManagementSystem:
         """Remove a book from the library"""
         try:
             book_id = int(input("Enter Book ID to remove: "))
-            query = "DELETE FROM Book WHERE book_id = ?"
-            result = self.db.execute_update(query, (book_id,))
+            result = self.attempt(self.service.remove_book, book_id)
             if result:
                 print("Book removed successfully!")
             else:
@@ -459,17 +735,43 @@ class LibraryManagementSystem:
     def view_all_books(self):
         """View all books in the library"""
         try:
-            query = "SELECT * FROM Book"
-            books = self.db.execute_query(query)
-            if books:
-                print("\nAll Books:")
-                for book in books:
-                    print(f"ID: {book['book_id']}, Title: {book['title']}, Author: {book['author']}, "
-                          f"ISBN: {book['isbn']}, Year: {book['publication_year']}, "
-                          f"Genre: {book['genre']}, Total Copies: {book['total_copies']}, "
-                          f"Available Copies: {book['available_copies']}")
-            else:
-                print("No books found.")
+            self.page_through("SELECT * FROM Book", "book_id", self.print_book, "All Books", "No books found.")
+        except Exception as e:
+            print(f"Error: {e}")
+
+    def view_catalog_summary(self):
+        """View copy counts per genre and decade, and the most borrowed books"""
+        try:
+            print("\nBooks by Genre:")
+            for facet in self.service.genre_facets():
+                print(f"{facet['genre']}: {facet['titles']} titles, {facet['available']} of {facet['copies']} copies available")
+            print("\nBooks by Decade:")
+            for facet in self.service.decade_facets():
+                decade = f"{facet['decade']}s" if facet['decade'] is not None else "Unknown"
+                print(f"{decade}: {facet['titles']} titles, {facet['available']} of {facet['copies']} copies available")
+            print("\nMost Circulated:")
+            for book in self.service.top_circulating(10):
+                print(f"ID: {book['book_id']}, Genre: {book['genre']}, Total Loans: {book['total_loans']}, "
+                      f"On Loan: {book['on_loan']}")
+        except Exception as e:
+            print(f"Error: {e}")
+
+    def view_also_borrowed(self):
+        """View the books most often borrowed by readers of a book"""
+        try:
+            book_id = int(input("Enter Book ID: "))
+            # Cheap once built: only the loans made since the last update are counted.
+            self.service.update_recommendations()
+            books = self.service.also_borrowed(book_id, 10)["books"]
+            if not books:
+                print("No co-borrowed books found for this book.")
+                return
+            print(f"\nReaders Who Borrowed Book {book_id} Also Borrowed:")
+            for book in books:
+                print(f"ID: {book['book_id']}, Title: {book['title']}, Author: {book['author']}, "
+                      f"Readers: {book['members']}")
+        except ValueError:
+            print("Please enter a valid numeric Book ID.")
         except Exception as e:
             print(f"Error: {e}")
 
@@ -477,22 +779,11 @@ class LibraryManagementSystem:
         """Search for books by title, author, or ISBN"""
         try:
             search_term = input("Enter search term (title, author, or ISBN): ").strip()
-            query = """
-            SELECT * FROM Book 
-            WHERE title LIKE ? OR author LIKE ? OR isbn LIKE ?
-            """
-            params = ('%' + search_term + '%', '%' + search_term + '%', '%' + search_term + '%')
-            books = self.db.execute_query(query, params)
-            
-            if books:
-                print("\nSearch Results:")
-                for book in books:
-                    print(f"ID: {book['book_id']}, Title: {book['title']}, Author: {book['author']}, "
-                          f"ISBN: {book['isbn']}, Year: {book['publication_year']}, "
-                          f"Genre: {book['genre']}, Total Copies: {book['total_copies']}, "
-                          f"Available Copies: {book['available_copies']}")
-            else:
-                print("No books found matching the search term.")
+            self.page_search_results(
+                lambda page: self.search.search_books(search_term, page),
+                self.print_book,
+                "No books found matching the search term."
+            )
         except Exception as e:
             print(f"Error: {e}")
 
@@ -507,14 +798,12 @@ class LibraryManagementSystem:
             city = input("Enter city (optional): ").strip()
             state = input("Enter state (optional): ").strip()
             zip_code = input("Enter zip code (optional): ").strip()
-            join_date = datetime.now().strftime('%Y-%m-%d')
-
-            query = """
-            INSERT INTO Member (first_name, last_name, email, phone, street, city, state, zip_code, join_date)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """
-            params = (first_name, last_name, email, phone, street, city, state, zip_code, join_date)
-            result = self.db.execute_update(query, params)
+            member_type = input("Enter member type (optional, e.g., Standard, Student, Senior): ").strip()
+
+            result = self.attempt(
+                self.service.register_member, first_name, last_name, email, phone, street, city, state, zip_code,
+                member_type
+            )
             if result:
                 print("Member registered successfully!")
             else:
@@ -534,39 +823,12 @@ class LibraryManagementSystem:
             city = input("Enter new city (leave blank to keep current): ").strip()
             state = input("Enter new state (leave blank to keep current): ").strip()
             zip_code = input("Enter new zip code (leave blank to keep current): ").strip()
+            member_type = input("Enter new member type (leave blank to keep current): ").strip()
 
-            query = "UPDATE Member SET "
-            params = []
-
-            if first_name:
-                query += "first_name = ?, "
-                params.append(first_name)
-            if last_name:
-                query += "last_name = ?, "
-                params.append(last_name)
-            if email:
-                query += "email = ?, "
-                params.append(email)
-            if phone:
-                query += "phone = ?, "
-                params.append(phone)
-            if street:
-                query += "street = ?, "
-                params.append(street)
-            if city:
-                query += "city = ?, "
-                params.append(city)
-            if state:
-                query += "state = ?, "
-                params.append(state)
-            if zip_code:
-                query += "zip_code = ? "
-                params.append(zip_code)
-
-            query = query.rstrip(", ") + " WHERE member_id = ?"
-            params.append(member_id)
-
-            result = self.db.execute_update(query, tuple(params))
+            result = self.attempt(
+                self.service.update_member, member_id, first_name=first_name, last_name=last_name, email=email,
+                phone=phone, street=street, city=city, state=state, zip_code=zip_code, member_type=member_type
+            )
             if result:
                 print("Member updated successfully!")
             else:
@@ -580,8 +842,7 @@ class LibraryManagementSystem:
         """Remove a library member"""
         try:
             member_id = int(input("Enter Member ID to remove: "))
-            query = "DELETE FROM Member WHERE member_id = ?"
-            result = self.db.execute_update(query, (member_id,))
+            result = self.attempt(self.service.remove_member, member_id)
             if result:
                 print("Member removed successfully!")
             else:
@@ -594,17 +855,7 @@ class LibraryManagementSystem:
     def view_all_members(self):
         """View all library members"""
         try:
-            query = "SELECT * FROM Member"
-            members = self.db.execute_query(query)
-            if members:
-                print("\nAll Members:")
-                for member in members:
-                    print(f"ID: {member['member_id']}, Name: {member['first_name']} {member['last_name']}, "
-                          f"Email: {member['email']}, Phone: {member['phone']}, "
-                          f"Address: {member['street']}, {member['city']}, {member['state']} {member['zip_code']}, "
-                          f"Join Date: {member['join_date']}")
-            else:
-                print("No members found.")
+            self.page_through("SELECT * FROM Member", "member_id", self.print_member, "All Members", "No members found.")
         except Exception as e:
             print(f"Error: {e}")
 
@@ -612,22 +863,11 @@ class LibraryManagementSystem:
         """Search for members by full name or email"""
         try:
             search_term = input("Enter search term (full name or email): ").strip()
-            query = """
-            SELECT * FROM Member 
-            WHERE (first_name || ' ' || last_name) LIKE ? OR email LIKE ?
-            """
-            params = ('%' + search_term + '%', '%' + search_term + '%')
-            members = self.db.execute_query(query, params)
-            
-            if members:
-                print("\nSearch Results:")
-                for member in members:
-                    print(f"ID: {member['member_id']}, Name: {member['first_name']} {member['last_name']}, "
-                          f"Email: {member['email']}, Phone: {member['phone']}, "
-                          f"Address: {member['street']}, {member['city']}, {member['state']} {member['zip_code']}, "
-                          f"Join Date: {member['join_date']}")
-            else:
-                print("No members found matching the search term.")
+            self.page_search_results(
+                lambda page: self.search.search_members(search_term, page),
+                self.print_member,
+                "No members found matching the search term."
+            )
         except Exception as e:
             print(f"Error: {e}")
 
@@ -639,14 +879,8 @@ class LibraryManagementSystem:
             email = input("Enter email: ").strip()
             phone = input("Enter phone (optional): ").strip()
             role = input("Enter role (e.g., Librarian, Manager): ").strip()
-            hire_date = datetime.now().strftime('%Y-%m-%d')
-
-            query = """
-            INSERT INTO Staff (first_name, last_name, email, phone, role, hire_date)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """
-            params = (first_name, last_name, email, phone, role, hire_date)
-            result = self.db.execute_update(query, params)
+
+            result = self.attempt(self.service.add_staff, first_name, last_name, email, role, phone)
             if result:
                 print("Staff member added successfully!")
             else:
@@ -664,29 +898,10 @@ class LibraryManagementSystem:
             phone = input("Enter new phone (leave blank to keep current): ").strip()
             role = input("Enter new role (leave blank to keep current): ").strip()
 
-            query = "UPDATE Staff SET "
-            params = []
-
-            if first_name:
-                query += "first_name = ?, "
-                params.append(first_name)
-            if last_name:
-                query += "last_name = ?, "
-                params.append(last_name)
-            if email:
-                query += "email = ?, "
-                params.append(email)
-            if phone:
-                query += "phone = ?, "
-                params.append(phone)
-            if role:
-                query += "role = ? "
-                params.append(role)
-
-            query = query.rstrip(", ") + " WHERE staff_id = ?"
-            params.append(staff_id)
-
-            result = self.db.execute_update(query, tuple(params))
+            result = self.attempt(
+                self.service.update_staff, staff_id, first_name=first_name, last_name=last_name, email=email,
+                phone=phone, role=role
+            )
             if result:
                 print("Staff member updated successfully!")
             else:
@@ -700,8 +915,7 @@ class LibraryManagementSystem:
         """Remove a staff member"""
         try:
             staff_id = int(input("Enter Staff ID to remove: "))
-            query = "DELETE FROM Staff WHERE staff_id = ?"
-            result = self.db.execute_update(query, (staff_id,))
+            result = self.attempt(self.service.remove_staff, staff_id)
             if result:
                 print("Staff member removed successfully!")
             else:
@@ -714,16 +928,7 @@ class LibraryManagementSystem:
     def view_all_staff(self):
         """View all staff members"""
         try:
-            query = "SELECT * FROM Staff"
-            staff_members = self.db.execute_query(query)
-            if staff_members:
-                print("\nAll Staff Members:")
-                for staff in staff_members:
-                    print(f"ID: {staff['staff_id']}, Name: {staff['first_name']} {staff['last_name']}, "
-                          f"Email: {staff['email']}, Phone: {staff['phone']}, Role: {staff['role']}, "
-                          f"Hire Date: {staff['hire_date']}")
-            else:
-                print("No staff members found.")
+            self.page_through("SELECT * FROM Staff", "staff_id", self.print_staff, "All Staff Members", "No staff members found.")
         except Exception as e:
             print(f"Error: {e}")
 
@@ -731,35 +936,114 @@ class LibraryManagementSystem:
         """Search for staff members by full name or email"""
         try:
             search_term = input("Enter search term (full name or email): ").strip()
-            query = """
-            SELECT * FROM Staff 
-            WHERE (first_name || ' ' || last_name) LIKE ? OR email LIKE ?
-            """
-            params = ('%' + search_term + '%', '%' + search_term + '%')
-            staff_members = self.db.execute_query(query, params)
-            
-            if staff_members:
-                print("\nSearch Results:")
-                for staff in staff_members:
-                    print(f"ID: {staff['staff_id']}, Name: {staff['first_name']} {staff['last_name']}, "
-                          f"Email: {staff['email']}, Phone: {staff['phone']}, Role: {staff['role']}, "
-                          f"Hire Date: {staff['hire_date']}")
-            else:
-                print("No staff members found matching the search term.")
+            self.page_search_results(
+                lambda page: self.search.search_staff(search_term, page),
+                self.print_staff,
+                "No staff members found matching the search term."
+            )
         except Exception as e:
             print(f"Error: {e}")
 
+    def attempt(self, operation, *args, **kwargs):
+        """Run a service operation and return its result, or None if it failed"""
+        try:
+            return operation(*args, **kwargs)
+        except NotFoundError:
+            return None
+        except sqlite3.Error as e:
+            print(f"Error executing update: {e}")
+            return None
+
+    def page_search_results(self, fetch_page, print_row, empty_message):
+        """Print ranked search results one page at a time"""
+        page = 1
+        while True:
+            rows = fetch_page(page)
+            if not rows:
+                print(empty_message if page == 1 else "No more results.")
+                return
+            print(f"\nSearch Results (page {page}):")
+            for row in rows:
+                print_row(row)
+            if len(rows) < self.search.page_size:
+                return
+            if input("Enter 'n' for the next page or press Enter to finish: ").strip().lower() != "n":
+                return
+            page += 1
+
+    def page_through(self, select, key, print_row, heading, empty_message, where="", params=()):
+        """Print a listing one keyset page at a time with next/previous navigation"""
+        column = key.split(".")[-1]
+        rows = self.db.keyset_page(select, key, limit=self.page_size, where=where, params=params)
+        if not rows:
+            print(empty_message)
+            return
+        moved = False
+        while True:
+            print(f"\n{heading}:")
+            for row in rows:
+                print_row(row)
+            if len(rows) < self.page_size and not moved:
+                return
+            choice = input("Enter 'n' for the next page, 'p' for the previous page, or press Enter to finish: ").strip().lower()
+            if choice == "n":
+                page = self.db.keyset_page(select, key, after=rows[-1][column], limit=self.page_size,
+                                           where=where, params=params)
+            elif choice == "p":
+                page = self.db.keyset_page(select, key, before=rows[0][column], limit=self.page_size,
+                                           where=where, params=params)
+            else:
+                return
+            if page:
+                rows = page
+                moved = True
+            else:
+                print("No more results.")
+
+    def print_loan(self, loan):
+        """Print a single loan listing row"""
+        print(f"Loan ID: {loan['loan_id']}, Member: {loan['first_name']} {loan['last_name']}, "
+              f"Book: {loan['title']}, Due Date: {loan['due_date']}")
+
+    def print_hold(self, hold):
+        """Print a single hold listing row"""
+        print(f"Hold ID: {hold['hold_id']}, Member: {hold['first_name']} {hold['last_name']} "
+              f"(ID: {hold['member_id']}), Placed: {hold['placed_date']}")
+
+    def print_book(self, book):
+        """Print a single book row"""
+        print(f"ID: {book['book_id']}, Title: {book['title']}, Author: {book['author']}, "
+              f"ISBN: {book['isbn']}, Year: {book['publication_year']}, "
+              f"Genre: {book['genre']}, Total Copies: {book['total_copies']}, "
+              f"Available Copies: {book['available_copies']}")
+
+    def print_member(self, member):
+        """Print a single member row"""
+        print(f"ID: {member['member_id']}, Name: {member['first_name']} {member['last_name']}, "
+              f"Email: {member['email']}, Phone: {member['phone']}, "
+              f"Address: {member['street']}, {member['city']}, {member['state']} {member['zip_code']}, "
+              f"Join Date: {member['join_date']}")
+
+    def print_staff(self, staff):
+        """Print a single staff row"""
+        print(f"ID: {staff['staff_id']}, Name: {staff['first_name']} {staff['last_name']}, "
+              f"Email: {staff['email']}, Phone: {staff['phone']}, Role: {staff['role']}, "
+              f"Hire Date: {staff['hire_date']}")
 
 
 def main():
+    if len(sys.argv) > 1:
+        # Imported here: library_cli itself imports this module.
+        from library_cli import main as cli_main
+        sys.exit(cli_main(sys.argv[1:]))
     system = LibraryManagementSystem()
-    while True:
-        system.display_menu()
-        exit_choice = input("Type 'exit' to quit or press Enter to continue: ").strip().lower()
-        if exit_choice == 'exit':
-            system.db.disconnect()
-            print("Goodbye!")
-            break
+    try:
+        system.dispatcher.run()
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        system.db.disconnect()
+    print("Goodbye!")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,94 @@
+import sqlite3
+import sys
+
+from book_recommendations import RECOMMENDATION_SCHEMA
+from circulation_counters import COUNTER_SCHEMA, REBUILD_COUNTERS
+from circulation_reports import REPORT_SCHEMA
+from hold_queue import HOLD_SCHEMA
+from library_search import FTS_UPDATE_TRIGGERS_V2, SEARCH_SCHEMA
+from loan_archive import ARCHIVE_SCHEMA
+from loan_fines import FINE_SCHEMA
+
+# Secondary indexes for the circulation queries. The partial indexes only
+# hold loans that are still out, so they stay small however long the history.
+# check_query_plans.py fails if any application query stops using them.
+LOAN_INDEXES_V1 = """
+CREATE INDEX IF NOT EXISTS idx_loan_member_status ON Loan(member_id, status);
+CREATE INDEX IF NOT EXISTS idx_loan_member_book_active ON Loan(member_id, book_id) WHERE status = 'Active';
+CREATE INDEX IF NOT EXISTS idx_loan_status_due ON Loan(status, due_date);
+CREATE INDEX IF NOT EXISTS idx_loan_active_due ON Loan(due_date) WHERE status = 'Active';
+CREATE INDEX IF NOT EXISTS idx_loan_book ON Loan(book_id);
+"""
+
+# Lets the active/overdue loan listings page forward and back by loan_id
+# without sorting every active loan for each page.
+LOAN_INDEXES_V2 = """
+CREATE INDEX IF NOT EXISTS idx_loan_status_id ON Loan(status, loan_id);
+"""
+
+# Progress markers for incremental background jobs such as the overdue
+# sweeper. Loans that are out may now be 'Active' or 'Overdue', so the
+# member/book lookup index covers both.
+JOB_STATE_AND_LOAN_INDEXES_V3 = """
+CREATE TABLE IF NOT EXISTS JobState (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_loan_member_book_out ON Loan(member_id, book_id)
+    WHERE status IN ('Active', 'Overdue');
+DROP INDEX IF EXISTS idx_loan_member_book_active;
+"""
+
+# Schema changes applied on top of database_creation.sql, in order. The
+# database's PRAGMA user_version records the last migration that was applied.
+MIGRATIONS = [
+    (1, "Full-text search index for Book, Member and Staff", SEARCH_SCHEMA),
+    (2, "Loan index set v1", LOAN_INDEXES_V1),
+    (3, "Loan index set v2", LOAN_INDEXES_V2),
+    (4, "Job state table and Loan index set v3", JOB_STATE_AND_LOAN_INDEXES_V3),
+    (5, "Materialized circulation counters", COUNTER_SCHEMA + REBUILD_COUNTERS),
+    (6, "Full-text update triggers skip unchanged rows", FTS_UPDATE_TRIGGERS_V2),
+    (7, "Hold queue", HOLD_SCHEMA),
+    (8, "Archived loan totals and returned-loan index", ARCHIVE_SCHEMA),
+    (9, "Daily circulation rollups", REPORT_SCHEMA),
+    (10, "Fines, fine policies and member types", FINE_SCHEMA),
+    (11, "Co-borrowing pair counts and neighbor lists", RECOMMENDATION_SCHEMA),
+]
+
+
+def schema_version(conn):
+    """Return the migration version the database is at"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Apply any pending migrations and return the new schema version"""
+    version = schema_version(conn)
+    for number, description, script in MIGRATIONS:
+        if number <= version:
+            continue
+        print(f"Applying migration {number}: {description}")
+        try:
+            conn.executescript(f"BEGIN;\n{script}\nPRAGMA user_version = {number};\nCOMMIT;")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        version = number
+    return version
+
+
+def main():
+    db_path = sys.argv[1] if len(sys.argv) > 1 else "library_management.db"
+    conn = sqlite3.connect(db_path)
+    try:
+        version = migrate(conn)
+        print(f"Database {db_path} is at schema version {version}.")
+    except sqlite3.Error as e:
+        print(f"Error migrating database: {e}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import re
+
+# External-content FTS5 tables over Book, Member and Staff. The triggers keep
+# them in sync with the base tables; Book's update trigger only fires on the
+# indexed columns so loan traffic on available_copies never touches the index.
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS Book_fts USING fts5(
+    title, author, isbn,
+    content='Book', content_rowid='book_id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS Member_fts USING fts5(
+    first_name, last_name, email,
+    content='Member', content_rowid='member_id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS Staff_fts USING fts5(
+    first_name, last_name, email,
+    content='Staff', content_rowid='staff_id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS Book_fts_ai AFTER INSERT ON Book BEGIN
+    INSERT INTO Book_fts(rowid, title, author, isbn)
+    VALUES (new.book_id, new.title, new.author, new.isbn);
+END;
+CREATE TRIGGER IF NOT EXISTS Book_fts_ad AFTER DELETE ON Book BEGIN
+    INSERT INTO Book_fts(Book_fts, rowid, title, author, isbn)
+    VALUES ('delete', old.book_id, old.title, old.author, old.isbn);
+END;
+CREATE TRIGGER IF NOT EXISTS Book_fts_au AFTER UPDATE OF title, author, isbn ON Book BEGIN
+    INSERT INTO Book_fts(Book_fts, rowid, title, author, isbn)
+    VALUES ('delete', old.book_id, old.title, old.author, old.isbn);
+    INSERT INTO Book_fts(rowid, title, author, isbn)
+    VALUES (new.book_id, new.title, new.author, new.isbn);
+END;
+
+CREATE TRIGGER IF NOT EXISTS Member_fts_ai AFTER INSERT ON Member BEGIN
+    INSERT INTO Member_fts(rowid, first_name, last_name, email)
+    VALUES (new.member_id, new.first_name, new.last_name, new.email);
+END;
+CREATE TRIGGER IF NOT EXISTS Member_fts_ad AFTER DELETE ON Member BEGIN
+    INSERT INTO Member_fts(Member_fts, rowid, first_name, last_name, email)
+    VALUES ('delete', old.member_id, old.first_name, old.last_name, old.email);
+END;
+CREATE TRIGGER IF NOT EXISTS Member_fts_au AFTER UPDATE OF first_name, last_name, email ON Member BEGIN
+    INSERT INTO Member_fts(Member_fts, rowid, first_name, last_name, email)
+    VALUES ('delete', old.member_id, old.first_name, old.last_name, old.email);
+    INSERT INTO Member_fts(rowid, first_name, last_name, email)
+    VALUES (new.member_id, new.first_name, new.last_name, new.email);
+END;
+
+CREATE TRIGGER IF NOT EXISTS Staff_fts_ai AFTER INSERT ON Staff BEGIN
+    INSERT INTO Staff_fts(rowid, first_name, last_name, email)
+    VALUES (new.staff_id, new.first_name, new.last_name, new.email);
+END;
+CREATE TRIGGER IF NOT EXISTS Staff_fts_ad AFTER DELETE ON Staff BEGIN
+    INSERT INTO Staff_fts(Staff_fts, rowid, first_name, last_name, email)
+    VALUES ('delete', old.staff_id, old.first_name, old.last_name, old.email);
+END;
+CREATE TRIGGER IF NOT EXISTS Staff_fts_au AFTER UPDATE OF first_name, last_name, email ON Staff BEGIN
+    INSERT INTO Staff_fts(Staff_fts, rowid, first_name, last_name, email)
+    VALUES ('delete', old.staff_id, old.first_name, old.last_name, old.email);
+    INSERT INTO Staff_fts(rowid, first_name, last_name, email)
+    VALUES (new.staff_id, new.first_name, new.last_name, new.email);
+END;
+
+INSERT INTO Book_fts(Book_fts) VALUES ('rebuild');
+INSERT INTO Member_fts(Member_fts) VALUES ('rebuild');
+INSERT INTO Staff_fts(Staff_fts) VALUES ('rebuild');
+"""
+
+# Replacement update triggers that skip rows whose indexed columns kept their
+# values: the partial updates in statements.py assign every column on each
+# call, which would otherwise re-index the row every time.
+FTS_UPDATE_TRIGGERS_V2 = """
+DROP TRIGGER IF EXISTS Book_fts_au;
+CREATE TRIGGER Book_fts_au AFTER UPDATE OF title, author, isbn ON Book
+WHEN old.title IS NOT new.title OR old.author IS NOT new.author OR old.isbn IS NOT new.isbn
+BEGIN
+    INSERT INTO Book_fts(Book_fts, rowid, title, author, isbn)
+    VALUES ('delete', old.book_id, old.title, old.author, old.isbn);
+    INSERT INTO Book_fts(rowid, title, author, isbn)
+    VALUES (new.book_id, new.title, new.author, new.isbn);
+END;
+
+DROP TRIGGER IF EXISTS Member_fts_au;
+CREATE TRIGGER Member_fts_au AFTER UPDATE OF first_name, last_name, email ON Member
+WHEN old.first_name IS NOT new.first_name OR old.last_name IS NOT new.last_name OR old.email IS NOT new.email
+BEGIN
+    INSERT INTO Member_fts(Member_fts, rowid, first_name, last_name, email)
+    VALUES ('delete', old.member_id, old.first_name, old.last_name, old.email);
+    INSERT INTO Member_fts(rowid, first_name, last_name, email)
+    VALUES (new.member_id, new.first_name, new.last_name, new.email);
+END;
+
+DROP TRIGGER IF EXISTS Staff_fts_au;
+CREATE TRIGGER Staff_fts_au AFTER UPDATE OF first_name, last_name, email ON Staff
+WHEN old.first_name IS NOT new.first_name OR old.last_name IS NOT new.last_name OR old.email IS NOT new.email
+BEGIN
+    INSERT INTO Staff_fts(Staff_fts, rowid, first_name, last_name, email)
+    VALUES ('delete', old.staff_id, old.first_name, old.last_name, old.email);
+    INSERT INTO Staff_fts(rowid, first_name, last_name, email)
+    VALUES (new.staff_id, new.first_name, new.last_name, new.email);
+END;
+"""
+
+# bm25 column weights: a hit in the title outranks one in the author, which
+# outranks a hit in the ISBN; for people, names outrank email addresses.
+SEARCH_TARGETS = {
+    "book": ("Book", "Book_fts", "book_id", "bm25(Book_fts, 10.0, 5.0, 1.0)"),
+    "member": ("Member", "Member_fts", "member_id", "bm25(Member_fts, 5.0, 5.0, 1.0)"),
+    "staff": ("Staff", "Staff_fts", "staff_id", "bm25(Staff_fts, 5.0, 5.0, 1.0)"),
+}
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def build_match_query(search_term):
+    """Turn free text into an FTS5 MATCH expression with prefix matching"""
+    phrases = []
+    for word in search_term.split():
+        tokens = TOKEN_PATTERN.findall(word)
+        if tokens:
+            # Punctuated words such as ISBNs or emails become a phrase whose
+            # last token is a prefix, so "978-0-74" matches "978-0-7432-...".
+            phrases.append('"' + " ".join(tokens) + '"*')
+    return " ".join(phrases)
+
+
+class SearchEngine:
+    def __init__(self, db, page_size=20):
+        self.db = db
+        self.page_size = page_size
+
+    def search(self, target, search_term, page=1, page_size=None):
+        """Return one page of ranked matches for the given target table"""
+        table, fts_table, key, rank = SEARCH_TARGETS[target]
+        page_size = page_size or self.page_size
+        offset = (max(page, 1) - 1) * page_size
+        match = build_match_query(search_term)
+        if not match:
+            query = f"SELECT * FROM {table} ORDER BY {key} LIMIT ? OFFSET ?"
+            return self.db.execute_query(query, (page_size, offset))
+
+        query = f"""
+        SELECT {table}.* FROM {fts_table}
+        JOIN {table} ON {table}.{key} = {fts_table}.rowid
+        WHERE {fts_table} MATCH ?
+        ORDER BY {rank}
+        LIMIT ? OFFSET ?
+        """
+        return self.db.execute_query(query, (match, page_size, offset))
+
+    def matching_ids(self, target, search_term):
+        """Return the ids of every match, read from the full-text index alone"""
+        _, fts_table, _, _ = SEARCH_TARGETS[target]
+        match = build_match_query(search_term)
+        if not match:
+            return []
+        rows = self.db.execute_query(f"SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH ?", (match,))
+        return [row[0] for row in rows or []]
+
+    def search_books(self, search_term, page=1, page_size=None):
+        """Search books by title, author, or ISBN"""
+        return self.search("book", search_term, page, page_size)
+
+    def search_members(self, search_term, page=1, page_size=None):
+        """Search members by name or email"""
+        return self.search("member", search_term, page, page_size)
+
+    def search_staff(self, search_term, page=1, page_size=None):
+        """Search staff members by name or email"""
+        return self.search("staff", search_term, page, page_size)
@@ -0,0 +1,295 @@
+import argparse
+import asyncio
+import json
+import queue
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlsplit
+
+from catalog_summary import CatalogSummary, DeferredRefresh
+from connection_pool import ConnectionPool
+from entity_cache import EntityCache
+from library_cli import COMMANDS, argument_dest
+from library_management import LibraryDatabase
+from library_migrations import migrate
+from library_service import LibraryService, NotFoundError, ServiceError
+from loan_service import LoanError
+from query_metrics import QueryMetrics
+
+MAX_BODY_BYTES = 1 << 20
+
+
+class RequestError(Exception):
+    """Raised when a request cannot be served; carries the HTTP status to answer with"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def error_status(error):
+    """Map an operation's exception to an HTTP status"""
+    if isinstance(error, RequestError):
+        return error.status
+    if isinstance(error, NotFoundError):
+        return HTTPStatus.NOT_FOUND
+    if isinstance(error, (LoanError, sqlite3.IntegrityError)):
+        return HTTPStatus.CONFLICT
+    if isinstance(error, (ServiceError, ValueError)):
+        return HTTPStatus.BAD_REQUEST
+    return HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+def operation_kwargs(command, values):
+    """Convert query-string or JSON values to the keyword arguments of a command"""
+    kwargs = {}
+    for name, kind, *default in COMMANDS[command][2]:
+        dest = argument_dest(name)
+        # A JSON null counts as leaving the argument out.
+        value = values.pop(dest, None)
+        if value is not None:
+            if isinstance(value, (bool, list, dict)):
+                raise RequestError(HTTPStatus.BAD_REQUEST, f"{dest} must be of type {kind.__name__}")
+            try:
+                kwargs[dest] = kind(value)
+            except (TypeError, ValueError):
+                raise RequestError(HTTPStatus.BAD_REQUEST, f"{dest} must be of type {kind.__name__}")
+        elif not default:
+            raise RequestError(HTTPStatus.BAD_REQUEST, f"missing argument: {dest}")
+    if values:
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"unknown argument(s): {', '.join(sorted(values))}")
+    return kwargs
+
+
+class LibraryServer:
+    """HTTP/JSON front end: reads on a pool of reader connections, writes through one writer thread"""
+
+    def __init__(self, db_path, readers=4, max_batch=64, sweep_interval=60.0, metrics=None):
+        self.pool = ConnectionPool(db_path, readers=readers)
+        self.metrics = metrics
+        if metrics is not None:
+            self.pool.enable_metrics(metrics)
+        # Readers get no entity cache: it is invalidated by the writer only,
+        # and a reader must never serve a row older than the last commit.
+        # They share one catalog summary, which the writer refreshes with the
+        # books each batch changed once that batch has committed.
+        self.summary = CatalogSummary()
+        self.reader_services = {id(db): LibraryService(db, summary=self.summary) for db in self.pool.reader_dbs}
+        self.read_executor = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="reader")
+        self.max_batch = max_batch
+        self.sweep_interval = sweep_interval
+        self.writes = queue.Queue()
+        self.writer_thread = threading.Thread(target=self.write_loop, name="writer", daemon=True)
+        self.writer_thread.start()
+
+    # Reads and writes
+
+    def read(self, method, kwargs):
+        with self.pool.reader() as db:
+            return getattr(self.reader_services[id(db)], method)(**kwargs)
+
+    def write_loop(self):
+        """Run queued writes, committing every batch that is waiting as one transaction"""
+        with self.pool.writer() as db:
+            changed_books = DeferredRefresh(self.summary)
+            service = LibraryService(db, cache=EntityCache(db), summary=changed_books)
+            running = True
+            while running:
+                batch = [self.writes.get()]
+                # Draining whatever queued up behind the first write turns a
+                # burst from many desks into one commit instead of one each.
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(self.writes.get_nowait())
+                    except queue.Empty:
+                        break
+                if None in batch:
+                    running = False
+                    batch = [item for item in batch if item is not None]
+                    if not batch:
+                        break
+                outcomes = []
+                try:
+                    with db.transaction(immediate=True):
+                        for method, kwargs, _, _ in batch:
+                            try:
+                                with db.transaction():
+                                    outcomes.append((True, getattr(service, method)(**kwargs)))
+                            except Exception as e:
+                                outcomes.append((False, e))
+                except sqlite3.Error as e:
+                    service.discard_cached()
+                    outcomes = [(False, e)] * len(batch)
+                try:
+                    changed_books.publish(db)
+                except sqlite3.Error:
+                    # Rebuilt from committed data on its next use.
+                    self.summary.clear()
+                # Answers are released only after COMMIT, so an acknowledged
+                # write is durable.
+                for (ok, value), (_, _, future, loop) in zip(outcomes, batch):
+                    loop.call_soon_threadsafe(self.resolve, future, ok, value)
+
+    @staticmethod
+    def resolve(future, ok, value):
+        if future.cancelled():
+            return
+        if ok:
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+
+    def write(self, method, kwargs):
+        """Queue a write and return a future for its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.writes.put((method, kwargs, future, loop))
+        return future
+
+    async def run_operation(self, command, kwargs):
+        method = COMMANDS[command][0]
+        if method in LibraryService.READ_OPERATIONS:
+            if method == "overdue":
+                # Readers are query_only; the writer sweeps on its own schedule.
+                kwargs["sweep"] = False
+            return await asyncio.get_running_loop().run_in_executor(self.read_executor, self.read, method, kwargs)
+        return await self.write(method, kwargs)
+
+    async def sweep_periodically(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            for job in ("sweep_overdue", "expire_holds", "assess_fines", "refresh_reports", "update_recommendations"):
+                try:
+                    await self.write(job, {})
+                except Exception as e:
+                    print(f"{job} failed: {e}", file=sys.stderr)
+
+    # HTTP
+
+    async def dispatch(self, method, target, body):
+        """Serve one request and return the status and payload; a str payload is sent as plain text"""
+        url = urlsplit(target)
+        command = url.path.strip("/")
+        if command == "metrics" and self.metrics is not None:
+            if method != "GET":
+                raise RequestError(HTTPStatus.METHOD_NOT_ALLOWED, "metrics needs GET")
+            return HTTPStatus.OK, self.metrics.prometheus()
+        if command not in COMMANDS:
+            raise RequestError(HTTPStatus.NOT_FOUND, f"unknown operation: {command}")
+        read_only = COMMANDS[command][0] in LibraryService.READ_OPERATIONS
+        if method != "POST" and not (method == "GET" and read_only):
+            raise RequestError(HTTPStatus.METHOD_NOT_ALLOWED, f"{command} needs {'GET or ' if read_only else ''}POST")
+        values = dict(parse_qsl(url.query))
+        if body:
+            try:
+                payload = json.loads(body)
+            except json.JSONDecodeError as e:
+                raise RequestError(HTTPStatus.BAD_REQUEST, f"invalid JSON: {e}")
+            if not isinstance(payload, dict):
+                raise RequestError(HTTPStatus.BAD_REQUEST, "the request body must be a JSON object")
+            values.update(payload)
+        result = await self.run_operation(command, operation_kwargs(command, values))
+        return HTTPStatus.OK, {"ok": True, "result": result}
+
+    async def handle_connection(self, reader, writer):
+        """Serve HTTP/1.1 requests on one connection until the client closes it"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    status, payload = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"ok": False, "error": "body too large"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length)
+                    try:
+                        status, payload = await self.dispatch(method, target, body)
+                    except Exception as e:
+                        status, payload = error_status(e), {"ok": False, "error": str(e)}
+                    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                if isinstance(payload, str):
+                    data, content_type = payload.encode(), "text/plain; version=0.0.4"
+                else:
+                    data, content_type = json.dumps(payload).encode(), "application/json"
+                head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                        f"Content-Type: {content_type}\r\nContent-Length: {len(data)}\r\n")
+                if not keep_alive:
+                    head += "Connection: close\r\n"
+                writer.write(head.encode("latin-1") + b"\r\n" + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8080, ready=None):
+        """Serve until cancelled; ready(host, port) is called once listening"""
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        host, port = server.sockets[0].getsockname()[:2]
+        if ready:
+            ready(host, port)
+        sweeper = asyncio.create_task(self.sweep_periodically()) if self.sweep_interval else None
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if sweeper:
+                sweeper.cancel()
+
+    def close(self):
+        """Finish queued writes and close every connection"""
+        self.writes.put(None)
+        self.writer_thread.join()
+        self.read_executor.shutdown()
+        self.pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the library operations over HTTP/JSON")
+    parser.add_argument("--db", default="library_management.db")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080, help="0 picks a free port")
+    parser.add_argument("--readers", type=int, default=4, help="reader connections (and reader threads)")
+    parser.add_argument("--max-batch", type=int, default=64, help="most writes committed together")
+    parser.add_argument("--sweep-interval", type=float, default=60.0, help="seconds between overdue sweeps; 0 disables")
+    parser.add_argument("--metrics", action="store_true", help="record query statistics and serve them at GET /metrics")
+    parser.add_argument("--slow-ms", type=float, default=100.0, help="log statements slower than this (with --metrics)")
+    parser.add_argument("--slow-log", help="append slow statements and their query plans to this JSON-lines file")
+    args = parser.parse_args()
+
+    db = LibraryDatabase(args.db, profile="wal", verbose=False)
+    if not db.connect():
+        sys.exit(1)
+    try:
+        migrate(db.conn)
+    finally:
+        db.disconnect()
+
+    metrics = QueryMetrics(args.slow_ms, args.slow_log) if args.metrics or args.slow_log else None
+    server = LibraryServer(args.db, args.readers, args.max_batch, args.sweep_interval, metrics)
+    ready = lambda host, port: print(f"Listening on http://{host}:{port}", flush=True)
+    try:
+        asyncio.run(server.serve(args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+from datetime import datetime
+
+from book_recommendations import CoBorrowingIndex
+from circulation_counters import CirculationCounters
+from circulation_reports import CirculationReports
+from library_search import SearchEngine
+from loan_archive import LoanArchiver
+from loan_service import LoanService
+from overdue_sweeper import OverdueSweeper
+from statements import registry
+
+LOAN_LISTING = """
+SELECT LOAN.loan_id, MEMBER.first_name, MEMBER.last_name, BOOK.title, LOAN.due_date
+FROM LOAN
+JOIN MEMBER ON LOAN.member_id = MEMBER.member_id
+JOIN BOOK ON LOAN.book_id = BOOK.book_id
+"""
+
+
+class ServiceError(Exception):
+    """Raised when a library operation is given invalid input"""
+
+
+class NotFoundError(ServiceError):
+    """Raised when an operation names a book, member or staff member that does not exist"""
+
+
+def rows_to_dicts(rows):
+    return [dict(row) for row in rows or []]
+
+
+class LibraryService:
+    """Every library operation as a method that takes plain values and returns JSON-ready data"""
+
+    # Operations that never write, so they may run on a query_only reader
+    # connection. overdue is only read-only with sweep=False.
+    READ_OPERATIONS = frozenset({
+        "overdue", "active_loans", "most_borrowed", "list_books", "list_members", "list_staff",
+        "search_books", "search_members", "search_staff", "get_book", "get_member",
+        "availability", "genre_facets", "decade_facets", "search_facets", "top_circulating", "book_holds",
+        "loans_per_day", "top_titles", "genre_demand", "loan_duration", "member_cohorts",
+        "member_fines", "fine_policies", "also_borrowed",
+    })
+
+    def __init__(self, db, cache=None, summary=None):
+        self.db = db
+        self.cache = cache
+        self.summary = summary
+        self.loans = LoanService(db, cache=cache, summary=summary)
+        self.search = SearchEngine(db)
+        self.sweeper = OverdueSweeper(db)
+        self.counters = CirculationCounters(db)
+        self.archiver = LoanArchiver(db)
+        self.reports = CirculationReports(db)
+        self.recommendations = CoBorrowingIndex(db, archiver=self.archiver)
+
+    def execute(self, name, params=()):
+        """Run a registered statement; sqlite3 errors propagate to the caller"""
+        return registry.execute(self.db, name, params)
+
+    def require_change(self, cursor, table, key_value):
+        if cursor.rowcount == 0:
+            raise NotFoundError(f"{table} {key_value} not found.")
+
+    def invalidate_book(self, book_id):
+        if self.cache is not None:
+            self.cache.invalidate_book(book_id)
+        if self.summary is not None:
+            self.summary.refresh_book(self.db, book_id)
+
+    def invalidate_member(self, member_id):
+        if self.cache is not None:
+            self.cache.invalidate_member(member_id)
+
+    def discard_cached(self):
+        """Drop every cached row and the catalog summary, after a transaction they saw rolled back"""
+        if self.cache is not None:
+            self.cache.books.clear()
+            self.cache.members.clear()
+        if self.summary is not None:
+            self.summary.clear()
+
+    # Circulation
+
+    def borrow(self, member, book):
+        return self.loans.checkout(member, book)
+
+    def renew(self, member, book):
+        return self.loans.renew(member, book)
+
+    def return_book(self, member, book):
+        return self.loans.return_book(member, book)
+
+    def place_hold(self, member, book):
+        return self.loans.place_hold(member, book)
+
+    def cancel_hold(self, member, book):
+        return self.loans.cancel_hold(member, book)
+
+    def expire_holds(self):
+        return {"expired": self.loans.expire_holds()}
+
+    def book_holds(self, book, after=None, limit=20):
+        return rows_to_dicts(self.loans.book_holds(book, after, limit))
+
+    def sweep_overdue(self):
+        return {"marked_overdue": self.sweeper.run()}
+
+    def archive_loans(self, before=None, keep_days=365):
+        return {"archived": self.archiver.run(before, keep_days)}
+
+    # Fines
+
+    def assess_fines(self, force=False):
+        # Loans that went overdue since the last sweep are fined too.
+        self.sweeper.run()
+        return {"assessed": self.loans.fines.assess(self.db, force=force)}
+
+    def member_fines(self, member):
+        fines = rows_to_dicts(self.loans.fines.member_fines(self.db, member))
+        return {"member_id": member, "fines": fines, "total_cents": sum(fine["amount_cents"] for fine in fines)}
+
+    def close_fine(self, loan, status):
+        with self.db.transaction(immediate=True):
+            amount = self.loans.fines.close(self.db, loan, status)
+        if amount is None:
+            raise NotFoundError(f"Loan {loan} has no fine due.")
+        return {"loan_id": loan, "status": status, "amount_cents": amount}
+
+    def pay_fine(self, loan):
+        return self.close_fine(loan, "Paid")
+
+    def waive_fine(self, loan):
+        return self.close_fine(loan, "Waived")
+
+    def fine_policies(self):
+        return rows_to_dicts(self.loans.fines.policies(self.db))
+
+    def set_fine_policy(self, daily_cents, genre="*", member_type="*", grace_days=0, max_cents=None):
+        if daily_cents < 0 or grace_days < 0 or (max_cents is not None and max_cents < 0):
+            raise ServiceError("Fine amounts and grace days cannot be negative.")
+        with self.db.transaction(immediate=True):
+            policy_id = self.loans.fines.set_policy(
+                self.db, daily_cents, genre or "*", member_type or "*", grace_days, max_cents
+            )
+        return {"policy_id": policy_id}
+
+    def refresh_reports(self):
+        return {"loans_added": self.reports.refresh()}
+
+    def loans_per_day(self, start=None, end=None):
+        return rows_to_dicts(self.reports.loans_per_day(start, end))
+
+    def top_titles(self, start=None, end=None, limit=10):
+        return rows_to_dicts(self.reports.top_titles(start, end, limit))
+
+    def genre_demand(self, start=None, end=None):
+        return rows_to_dicts(self.reports.genre_demand(start, end))
+
+    def loan_duration(self, start=None, end=None):
+        return dict(self.reports.loan_duration(start, end))
+
+    def member_cohorts(self, start=None, end=None):
+        return rows_to_dicts(self.reports.member_cohorts(start, end))
+
+    # Recommendations
+
+    def update_recommendations(self):
+        return {"loans_added": self.recommendations.update()}
+
+    def also_borrowed(self, book, limit=5):
+        return {"book_id": book, "books": self.recommendations.recommend(book, limit)}
+
+    def overdue(self, after=None, limit=20, sweep=True):
+        if sweep:
+            self.sweeper.run()
+        return rows_to_dicts(self.db.keyset_page(
+            LOAN_LISTING, "LOAN.loan_id", after=after, limit=limit, where="LOAN.status = 'Overdue'"
+        ))
+
+    def active_loans(self, after=None, limit=20):
+        return rows_to_dicts(self.db.keyset_page(
+            LOAN_LISTING, "LOAN.loan_id", after=after, limit=limit, where="LOAN.status = 'Active'"
+        ))
+
+    def most_borrowed(self, limit=10):
+        return rows_to_dicts(self.counters.most_borrowed(limit))
+
+    # Listings and search
+
+    def list_books(self, after=None, limit=20):
+        return rows_to_dicts(self.db.keyset_page("SELECT * FROM Book", "book_id", after=after, limit=limit))
+
+    def list_members(self, after=None, limit=20):
+        return rows_to_dicts(self.db.keyset_page("SELECT * FROM Member", "member_id", after=after, limit=limit))
+
+    def list_staff(self, after=None, limit=20):
+        return rows_to_dicts(self.db.keyset_page("SELECT * FROM Staff", "staff_id", after=after, limit=limit))
+
+    def search_books(self, term, page=1, page_size=20):
+        return rows_to_dicts(self.search.search_books(term, page, page_size))
+
+    def search_members(self, term, page=1, page_size=20):
+        return rows_to_dicts(self.search.search_members(term, page, page_size))
+
+    def search_staff(self, term, page=1, page_size=20):
+        return rows_to_dicts(self.search.search_staff(term, page, page_size))
+
+    def get_book(self, book):
+        row = self.cache.get_book(book) if self.cache is not None else self.execute("book.by_id", (book,)).fetchone()
+        if row is None:
+            raise NotFoundError(f"Book {book} not found.")
+        return dict(row)
+
+    def get_member(self, member):
+        row = (self.cache.get_member(member) if self.cache is not None
+               else self.execute("member.by_id", (member,)).fetchone())
+        if row is None:
+            raise NotFoundError(f"Member {member} not found.")
+        return dict(row)
+
+    # Catalog summary
+
+    def catalog(self):
+        if self.summary is None:
+            raise ServiceError("No catalog summary is configured.")
+        return self.summary.ensure_loaded(self.db)
+
+    def availability(self, book=None, isbn=None):
+        if book is None and isbn is None:
+            raise ServiceError("Give a book id or an ISBN.")
+        copies = self.catalog().availability(book, isbn)
+        if copies is None:
+            raise NotFoundError(f"Book {book if book is not None else isbn} not found.")
+        return copies
+
+    def genre_facets(self):
+        return self.catalog().genre_facets()
+
+    def decade_facets(self):
+        return self.catalog().decade_facets()
+
+    def search_facets(self, term):
+        return self.catalog().facets_of(self.search.matching_ids("book", term))
+
+    def top_circulating(self, limit=10, genre=None):
+        return self.catalog().top_circulating(limit, genre)
+
+    # Books
+
+    def add_book(self, title, author, isbn, year, genre, copies):
+        if copies <= 0:
+            raise ServiceError("Total copies must be greater than 0.")
+        cursor = self.execute("book.insert", (title, author, isbn, year, genre, copies, copies))
+        self.invalidate_book(cursor.lastrowid)
+        return {"book_id": cursor.lastrowid}
+
+    def update_book(self, book, title=None, author=None, isbn=None, year=None, genre=None, copies=None):
+        params = registry.partial_update_params("Book", book, {
+            "title": title, "author": author, "isbn": isbn,
+            "publication_year": year, "genre": genre, "total_copies": copies,
+        })
+        with self.db.transaction():
+            if params["total_copies"] is not None:
+                row = self.db.execute(
+                    "SELECT total_copies - available_copies FROM Book WHERE book_id = ?", (book,)
+                ).fetchone()
+                if row is not None and params["total_copies"] < row[0]:
+                    raise ServiceError(f"Book {book} has {row[0]} copies on loan; total copies cannot be fewer.")
+            self.require_change(self.execute("book.update", params), "Book", book)
+        self.invalidate_book(book)
+        if params["total_copies"] is not None:
+            # Copies added while patrons are waiting go to their holds.
+            self.loans.fill_holds(book)
+        return {"book_id": book}
+
+    def remove_book(self, book):
+        self.require_change(self.execute("book.delete", (book,)), "Book", book)
+        self.invalidate_book(book)
+        return {"book_id": book}
+
+    # Members
+
+    def register_member(self, first_name, last_name, email, phone="", street="", city="", state="", zip_code="",
+                        member_type="Standard"):
+        cursor = self.execute("member.insert", (
+            first_name, last_name, email, phone, street, city, state, zip_code, datetime.now().strftime('%Y-%m-%d'),
+            member_type or "Standard"
+        ))
+        return {"member_id": cursor.lastrowid}
+
+    def update_member(self, member, first_name=None, last_name=None, email=None, phone=None,
+                      street=None, city=None, state=None, zip_code=None, member_type=None):
+        params = registry.partial_update_params("Member", member, {
+            "first_name": first_name, "last_name": last_name, "email": email, "phone": phone,
+            "street": street, "city": city, "state": state, "zip_code": zip_code, "member_type": member_type,
+        })
+        self.require_change(self.execute("member.update", params), "Member", member)
+        self.invalidate_member(member)
+        return {"member_id": member}
+
+    def remove_member(self, member):
+        self.require_change(self.execute("member.delete", (member,)), "Member", member)
+        self.invalidate_member(member)
+        return {"member_id": member}
+
+    # Staff
+
+    def add_staff(self, first_name, last_name, email, role, phone=""):
+        cursor = self.execute("staff.insert", (
+            first_name, last_name, email, phone, role, datetime.now().strftime('%Y-%m-%d')
+        ))
+        return {"staff_id": cursor.lastrowid}
+
+    def update_staff(self, staff, first_name=None, last_name=None, email=None, phone=None, role=None):
+        params = registry.partial_update_params("Staff", staff, {
+            "first_name": first_name, "last_name": last_name, "email": email, "phone": phone, "role": role,
+        })
+        self.require_change(self.execute("staff.update", params), "Staff", staff)
+        return {"staff_id": staff}
+
+    def remove_staff(self, staff):
+        self.require_change(self.execute("staff.delete", (staff,)), "Staff", staff)
+        return {"staff_id": staff}
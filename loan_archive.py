@@ -0,0 +1,288 @@
+import argparse
+import contextlib
+import sys
+from datetime import datetime, timedelta
+
+# Returned loans with a return date before this mark have been archived.
+ARCHIVED_BEFORE = "loan_archive.archived_before"
+
+# Loans archived per member and per book. The counters in MemberLoanStats and
+# BookCirculation are lifetime totals, so the archiver adds back what the
+# Loan delete trigger takes off, and the consistency check counts these rows
+# together with the live ones.
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ArchivedMemberLoans (
+    member_id INTEGER PRIMARY KEY,
+    total_loans INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS ArchivedBookLoans (
+    book_id INTEGER PRIMARY KEY,
+    total_loans INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_loan_returned_date ON Loan(return_date) WHERE status = 'Returned';
+"""
+
+# Row counts for stats, read end to end once per archive run.
+ROW_COUNT = "SELECT COUNT(*) FROM {table}"
+
+HISTORY_COLUMNS = "loan_id, member_id, book_id, loan_date, due_date, return_date, status"
+
+PARTITION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {schema}.{table} (
+    loan_id INTEGER PRIMARY KEY,
+    member_id INTEGER NOT NULL,
+    book_id INTEGER NOT NULL,
+    loan_date DATE NOT NULL,
+    due_date DATE NOT NULL,
+    return_date DATE,
+    status TEXT NOT NULL,
+    archived_date DATE NOT NULL
+);
+CREATE INDEX IF NOT EXISTS {schema}.idx_{table}_member ON {table}(member_id);
+CREATE INDEX IF NOT EXISTS {schema}.idx_{table}_book ON {table}(book_id);
+"""
+
+# Oldest returns first, up to a loan id (see LoanArchiver.archivable_through).
+# Left to itself the planner prefers the equality on idx_loan_status_id,
+# which reads every returned loan and sorts them.
+SELECT_BATCH = """
+INSERT INTO temp.archive_batch (loan_id, member_id, book_id, year)
+SELECT loan_id, member_id, book_id, strftime('%Y', loan_date) FROM Loan INDEXED BY idx_loan_returned_date
+WHERE status = 'Returned' AND return_date < ? AND loan_id <= ?
+ORDER BY return_date
+LIMIT ?
+"""
+
+# INSERT OR IGNORE: a batch copied before a crash is copied again harmlessly.
+COPY_BATCH = """
+INSERT OR IGNORE INTO {schema}.{table}
+    (loan_id, member_id, book_id, loan_date, due_date, return_date, status, archived_date)
+SELECT Loan.loan_id, Loan.member_id, Loan.book_id, Loan.loan_date, Loan.due_date, Loan.return_date, Loan.status, ?1
+FROM temp.archive_batch AS batch
+JOIN Loan ON Loan.loan_id = batch.loan_id
+WHERE ?2 IS NULL OR batch.year = ?2
+"""
+
+# The delete trigger took one loan off each counter's total; put it back.
+RESTORE_TOTALS = """
+INSERT INTO ArchivedMemberLoans (member_id, total_loans)
+SELECT member_id, COUNT(*) FROM temp.archive_batch WHERE true GROUP BY member_id
+ON CONFLICT(member_id) DO UPDATE SET total_loans = total_loans + excluded.total_loans;
+INSERT INTO ArchivedBookLoans (book_id, total_loans)
+SELECT book_id, COUNT(*) FROM temp.archive_batch WHERE true GROUP BY book_id
+ON CONFLICT(book_id) DO UPDATE SET total_loans = total_loans + excluded.total_loans;
+UPDATE MemberLoanStats SET total_loans = total_loans + batch.loans
+FROM (SELECT member_id, COUNT(*) AS loans FROM temp.archive_batch GROUP BY member_id) AS batch
+WHERE MemberLoanStats.member_id = batch.member_id;
+UPDATE BookCirculation SET total_loans = total_loans + batch.loans
+FROM (SELECT book_id, COUNT(*) AS loans FROM temp.archive_batch GROUP BY book_id) AS batch
+WHERE BookCirculation.book_id = batch.book_id
+"""
+
+
+class LoanArchiver:
+    """Move returned loans older than a cutoff out of Loan into history tables, a batch at a time
+
+    History goes to an attached archive database when archive_path is given,
+    otherwise to the main database; partition_by_year puts each loan year in
+    its own LoanHistory_<year> table instead of a single LoanHistory.
+    """
+
+    def __init__(self, db, archive_path=None, partition_by_year=False, batch_size=1000):
+        self.db = db
+        self.archive_path = archive_path
+        self.schema = "archive" if archive_path else "main"
+        self.partition_by_year = partition_by_year
+        self.batch_size = batch_size
+        self.partitions = set()
+
+    def attach(self):
+        """Attach the archive database, if any, and create the unioned history view
+
+        ATTACH cannot run inside a transaction; without an archive database
+        the archiver also runs inside one, such as a CLI batch group.
+        """
+        if self.archive_path and not self.db.conn.execute(
+            "SELECT 1 FROM pragma_database_list WHERE name = 'archive'"
+        ).fetchone():
+            self.db.conn.execute("ATTACH DATABASE ? AS archive", (self.archive_path,))
+        self.db.conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS archive_batch "
+            "(loan_id INTEGER PRIMARY KEY, member_id INTEGER, book_id INTEGER, year TEXT)"
+        )
+        self.create_history_view()
+
+    def partition_names(self):
+        rows = self.db.conn.execute(
+            f"SELECT name FROM {self.schema}.sqlite_master WHERE type = 'table' AND name GLOB 'LoanHistory*' "
+            f"ORDER BY name"
+        )
+        return [row[0] for row in rows]
+
+    def create_history_view(self):
+        """(Re)create LoanHistoryView: live loans and every history table as one relation
+
+        It is a TEMP view because only temporary views may read from an
+        attached database; every connection that reports on history creates it.
+        """
+        selects = [f"SELECT {HISTORY_COLUMNS}, 0 AS archived FROM main.Loan"]
+        selects += [f"SELECT {HISTORY_COLUMNS}, 1 AS archived FROM {self.schema}.{name}"
+                    for name in self.partition_names()]
+        self.db.conn.execute("DROP VIEW IF EXISTS temp.LoanHistoryView")
+        self.db.conn.execute("CREATE TEMP VIEW LoanHistoryView AS " + " UNION ALL ".join(selects))
+
+    def newest_loan_id(self):
+        """Return the largest loan id in Loan and every history table, or 0"""
+        # One read from the end of each table's rowid b-tree; MAX over the
+        # unioned view would read every row.
+        tables = ["main.Loan"] + [f"{self.schema}.{name}" for name in self.partition_names()]
+        return max(self.db.execute(f"SELECT MAX(loan_id) FROM {table}").fetchone()[0] or 0 for table in tables)
+
+    def partition(self, year):
+        """Return the history table for a loan year, creating it on first use"""
+        table = f"LoanHistory_{year}" if self.partition_by_year else "LoanHistory"
+        if table not in self.partitions:
+            # Statement by statement: executescript would commit a transaction
+            # the caller has open.
+            for statement in PARTITION_SCHEMA.format(schema=self.schema, table=table).split(";"):
+                if statement.strip():
+                    self.db.execute(statement)
+            self.partitions.add(table)
+        return table
+
+    def run(self, before=None, keep_days=365):
+        """Archive every loan returned before a date (default: keep_days ago) and return how many moved"""
+        # Imported here: circulation_reports itself imports this module.
+        from circulation_reports import RETURNS_FROM
+
+        before = before or (datetime.now() - timedelta(days=keep_days)).strftime('%Y-%m-%d')
+        # The rollups count returns once, from Loan; later refreshes only
+        # recount the days from their mark on.
+        reported = self.db.job_state(RETURNS_FROM)
+        if reported is not None and before > reported:
+            raise ValueError(
+                f"Returns from {reported} on are not in the circulation reports yet; "
+                f"refresh them before archiving loans returned before {before}."
+            )
+        self.attach()
+        through = self.archivable_through()
+        archived = 0
+        while True:
+            moved = self.archive_batch(before, through)
+            archived += moved
+            if moved < self.batch_size:
+                break
+        # Recorded last so an interrupted run is simply run again.
+        if before > self.db.job_state(ARCHIVED_BEFORE, ""):
+            self.db.set_job_state(ARCHIVED_BEFORE, before)
+        return archived
+
+    def archivable_through(self):
+        """Return the highest loan id that may leave Loan
+
+        Loan ids are plain rowids, which SQLite hands out as one more than
+        the largest in the table: archiving the newest loan would give its
+        id, already in history and in Fine, to the next loan. Loans the
+        incremental jobs that read Loan by id have not read yet stay too.
+        """
+        # Imported here: both modules import this one.
+        from book_recommendations import LAST_LOAN_ID as RECOMMENDED_THROUGH
+        from circulation_reports import LAST_LOAN_ID as REPORTED_THROUGH
+
+        newest = self.db.execute("SELECT MAX(loan_id) FROM Loan").fetchone()[0] or 0
+        limits = [newest - 1]
+        for mark in (REPORTED_THROUGH, RECOMMENDED_THROUGH):
+            value = self.db.job_state(mark)
+            if value is not None:
+                limits.append(int(value))
+        return min(limits)
+
+    def archive_batch(self, before, through):
+        """Copy one batch of loans with ids up to through into history, then delete it from Loan; return the batch size"""
+        archived_date = datetime.now().strftime('%Y-%m-%d')
+        # Within one file the copy and the delete commit together. Commits
+        # across an attached WAL database are atomic per file only, so the
+        # copy is committed first: a crash in between leaves rows in both
+        # places, and the rerun's INSERT OR IGNORE skips what was copied.
+        together = self.db.transaction(immediate=True) if self.schema == "main" else contextlib.nullcontext()
+        with together:
+            with self.db.transaction(immediate=True):
+                self.db.execute("DELETE FROM temp.archive_batch")
+                self.db.execute(SELECT_BATCH, (before, through, self.batch_size))
+                years = [row[0] for row in self.db.execute(
+                    "SELECT DISTINCT year FROM temp.archive_batch"
+                )] if self.partition_by_year else [None]
+                created = len(self.partitions)
+                for year in years:
+                    self.db.execute(
+                        COPY_BATCH.format(schema=self.schema, table=self.partition(year)), (archived_date, year)
+                    )
+                moved = self.db.execute("SELECT COUNT(*) FROM temp.archive_batch").fetchone()[0]
+            with self.db.transaction(immediate=True):
+                self.db.execute("DELETE FROM Loan WHERE loan_id IN (SELECT loan_id FROM temp.archive_batch)")
+                for statement in RESTORE_TOTALS.split(";"):
+                    self.db.execute(statement)
+            if len(self.partitions) > created:
+                self.create_history_view()
+        return moved
+
+    def member_history(self, member_id, limit=50):
+        """Return a member's loans, live and archived, newest first"""
+        return self.db.execute(
+            "SELECT * FROM LoanHistoryView WHERE member_id = ? ORDER BY loan_date DESC, loan_id DESC LIMIT ?",
+            (member_id, limit)
+        ).fetchall()
+
+    def stats(self):
+        """Return the live loan count and the row count of every history table"""
+        counts = {"Loan": self.db.execute(ROW_COUNT.format(table="Loan")).fetchone()[0]}
+        for name in self.partition_names():
+            table = f"{self.schema}.{name}"
+            counts[table] = self.db.execute(ROW_COUNT.format(table=table)).fetchone()[0]
+        return counts
+
+
+def main():
+    # Imported here: library_management itself imports this module.
+    from library_management import LibraryDatabase
+    from library_migrations import migrate
+
+    parser = argparse.ArgumentParser(description="Move old returned loans out of Loan into history tables")
+    parser.add_argument("--db", default="library_management.db")
+    parser.add_argument("--archive", help="attached archive database file (default: history stays in --db)")
+    parser.add_argument("--by-year", action="store_true", help="one LoanHistory_<year> table per loan year")
+    parser.add_argument("--before", help="archive loans returned before this date (default: --keep-days ago)")
+    parser.add_argument("--keep-days", type=int, default=365)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--member", type=int, help="print a member's full loan history instead of archiving")
+    args = parser.parse_args()
+
+    db = LibraryDatabase(args.db, profile="wal", verbose=False)
+    if not db.connect():
+        sys.exit(1)
+    try:
+        migrate(db.conn)
+        archiver = LoanArchiver(db, args.archive, args.by_year, args.batch_size)
+        if args.member is not None:
+            archiver.attach()
+            for row in archiver.member_history(args.member):
+                print(f"Loan ID: {row['loan_id']}, Book ID: {row['book_id']}, Loaned: {row['loan_date']}, "
+                      f"Returned: {row['return_date']}, Status: {row['status']}"
+                      f"{' (archived)' if row['archived'] else ''}")
+            return
+        try:
+            archived = archiver.run(args.before, args.keep_days)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        print(f"Archived {archived} loans.")
+        for table, count in archiver.stats().items():
+            print(f"{table}: {count} rows")
+    finally:
+        db.disconnect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import argparse
+import sys
+from datetime import datetime
+
+# Overdue loans have been assessed up to and including this day.
+ASSESSED_ON = "loan_fines.assessed_on"
+
+# A fine is 'Accruing' while its loan is out and grows with each nightly
+# assessment; returning the book fixes the amount and makes it 'Due' until
+# it is 'Paid' or 'Waived'. One fine per loan, kept after the loan itself is
+# archived, so loan_id is not a foreign key.
+#
+# A policy applies to one genre and member type, or to any ('*'); the most
+# specific policy that matches a loan wins, a genre match before a member
+# type match. Amounts are in cents, capped at max_cents when it is set.
+FINE_SCHEMA = """
+ALTER TABLE Member ADD COLUMN member_type TEXT NOT NULL DEFAULT 'Standard';
+
+CREATE TABLE IF NOT EXISTS FinePolicy (
+    policy_id INTEGER PRIMARY KEY,
+    genre TEXT NOT NULL DEFAULT '*',
+    member_type TEXT NOT NULL DEFAULT '*',
+    daily_cents INTEGER NOT NULL CHECK (daily_cents >= 0),
+    grace_days INTEGER NOT NULL DEFAULT 0 CHECK (grace_days >= 0),
+    max_cents INTEGER CHECK (max_cents >= 0),
+    UNIQUE (genre, member_type)
+);
+
+INSERT OR IGNORE INTO FinePolicy (genre, member_type, daily_cents, grace_days, max_cents)
+VALUES ('*', '*', 25, 0, 1000);
+
+CREATE TABLE IF NOT EXISTS Fine (
+    loan_id INTEGER PRIMARY KEY,
+    member_id INTEGER NOT NULL,
+    book_id INTEGER NOT NULL,
+    policy_id INTEGER,
+    days_overdue INTEGER NOT NULL,
+    amount_cents INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'Accruing' CHECK (status IN ('Accruing', 'Due', 'Paid', 'Waived')),
+    assessed_date DATE NOT NULL,
+    settled_date DATE
+);
+
+CREATE INDEX IF NOT EXISTS idx_fine_member_open ON Fine(member_id) WHERE status IN ('Accruing', 'Due');
+"""
+
+# Computes the fine of every loan matched by {loans} as of :today in one
+# statement, and writes it unless the fine was already settled.
+ASSESS = """
+INSERT INTO Fine (loan_id, member_id, book_id, policy_id, days_overdue, amount_cents, assessed_date)
+SELECT late.loan_id, late.member_id, late.book_id, p.policy_id, late.days,
+       CASE WHEN p.max_cents IS NULL THEN (late.days - p.grace_days) * p.daily_cents
+            ELSE MIN(p.max_cents, (late.days - p.grace_days) * p.daily_cents) END,
+       :today
+FROM (
+    SELECT Loan.loan_id, Loan.member_id, Loan.book_id,
+           CAST(julianday(:today) - julianday(Loan.due_date) AS INTEGER) AS days,
+           (SELECT p.policy_id FROM FinePolicy AS p
+            WHERE p.genre IN ('*', Book.genre) AND p.member_type IN ('*', Member.member_type)
+            ORDER BY (p.genre != '*') + (p.member_type != '*') DESC, p.genre != '*' DESC
+            LIMIT 1) AS policy_id
+    FROM Loan
+    LEFT JOIN Book ON Book.book_id = Loan.book_id
+    LEFT JOIN Member ON Member.member_id = Loan.member_id
+    WHERE {loans}
+) AS late
+JOIN FinePolicy AS p ON p.policy_id = late.policy_id
+WHERE late.days > p.grace_days
+ON CONFLICT(loan_id) DO UPDATE SET
+    policy_id = excluded.policy_id, days_overdue = excluded.days_overdue,
+    amount_cents = excluded.amount_cents, assessed_date = excluded.assessed_date
+WHERE Fine.status = 'Accruing'
+"""
+
+ASSESS_BATCH = ASSESS.format(loans="Loan.status = 'Overdue' AND Loan.loan_id > :after AND Loan.loan_id <= :through")
+ASSESS_LOAN = ASSESS.format(loans="Loan.loan_id = :loan_id")
+
+# The last loan id of the next batch of overdue loans, in idx_loan_status_id order.
+BATCH_END = """
+SELECT loan_id FROM Loan WHERE status = 'Overdue' AND loan_id > ? ORDER BY loan_id LIMIT 1 OFFSET ?
+"""
+
+FINE_POLICIES = """
+SELECT policy_id, genre, member_type, daily_cents, grace_days, max_cents FROM FinePolicy ORDER BY genre, member_type
+"""
+
+FINE_LISTING = """
+SELECT Fine.loan_id, Fine.book_id, Book.title, Fine.days_overdue, Fine.amount_cents, Fine.status,
+       Fine.assessed_date
+FROM Fine
+LEFT JOIN Book ON Book.book_id = Fine.book_id
+"""
+
+
+def dollars(cents):
+    return f"${cents / 100:.2f}"
+
+
+class FineEngine:
+    """Fine policies, the nightly set-based assessment of overdue loans, and settling fines on return"""
+
+    def __init__(self, batch_size=5000):
+        self.batch_size = batch_size
+
+    def assess(self, db, today=None, force=False):
+        """Bring every overdue loan's fine up to today in batches; return how many fines were written
+
+        Each batch is one INSERT ... SELECT over a range of overdue loan ids,
+        so the work is a few statements however many loans are late. A second
+        run on the same day does nothing unless forced.
+        """
+        today = today or datetime.now().strftime('%Y-%m-%d')
+        if not force and db.job_state(ASSESSED_ON, "") >= today:
+            return 0
+        assessed = 0
+        after = 0
+        while True:
+            with db.transaction(immediate=True):
+                end = db.execute(BATCH_END, (after, self.batch_size - 1)).fetchone()
+                through = end[0] if end is not None else db.execute(
+                    "SELECT MAX(loan_id) FROM Loan WHERE status = 'Overdue'"
+                ).fetchone()[0]
+                if through is None or through <= after:
+                    break
+                assessed += db.execute(ASSESS_BATCH, {"today": today, "after": after, "through": through}).rowcount
+            after = through
+            if end is None:
+                break
+        db.set_job_state(ASSESSED_ON, today)
+        return assessed
+
+    def settle(self, db, loan_id, return_date):
+        """Fix the fine of a loan being returned at its final amount and make it due; return the amount in cents"""
+        db.execute(ASSESS_LOAN, {"today": return_date, "loan_id": loan_id})
+        fine = db.execute(
+            "UPDATE Fine SET status = 'Due' WHERE loan_id = ? AND status = 'Accruing' RETURNING amount_cents",
+            (loan_id,)
+        ).fetchone()
+        return fine[0] if fine is not None else 0
+
+    def close(self, db, loan_id, status, today=None):
+        """Mark a due fine 'Paid' or 'Waived'; return its amount, or None if the loan has no fine due"""
+        fine = db.execute(
+            "UPDATE Fine SET status = ?, settled_date = ? WHERE loan_id = ? AND status = 'Due' RETURNING amount_cents",
+            (status, today or datetime.now().strftime('%Y-%m-%d'), loan_id)
+        ).fetchone()
+        return None if fine is None else fine[0]
+
+    def member_fines(self, db, member_id):
+        """Return a member's open fines, accruing and due"""
+        return db.execute(
+            FINE_LISTING + "WHERE Fine.member_id = ? AND Fine.status IN ('Accruing', 'Due') ORDER BY Fine.loan_id",
+            (member_id,)
+        ).fetchall()
+
+    def set_policy(self, db, daily_cents, genre="*", member_type="*", grace_days=0, max_cents=None):
+        """Add or replace the policy for a genre and member type; return its id"""
+        return db.execute(
+            "INSERT INTO FinePolicy (genre, member_type, daily_cents, grace_days, max_cents) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(genre, member_type) DO UPDATE SET daily_cents = excluded.daily_cents, "
+            "grace_days = excluded.grace_days, max_cents = excluded.max_cents RETURNING policy_id",
+            (genre, member_type, daily_cents, grace_days, max_cents)
+        ).fetchone()[0]
+
+    def policies(self, db):
+        return db.execute(FINE_POLICIES).fetchall()
+
+
+def main():
+    # Imported here: library_management itself imports this module.
+    from library_management import LibraryDatabase
+    from library_migrations import migrate
+    from overdue_sweeper import OverdueSweeper
+
+    parser = argparse.ArgumentParser(description="Assess fines on every overdue loan")
+    parser.add_argument("--db", default="library_management.db")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--today", help="assess as of this date (default: today)")
+    parser.add_argument("--force", action="store_true", help="assess again even if already done today")
+    args = parser.parse_args()
+
+    db = LibraryDatabase(args.db, profile="wal", verbose=False)
+    if not db.connect():
+        sys.exit(1)
+    try:
+        migrate(db.conn)
+        # Loans that went overdue since the last sweep are fined too.
+        OverdueSweeper(db).run(args.today)
+        assessed = FineEngine(args.batch_size).assess(db, args.today, args.force)
+        print(f"Assessed {assessed} fines.")
+    finally:
+        db.disconnect()
+
+
+if __name__ == "__main__":
+    main()
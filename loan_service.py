@@ -0,0 +1,201 @@
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from hold_queue import HOLD_LISTING, HoldQueue
+from loan_fines import FineEngine
+
+LOAN_PERIOD_DAYS = 14
+MAX_ACTIVE_LOANS = 5
+
+
+class LoanError(Exception):
+    """Raised when a checkout, renewal or return cannot be completed"""
+
+
+class LoanService:
+    """Borrow, renew and return books, each in a single write transaction"""
+
+    def __init__(self, db, loan_period_days=LOAN_PERIOD_DAYS, max_active_loans=MAX_ACTIVE_LOANS, cache=None,
+                 summary=None, holds=None, fines=None):
+        self.db = db
+        self.cache = cache
+        self.summary = summary
+        self.holds = holds if holds is not None else HoldQueue()
+        self.fines = fines if fines is not None else FineEngine()
+        self.loan_period_days = loan_period_days
+        self.max_active_loans = max_active_loans
+
+    @contextmanager
+    def transaction(self):
+        """Run the enclosed statements in one BEGIN IMMEDIATE transaction"""
+        # IMMEDIATE takes the write lock up front, so two desks can never both
+        # read "1 copy left" and then race each other to the decrement. Inside
+        # a caller's scope this becomes a savepoint of that transaction.
+        with self.db.transaction(immediate=True):
+            yield self.db
+
+    def member(self, member_id):
+        """Return a member row, through the entity cache when there is one"""
+        if self.cache is not None:
+            return self.cache.get_member(member_id)
+        rows = self.db.execute_query("SELECT * FROM Member WHERE member_id = ?", (member_id,))
+        return rows[0] if rows else None
+
+    def book_changed(self, book_id):
+        """Drop a book whose available_copies just changed from the entity cache and refresh its summary entry"""
+        if self.cache is not None:
+            self.cache.invalidate_book(book_id)
+        if self.summary is not None:
+            self.summary.refresh_book(self.db, book_id)
+
+    def due_date(self, start=None):
+        """Return the due date for a loan or renewal starting today"""
+        start = start or datetime.now()
+        return (start + timedelta(days=self.loan_period_days)).strftime('%Y-%m-%d')
+
+    def checkout(self, member_id, book_id):
+        """Lend a copy of a book to a member and return the loan details"""
+        loan_date = datetime.now().strftime('%Y-%m-%d')
+        due_date = self.due_date()
+        with self.transaction() as db:
+            member = self.member(member_id)
+            if member is None:
+                raise LoanError("Member not found!")
+
+            # Trigger-maintained counter: one row, however long the member's history.
+            loan_count = db.execute(
+                "SELECT active_loans + overdue_loans FROM MemberLoanStats WHERE member_id = ?",
+                (member_id,)
+            ).fetchone()
+            if loan_count is not None and loan_count[0] >= self.max_active_loans:
+                raise LoanError(f"Member has reached the maximum loan limit ({self.max_active_loans} books)!")
+
+            # A copy set aside for the member's hold was never put back on the
+            # shelf; a hold of theirs still waiting is closed by this loan.
+            # Otherwise, a conditional decrement: the availability check
+            # and the update are the same statement, so the last copy can only
+            # be lent once.
+            if not self.holds.claim(db, member_id, book_id):
+                updated = db.execute(
+                    "UPDATE Book SET available_copies = available_copies - 1 "
+                    "WHERE book_id = ? AND available_copies > 0",
+                    (book_id,)
+                ).rowcount
+                if updated == 0:
+                    raise LoanError("Book not found or no copies available! A hold can be placed on it.")
+
+            cursor = db.execute(
+                "INSERT INTO Loan (member_id, book_id, loan_date, due_date, status) "
+                "VALUES (?, ?, ?, ?, 'Active')",
+                (member_id, book_id, loan_date, due_date)
+            )
+            title = db.execute("SELECT title FROM Book WHERE book_id = ?", (book_id,)).fetchone()[0]
+        self.book_changed(book_id)
+
+        return {
+            "loan_id": cursor.lastrowid,
+            "member_id": member_id,
+            "book_id": book_id,
+            "member_name": f"{member['first_name']} {member['last_name']}",
+            "title": title,
+            "loan_date": loan_date,
+            "due_date": due_date,
+        }
+
+    def renew(self, member_id, book_id):
+        """Extend a member's active loan of a book and return the new due date"""
+        due_date = self.due_date()
+        with self.transaction() as db:
+            loan = db.execute(
+                "SELECT loan_id FROM Loan WHERE member_id = ? AND book_id = ? AND status IN ('Active', 'Overdue') "
+                "ORDER BY loan_id LIMIT 1",
+                (member_id, book_id)
+            ).fetchone()
+            if loan is None:
+                raise LoanError("No active loan found for this book and member!")
+            # A renewed loan is no longer late, whatever the sweeper marked it.
+            db.execute("UPDATE Loan SET due_date = ?, status = 'Active' WHERE loan_id = ?", (due_date, loan[0]))
+
+        return {"loan_id": loan[0], "member_id": member_id, "book_id": book_id, "due_date": due_date}
+
+    def return_book(self, member_id, book_id):
+        """Close a member's active loan of a book and put the copy back on the shelf"""
+        return_date = datetime.now().strftime('%Y-%m-%d')
+        with self.transaction() as db:
+            loan = db.execute(
+                "SELECT loan_id FROM Loan WHERE member_id = ? AND book_id = ? AND status IN ('Active', 'Overdue') "
+                "ORDER BY loan_id LIMIT 1",
+                (member_id, book_id)
+            ).fetchone()
+            if loan is None:
+                raise LoanError("No active loan found for this book and member!")
+            db.execute(
+                "UPDATE Loan SET status = 'Returned', return_date = ? WHERE loan_id = ?",
+                (return_date, loan[0])
+            )
+            # Settled with the return: the loan and its final fine commit
+            # together or not at all.
+            fine_cents = self.fines.settle(db, loan[0], return_date)
+            # The copy goes to the next hold in the same transaction, so no
+            # one else can borrow it in between.
+            hold = self.holds.release(db, book_id)
+        self.book_changed(book_id)
+
+        return {
+            "loan_id": loan[0], "member_id": member_id, "book_id": book_id, "return_date": return_date,
+            "fine_cents": fine_cents, "held_for": None if hold is None else {"hold_id": hold[0], "member_id": hold[1]},
+        }
+
+    def place_hold(self, member_id, book_id):
+        """Queue a member for the next copy of a book that has none on the shelf"""
+        with self.transaction() as db:
+            if self.member(member_id) is None:
+                raise LoanError("Member not found!")
+            book = db.execute("SELECT available_copies FROM Book WHERE book_id = ?", (book_id,)).fetchone()
+            if book is None:
+                raise LoanError("Book not found!")
+            if book[0] > 0:
+                raise LoanError("Copies are available; borrow the book instead.")
+            try:
+                hold_id = self.holds.place(db, member_id, book_id)
+            except sqlite3.IntegrityError:
+                raise LoanError("Member already has a hold on this book!")
+            position = db.execute(
+                "SELECT COUNT(*) FROM Hold WHERE book_id = ? AND status = 'Waiting' AND hold_id <= ?",
+                (book_id, hold_id)
+            ).fetchone()[0]
+        return {"hold_id": hold_id, "member_id": member_id, "book_id": book_id, "position": position}
+
+    def cancel_hold(self, member_id, book_id):
+        """Cancel a member's hold on a book; a copy already set aside for it goes to the next hold"""
+        with self.transaction() as db:
+            status = self.holds.cancel(db, member_id, book_id)
+            if status is None:
+                raise LoanError("No open hold found for this book and member!")
+        if status == 'Ready':
+            self.book_changed(book_id)
+        return {"member_id": member_id, "book_id": book_id, "was": status}
+
+    def expire_holds(self):
+        """Expire holds whose copy was not picked up in time, passing each copy on"""
+        with self.transaction() as db:
+            books = self.holds.expire(db)
+        for book_id in set(books):
+            self.book_changed(book_id)
+        return len(books)
+
+    def fill_holds(self, book_id):
+        """Set aside copies on the shelf for waiting holds, after a book gained copies"""
+        with self.transaction() as db:
+            served = self.holds.fill(db, book_id)
+        if served:
+            self.book_changed(book_id)
+        return served
+
+    def book_holds(self, book_id, after=None, limit=20):
+        """Return one page of a book's waiting holds, in queue order"""
+        return self.db.keyset_page(
+            HOLD_LISTING, "Hold.hold_id", after=after, limit=limit,
+            where="Hold.book_id = ? AND Hold.status = 'Waiting'", params=(book_id,)
+        )
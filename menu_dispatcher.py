@@ -0,0 +1,86 @@
+import time
+from collections import deque
+from datetime import datetime
+
+HISTORY_CHOICE = "h"
+
+
+class MenuDispatcher:
+    """Iterative, table-driven menu loop with a bounded command history
+
+    menus maps a menu name to (title, entries). An entry is (choice, label,
+    handler): the handler names a method of target, names a submenu as
+    "menu:<name>", or is None to go back (and, from the root menu, to exit).
+    guards maps a submenu to a method of target that must return True before
+    the submenu is entered.
+
+    Navigation is a list of menu names, not nested calls, so a session of any
+    length runs at a constant stack depth; the history keeps only the last
+    history_size commands.
+    """
+
+    def __init__(self, target, menus, guards=None, root="main", history_size=200):
+        self.target = target
+        self.menus = {name: (title, entries, {entry[0]: entry for entry in entries})
+                      for name, (title, entries) in menus.items()}
+        self.guards = guards or {}
+        self.root = root
+        self.history = deque(maxlen=history_size)
+        self.commands_run = 0
+
+    def show(self, name):
+        title, entries, _ = self.menus[name]
+        print(f"\n{title}")
+        for choice, label, _ in entries:
+            if choice != "0":
+                print(f"{choice}. {label}")
+        print(f"{HISTORY_CHOICE}. Command History")
+        print(f"0. {self.menus[name][2]['0'][1]}")
+
+    def run(self):
+        """Show menus and run the chosen commands until the root menu is exited"""
+        path = [self.root]
+        while path:
+            self.show(path[-1])
+            choice = input("Enter your choice: ").strip().lower()
+            if choice == HISTORY_CHOICE:
+                self.show_history()
+                continue
+            entry = self.menus[path[-1]][2].get(choice)
+            if entry is None:
+                print("Invalid choice.")
+            elif entry[2] is None:
+                path.pop()
+                if not path:
+                    print("Exiting...")
+            elif entry[2].startswith("menu:"):
+                submenu = entry[2][len("menu:"):]
+                guard = self.guards.get(submenu)
+                if guard is None or getattr(self.target, guard)():
+                    path.append(submenu)
+            else:
+                self.dispatch(path[-1], entry)
+
+    def dispatch(self, menu, entry):
+        """Run one command and record it in the history"""
+        started = datetime.now()
+        start = time.perf_counter()
+        ok = True
+        try:
+            getattr(self.target, entry[2])()
+        except Exception as e:
+            # Handlers report their own errors; anything that escapes one
+            # must not end the session.
+            ok = False
+            print(f"Error: {e}")
+        self.commands_run += 1
+        self.history.append((started, self.menus[menu][0], entry[1], time.perf_counter() - start, ok))
+
+    def show_history(self):
+        """Print the most recent commands, oldest first"""
+        if not self.history:
+            print("No commands run yet.")
+            return
+        print(f"\nCommand History (last {len(self.history)} of {self.commands_run}):")
+        for started, menu, label, seconds, ok in self.history:
+            print(f"{started:%H:%M:%S} {menu} > {label} ({seconds:.3f}s){'' if ok else ' failed'}")
@@ -0,0 +1,244 @@
+import bisect
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def normalize(sql):
+    """Collapse whitespace so one statement always gets one label"""
+    return " ".join(sql.split())
+
+
+def label(value):
+    """Escape a Prometheus label value"""
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class StatementStats:
+    """Latency histogram and counters of one SQL statement"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.errors = 0
+        self.vm_steps = 0
+
+
+class MeasuredCursor:
+    """A cursor whose fetches count toward its statement's latency and rows
+
+    The statement is recorded once, when its rows run out, when the cursor
+    is closed, or when it is dropped. Time the caller spends between
+    fetches is not counted.
+    """
+
+    def __init__(self, metrics, db, query, params, cursor, seconds, ticks):
+        self.metrics = metrics
+        self.db = db
+        self.query = query
+        self.params = params
+        self.cursor = cursor
+        self.seconds = seconds
+        self.ticks = ticks
+        self.rows = 0
+        self.done = False
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def fetchone(self):
+        row = self.fetch(self.cursor.fetchone)
+        if row is None:
+            self.finish()
+        else:
+            self.rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.cursor.arraysize if size is None else size
+        rows = self.fetch(self.cursor.fetchmany, size)
+        self.rows += len(rows)
+        if len(rows) < size:
+            self.finish()
+        return rows
+
+    def fetchall(self):
+        rows = self.fetch(self.cursor.fetchall)
+        self.rows += len(rows)
+        self.finish()
+        return rows
+
+    def close(self):
+        self.finish()
+        self.cursor.close()
+
+    def __del__(self):
+        self.finish()
+
+    def fetch(self, read, *args):
+        ticks = self.db.vm_ticks
+        start = time.perf_counter()
+        try:
+            return read(*args)
+        except sqlite3.Error:
+            self.done = True
+            self.metrics.record(self.query, self.seconds + time.perf_counter() - start, self.rows,
+                                (self.ticks + self.db.vm_ticks - ticks) * self.db.progress_steps, error=True)
+            raise
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.ticks += self.db.vm_ticks - ticks
+
+    def finish(self):
+        if self.done:
+            return
+        self.done = True
+        # A statement that returns no rows reports the rows it changed.
+        rows = self.rows or max(self.cursor.rowcount, 0)
+        self.metrics.finish(self.db, self.query, self.params, self.seconds, rows, self.ticks)
+
+
+class QueryMetrics:
+    """Per-statement latency histograms, row counts and a slow-query log, shared by any number of connections"""
+
+    def __init__(self, slow_ms=100.0, slow_log_path=None, explain=True, keep_slow=100):
+        self.slow_seconds = slow_ms / 1000.0
+        self.slow_log_path = slow_log_path
+        self.explain = explain
+        self.statements = {}
+        self.plans = {}
+        self.slow_queries = deque(maxlen=keep_slow)
+        self.slow_total = 0
+        self.traced = 0
+        self.lock = threading.Lock()
+
+    def observe(self, db, query, params, run):
+        """Run run(query, params) on db, recording its latency, row count, errors and VM steps
+
+        run returns a list of rows, a row count, or a cursor.
+        """
+        ticks = db.vm_ticks
+        start = time.perf_counter()
+        try:
+            result = run(query, params)
+        except sqlite3.Error:
+            self.record(query, time.perf_counter() - start, 0, (db.vm_ticks - ticks) * db.progress_steps, error=True)
+            raise
+        elapsed = time.perf_counter() - start
+        if isinstance(result, sqlite3.Cursor):
+            # A cursor's rows are read later; it is recorded once they are.
+            return MeasuredCursor(self, db, query, params, result, elapsed, db.vm_ticks - ticks)
+        rows = len(result) if isinstance(result, list) else max(result, 0)
+        self.finish(db, query, params, elapsed, rows, db.vm_ticks - ticks)
+        return result
+
+    def finish(self, db, query, params, seconds, rows, ticks):
+        """Record a statement that ran without error, logging it if it was slow"""
+        self.record(query, seconds, rows, ticks * db.progress_steps)
+        if seconds >= self.slow_seconds:
+            self.log_slow(db.conn, query, params, seconds, rows)
+
+    def record(self, query, seconds, rows, vm_steps=0, error=False):
+        key = normalize(query)
+        with self.lock:
+            stats = self.statements.get(key)
+            if stats is None:
+                stats = self.statements[key] = StatementStats()
+            stats.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            stats.count += 1
+            stats.seconds += seconds
+            stats.rows += rows
+            stats.errors += error
+            stats.vm_steps += vm_steps
+
+    def plan(self, conn, query, params):
+        """Return the EXPLAIN QUERY PLAN of a statement, computed once per statement text"""
+        key = normalize(query)
+        if key not in self.plans:
+            try:
+                rows = conn.execute("EXPLAIN QUERY PLAN " + query, params).fetchall()
+                self.plans[key] = [row[3] for row in rows]
+            except sqlite3.Error as e:
+                self.plans[key] = [f"unavailable: {e}"]
+        return self.plans[key]
+
+    def log_slow(self, conn, query, params, seconds, rows):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "ms": round(seconds * 1000, 3),
+            "rows": rows,
+            "sql": normalize(query),
+            "params": [value if isinstance(value, (int, float, str)) or value is None else repr(value)
+                       for value in (params.values() if isinstance(params, dict) else params)],
+        }
+        if self.explain:
+            entry["plan"] = self.plan(conn, query, params)
+        with self.lock:
+            self.slow_total += 1
+            self.slow_queries.append(entry)
+            if self.slow_log_path:
+                with open(self.slow_log_path, "a", encoding="utf-8") as log:
+                    log.write(json.dumps(entry) + "\n")
+
+    def trace(self, sql):
+        """sqlite3 trace callback: counts every statement the connection runs, including trigger bodies"""
+        self.traced += 1
+
+    def prometheus(self):
+        """Return every metric in the Prometheus text exposition format"""
+        with self.lock:
+            statements = sorted(self.statements.items())
+            lines = [
+                "# HELP library_query_duration_seconds Latency of statements run through LibraryDatabase.",
+                "# TYPE library_query_duration_seconds histogram",
+            ]
+            for sql, stats in statements:
+                name = label(sql)
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), stats.buckets):
+                    cumulative += count
+                    lines.append(f'library_query_duration_seconds_bucket{{statement="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'library_query_duration_seconds_sum{{statement="{name}"}} {stats.seconds:.6f}')
+                lines.append(f'library_query_duration_seconds_count{{statement="{name}"}} {stats.count}')
+            for metric, help_text, attribute in (
+                ("library_query_rows_total", "Rows returned or changed.", "rows"),
+                ("library_query_errors_total", "Statements that raised sqlite3.Error.", "errors"),
+                ("library_query_vm_steps_total", "SQLite VM steps, when the progress handler is enabled.", "vm_steps"),
+            ):
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} counter")
+                for sql, stats in statements:
+                    lines.append(f'{metric}{{statement="{label(sql)}"}} {getattr(stats, attribute)}')
+            lines += [
+                "# HELP library_slow_queries_total Statements slower than the slow-query threshold.",
+                "# TYPE library_slow_queries_total counter",
+                f"library_slow_queries_total {self.slow_total}",
+                "# HELP library_sqlite_statements_total Statements seen by the trace callback, when enabled.",
+                "# TYPE library_sqlite_statements_total counter",
+                f"library_sqlite_statements_total {self.traced}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Write the metrics to a file atomically, for a textfile collector to pick up"""
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as output:
+            output.write(self.prometheus())
+        os.replace(temporary, path)
@@ -0,0 +1,161 @@
+import sqlite3
+import threading
+from collections import Counter
+
+# Columns that update_* may change, with the type each value is converted to.
+UPDATABLE_FIELDS = {
+    "Book": ("book_id", {
+        "title": str, "author": str, "isbn": str, "publication_year": int, "genre": str, "total_copies": int,
+    }),
+    "Member": ("member_id", {
+        "first_name": str, "last_name": str, "email": str, "phone": str,
+        "street": str, "city": str, "state": str, "zip_code": str, "member_type": str,
+    }),
+    "Staff": ("staff_id", {
+        "first_name": str, "last_name": str, "email": str, "phone": str, "role": str,
+    }),
+}
+
+
+def partial_update_sql(table):
+    """Build the one UPDATE statement that covers every subset of a table's fields"""
+    key, fields = UPDATABLE_FIELDS[table]
+    # A NULL parameter keeps the current value, so every combination of blank
+    # fields shares this single statement text and its compiled form.
+    assignments = [f"{field} = COALESCE(:{field}, {field})" for field in fields]
+    if table == "Book":
+        # Changing total_copies keeps the copies that are out on loan out;
+        # fewer copies than are on loan fail the available_copies CHECK.
+        assignments.append(
+            "available_copies = CASE WHEN :total_copies IS NULL THEN available_copies "
+            "ELSE :total_copies - (total_copies - available_copies) END"
+        )
+    return f"UPDATE {table} SET {', '.join(assignments)} WHERE {key} = :{key}"
+
+
+class StatementRegistry:
+    """Named SQL statements with a fixed text, so sqlite3's statement cache can reuse them"""
+
+    def __init__(self):
+        self.statements = {}
+        self.executions = Counter()
+        self.lock = threading.Lock()
+
+    def register(self, name, sql):
+        """Register a statement under a name"""
+        self.statements[name] = sql
+
+    def sql(self, name):
+        """Return the SQL text of a registered statement"""
+        return self.statements[name]
+
+    def count(self, name):
+        with self.lock:
+            self.executions[name] += 1
+        return self.statements[name]
+
+    def execute(self, db, name, params=()):
+        """Run a registered statement on a LibraryDatabase and return the cursor, raising sqlite3.Error on failure"""
+        return db.execute(self.count(name), params)
+
+    def query(self, db, name, params=()):
+        """Run a registered SELECT on a LibraryDatabase and return its rows"""
+        return db.execute_query(self.count(name), params)
+
+    def update(self, db, name, params=()):
+        """Run a registered INSERT/UPDATE/DELETE on a LibraryDatabase and return the row count"""
+        return db.execute_update(self.count(name), params)
+
+    def partial_update_params(self, table, key_value, fields):
+        """Return the parameters of a table's partial-update statement"""
+        key, types = UPDATABLE_FIELDS[table]
+        unknown = set(fields) - set(types)
+        if unknown:
+            raise ValueError(f"{table} has no updatable field(s): {', '.join(sorted(unknown))}")
+        params = dict.fromkeys(types)
+        for field, value in fields.items():
+            if value is not None and value != "":
+                params[field] = types[field](value)
+        params[key] = key_value
+        return params
+
+    def partial_update(self, db, table, key_value, **fields):
+        """Update the given fields of one row, leaving blank or None fields unchanged"""
+        return self.update(db, f"{table.lower()}.update", self.partial_update_params(table, key_value, fields))
+
+    def stats(self):
+        """Return how often each registered statement ran"""
+        with self.lock:
+            return dict(self.executions)
+
+
+class StatementCacheMonitor:
+    """Count statement executions and compilations on one connection"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.executions = 0
+        self.parses = 0
+        self.compiling = False
+        self.last_sql = None
+        # The authorizer only runs while SQLite compiles a statement, so a
+        # statement that starts right after it was parsed; any other start
+        # reused a compiled statement from sqlite3's cache.
+        conn.set_authorizer(self.authorize)
+        conn.set_trace_callback(self.trace)
+
+    def authorize(self, action, arg1, arg2, database, source):
+        self.compiling = True
+        return sqlite3.SQLITE_OK
+
+    def trace(self, sql):
+        if sql.startswith("--"):
+            return
+        # The trace callback repeats a statement's text at the start of each
+        # trigger it fires; only a compile or a change of text is a new start.
+        if self.compiling:
+            self.parses += 1
+        elif sql == self.last_sql:
+            return
+        self.executions += 1
+        self.compiling = False
+        self.last_sql = sql
+
+    def detach(self):
+        """Stop counting"""
+        self.conn.set_authorizer(None)
+        self.conn.set_trace_callback(None)
+
+    def stats(self):
+        """Return executions, parses and the statement-cache hit rate"""
+        hits = self.executions - self.parses
+        return {
+            "executions": self.executions,
+            "parses": self.parses,
+            "cache_hits": hits,
+            "hit_rate": hits / self.executions if self.executions else 0.0,
+        }
+
+
+registry = StatementRegistry()
+for _table in UPDATABLE_FIELDS:
+    registry.register(f"{_table.lower()}.update", partial_update_sql(_table))
+registry.register(
+    "book.insert",
+    "INSERT INTO Book (title, author, isbn, publication_year, genre, total_copies, available_copies) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+registry.register(
+    "member.insert",
+    "INSERT INTO Member (first_name, last_name, email, phone, street, city, state, zip_code, join_date, member_type) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+registry.register(
+    "staff.insert",
+    "INSERT INTO Staff (first_name, last_name, email, phone, role, hire_date) VALUES (?, ?, ?, ?, ?, ?)"
+)
+registry.register("book.delete", "DELETE FROM Book WHERE book_id = ?")
+registry.register("member.delete", "DELETE FROM Member WHERE member_id = ?")
+registry.register("staff.delete", "DELETE FROM Staff WHERE staff_id = ?")
+registry.register("book.by_id", "SELECT * FROM Book WHERE book_id = ?")
+registry.register("member.by_id", "SELECT * FROM Member WHERE member_id = ?")